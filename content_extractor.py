@@ -1,26 +1,78 @@
+import asyncio
 import getopt
 import os.path
+import signal
 import sys
 import urllib.parse
 from textwrap import dedent
 
 from content_extractor import ContentExtractor
-
+from content_extractor.batch import ExtractionError, read_manifest
+from content_extractor.blocks import output_suffix
+from content_extractor.crawl import crawl
 from content_extractor.saver import save_to_file
+from content_extractor.server import ExtractionServer
 
 
 def _help():
     print(dedent("""
     Использование:
     
-    content_extractor.py <параметры> <адрес страницы>
+    content_extractor.py <параметры> <адрес страницы> [<адрес страницы> ...]
+    content_extractor.py <параметры> --crawl=<каталог|шаблон|архив>
+    content_extractor.py <параметры> --serve=<[адрес:]порт|unix:путь>
     
     Параметры:
       -h, --help                    показать страницу помощи
       -d <путь>, --directory=<путь> каталог для сохранения текстовых файлов
       -r <путь>, --rules=<путь>     путь до файла с правилами разбора html
                                     пример правил можно посмотреть в файле ./content_extractor/default_rules.txt
+      --rules-cache                 сохранять разобранные правила рядом с файлом правил (<файл>.pickle),
+                                    чтобы при следующих запусках не разбирать их заново
       -o, --stdout                  выводить текст в стандартный вывод вместо сохранения в файл
+      --cache=<путь>                каталог для кэша результатов разбора,
+                                    неизменившиеся страницы не разбираются повторно
+      --cache-size=<МБ>             максимальный размер кэша результатов (по умолчанию 256 МБ)
+      --url-store=<путь>            каталог, где для каждого адреса хранятся ETag/Last-Modified и текст страницы;
+                                    неизменившиеся страницы (ответ 304) не загружаются и не разбираются повторно
+      --format=<формат>             формат результата: text - текст с переносом строк (по умолчанию),
+                                    markdown - без переносов строк, jsonl - по json-объекту на заголовок или параграф
+                                    со списком ссылок и их позиций, binary - компактные двоичные записи блоков
+                                    (см. content_extractor/blocks.py)
+      --boilerplate=<путь>          находить блоки, которые повторяются на страницах одного хоста (навигация, промо,
+                                    подписи), и пропускать их в следующих страницах хоста; найденные блоки хранятся
+                                    в заданном файле. При пакетной обработке каждый процесс учится отдельно,
+                                    в файле остается состояние процесса, завершившегося последним.
+                                    Не используется вместе с --cache и --url-store
+      --boilerplate-threshold=<%>   на какой доле страниц хоста (в процентах) блок должен повториться,
+                                    чтобы считаться шаблонным (по умолчанию 50)
+      --parser=<имя>                html-парсер: html.parser (по умолчанию) или lxml (требует установленного lxml)
+      --domain=<хост>               хост, правила которого применяются к локальным файлам
+      --encoding=<кодировка>        кодировка локальных файлов (по умолчанию определяется по BOM или <meta charset>,
+                                    если их нет - utf-8)
+      -m <путь>, --manifest=<путь>  файл со списком адресов страниц для пакетной обработки
+                                    (по одному адресу в строке, через пробел можно указать хост)
+      -j <число>, --jobs=<число>    количество процессов для пакетной обработки
+                                    (по умолчанию по числу процессоров)
+      --threads                     обрабатывать пакет в потоках одним экстрактором вместо процессов, -j задает
+                                    число потоков (по умолчанию число процессоров + 4, но не больше 32). Загрузка
+                                    страниц идет параллельно с разбором, сам разбор параллелится только в сборках
+                                    python без GIL; шаблонные блоки с --boilerplate находятся общие для всего пакета
+      --unordered                   выдавать результаты пакетной обработки по мере готовности
+      --async-fetch                 загружать страницы пакета асинхронно, переиспользуя соединения с хостами
+      --connections=<число>         максимальное количество соединений с одним хостом (по умолчанию 4)
+      --crawl=<источник>            обработать все html-страницы каталога, шаблона файлов (например, 'site/**/*.html')
+                                    или архива (.zip, .tar, .tar.gz, .warc, .warc.gz) и сохранить тексты в каталог -d
+                                    с той же структурой; хост для правил берется из первого каталога пути
+                                    (lenta.ru/...) или из адреса записи WARC, иначе используется --domain.
+                                    Неизменившиеся результаты не перезаписываются
+      --serve=<адрес>               запустить сервер, который держит правила загруженными и принимает запросы
+                                    по http (127.0.0.1:8080) или через unix-сокет (unix:/tmp/extractor.sock):
+                                    POST /extract?host=<хост> с html в теле, GET /extract?url=<адрес>,
+                                    GET /health. С опцией -j документы разбираются в пуле из заданного
+                                    количества процессов, иначе - в потоках сервера
+      --max-pending=<число>         сколько запросов сервер обрабатывает одновременно, остальные получают ответ 503
+                                    (по умолчанию 4 на процесс или процессор)
     """).strip("\n"))
     sys.exit()
 
@@ -29,16 +81,47 @@ class _Options:
     def __init__(self):
         self.output_directory = os.getcwd()
         self.rules_file = None
+        self.binary_rules_cache = False
         self.resource_address = None
+        self.resource_addresses = []
+        self.manifest_file = None
+        self.jobs = None
+        self.threads = False
+        self.ordered = True
+        self.async_fetch = False
+        self.connections_per_host = 4
         self.write_to_stdout = False
+        self.parser_backend = "html.parser"
+        self.output_format = "text"
+        self.cache_directory = None
+        self.cache_max_size = None
+        self.url_store_directory = None
+        self.boilerplate_file = None
+        self.boilerplate_threshold = None
         self.domain = None
-        self.encoding = "utf-8"
+        self.encoding = None
+        self.crawl_source = None
+        self.serve_address = None
+        self.max_pending = None
+
+    def is_batch(self) -> bool:
+        return self.manifest_file is not None or len(self.resource_addresses) > 1
+
+    def extractor_options(self) -> dict:
+        return dict(binary_rules_cache=self.binary_rules_cache, parser_backend=self.parser_backend,
+                    cache_directory=self.cache_directory, cache_max_size=self.cache_max_size,
+                    url_store_directory=self.url_store_directory, output_format=self.output_format,
+                    boilerplate_file=self.boilerplate_file, boilerplate_threshold=self.boilerplate_threshold)
 
 
 def _parse_command_line() -> _Options:
     result = _Options()
-    opts, args = getopt.getopt(sys.argv[1:], "hd:r:o", ["help", "directory=", "rules=", "stdout", "domain=",
-                                                        "encoding="])
+    opts, args = getopt.getopt(sys.argv[1:], "hd:r:om:j:", ["help", "directory=", "rules=", "stdout", "domain=",
+                                                            "encoding=", "manifest=", "jobs=", "unordered",
+                                                            "async-fetch", "connections=", "rules-cache", "parser=",
+                                                            "cache=", "cache-size=", "url-store=", "crawl=", "serve=",
+                                                            "max-pending=", "format=", "boilerplate=",
+                                                            "boilerplate-threshold=", "threads"])
     for opt, arg in opts:
         if opt in ("-h", "--help"):
             _help()
@@ -46,33 +129,135 @@ def _parse_command_line() -> _Options:
             result.output_directory = arg
         elif opt in ("-r", "--rules"):
             result.rules_file = arg
+        elif opt == "--rules-cache":
+            result.binary_rules_cache = True
         elif opt in ("-o", "--stdout"):
             result.write_to_stdout = True
+        elif opt == "--cache":
+            result.cache_directory = arg
+        elif opt == "--cache-size":
+            result.cache_max_size = int(arg) * 1024 * 1024
+        elif opt == "--url-store":
+            result.url_store_directory = arg
+        elif opt == "--boilerplate":
+            result.boilerplate_file = arg
+        elif opt == "--boilerplate-threshold":
+            result.boilerplate_threshold = float(arg) / 100
+        elif opt == "--parser":
+            result.parser_backend = arg
+        elif opt == "--format":
+            result.output_format = arg
         elif opt == "--domain":
             result.domain = arg
         elif opt == "--encoding":
             result.encoding = arg
+        elif opt in ("-m", "--manifest"):
+            result.manifest_file = arg
+        elif opt in ("-j", "--jobs"):
+            result.jobs = int(arg)
+        elif opt == "--threads":
+            result.threads = True
+        elif opt == "--unordered":
+            result.ordered = False
+        elif opt == "--async-fetch":
+            result.async_fetch = True
+        elif opt == "--connections":
+            result.connections_per_host = int(arg)
+        elif opt == "--crawl":
+            result.crawl_source = arg
+        elif opt == "--serve":
+            result.serve_address = arg
+        elif opt == "--max-pending":
+            result.max_pending = int(arg)
 
-    if len(args) < 1:
+    if len(args) < 1 and result.manifest_file is None and result.crawl_source is None and result.serve_address is None:
         print("Ошибка: не задан адрес страницы\n")
         _help()
-    result.resource_address = args[-1]
+    result.resource_addresses = args
+    result.resource_address = args[-1] if args else None
 
     return result
 
 
+def _output(options: _Options, address: str, text):
+    if options.write_to_stdout and isinstance(text, bytes):
+        sys.stdout.flush()
+        sys.stdout.buffer.write(text)
+        sys.stdout.buffer.flush()
+    elif options.write_to_stdout:
+        print(text)
+    else:
+        save_to_file(options.output_directory, address, text, output_suffix(options.output_format))
+
+
+def _run_batch(options: _Options, extractor: ContentExtractor) -> int:
+    errors = 0
+    addresses = list(options.resource_addresses)
+    if options.manifest_file:
+        addresses.extend(read_manifest(options.manifest_file))
+    if options.async_fetch:
+        urls = [address for address in addresses if isinstance(address, str) and _is_url(address)]
+        addresses = [address for address in addresses if not isinstance(address, str) or not _is_url(address)]
+        errors += asyncio.run(_fetch_urls(options, extractor, urls))
+    if addresses:
+        results = extractor.extract_many(addresses, encoding=options.encoding, host_name=options.domain,
+                                         workers=options.jobs, ordered=options.ordered, threads=options.threads)
+        for address, text in results:
+            errors += _output_result(options, address, text)
+    return errors
+
+
+async def _fetch_urls(options: _Options, extractor: ContentExtractor, urls: list) -> int:
+    errors = 0
+    async for url, text in extractor.extract_from_urls(urls, connections_per_host=options.connections_per_host):
+        errors += _output_result(options, url, text)
+    return errors
+
+
+def _output_result(options: _Options, address: str, text) -> int:
+    # ошибка обработки одного документа не останавливает пакет, возвращается число ошибок
+    if isinstance(text, ExtractionError):
+        print(f"Ошибка обработки {address}: {text}", file=sys.stderr)
+        return 1
+    _output(options, address, text)
+    return 0
+
+
+def _serve(options: _Options):
+    with ExtractionServer(options.serve_address, options.rules_file, extractor_options=options.extractor_options(),
+                          workers=options.jobs, max_pending=options.max_pending) as server:
+        print(f"Сервер запущен: {options.serve_address}", file=sys.stderr)
+        # при остановке через SIGTERM сервер закрывает сокет и пул процессов так же, как по Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _is_url(address: str) -> bool:
+    return bool(urllib.parse.urlparse(address).scheme)
+
+
 if __name__ == '__main__':
     options = _parse_command_line()
 
-    extractor = ContentExtractor(rules_file_name=options.rules_file)
+    if options.crawl_source is not None:
+        summary = crawl(options.rules_file, options.crawl_source, options.output_directory,
+                        extractor_options=options.extractor_options(), host_name=options.domain,
+                        encoding=options.encoding, workers=options.jobs)
+        print(summary)
+        sys.exit(1 if summary.errors else 0)
 
-    url = urllib.parse.urlparse(options.resource_address)
-    if not url.scheme:
-        text = extractor.extract_from_file(options.resource_address, host_name=options.domain, encoding=options.encoding)
-    else:
-        text = extractor.extract_from_url(options.resource_address)
+    if options.serve_address is not None:
+        _serve(options)
+        sys.exit()
 
-    if options.write_to_stdout:
-        print(text)
-    else:
-        save_to_file(options.output_directory, options.resource_address, text)
+    errors = 0
+    with ContentExtractor(rules_file_name=options.rules_file, **options.extractor_options()) as extractor:
+        if options.is_batch():
+            errors = _run_batch(options, extractor)
+        else:
+            text = extractor.extract(options.resource_address, encoding=options.encoding, host_name=options.domain)
+            _output(options, options.resource_address, text)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,136 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import util
+from typing import Callable, Iterable, Iterator, Tuple
+
+_worker_extractor = None
+
+
+class ExtractionError(RuntimeError):
+    # возвращается вместо текста документа, который не удалось обработать, остальные документы пакета обрабатываются
+    pass
+
+
+def read_manifest(file_name: str, encoding: str = "utf-8") -> list:
+    addresses = []
+    with open(file_name, encoding=encoding) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            # Адрес отделяется от хоста табуляцией или последним пробелом, поэтому путь может содержать пробелы.
+            # Существующий файл с пробелами в имени без хоста тоже читается целиком.
+            parts = line.rsplit("\t", 1) if "\t" in line else line.rsplit(maxsplit=1)
+            if len(parts) > 1 and "\t" not in line and os.path.isfile(line):
+                parts = [line]
+            addresses.append((parts[0].strip(), parts[1].strip()) if len(parts) > 1 else parts[0])
+    return addresses
+
+
+def extract_many(rules_file_name: str, addresses: Iterable, extractor_options: dict = None,
+                 encoding: str = None, host_name: str = "*", workers: int = None, ordered: bool = True,
+                 chunk_size: int = 8, max_pending_chunks: int = None) -> Iterator[Tuple[str, str]]:
+    chunks = _split_to_chunks(addresses, encoding, host_name, chunk_size)
+    return run_chunks(rules_file_name, _extract_chunk, chunks, extractor_options=extractor_options, workers=workers,
+                      ordered=ordered, max_pending_chunks=max_pending_chunks)
+
+
+def run_chunks(rules_file_name: str, function: Callable, chunks: Iterable[list], extractor_options: dict = None,
+               workers: int = None, ordered: bool = True, max_pending_chunks: int = None) -> Iterator:
+    # function(extractor, chunk) вызывается в процессе-обработчике и возвращает список результатов
+    workers = workers if workers else os.cpu_count() or 1
+    max_pending_chunks = max_pending_chunks if max_pending_chunks else workers * 2
+    with create_worker_pool(rules_file_name, extractor_options, workers) as executor:
+        yield from _run_pending(chunks, lambda chunk: submit_chunk(executor, function, chunk), ordered,
+                                max_pending_chunks)
+
+
+def extract_many_in_threads(extractor, addresses: Iterable, encoding: str = None, host_name: str = "*",
+                            workers: int = None, ordered: bool = True, chunk_size: int = 8,
+                            max_pending_chunks: int = None) -> Iterator[Tuple[str, str]]:
+    chunks = _split_to_chunks(addresses, encoding, host_name, chunk_size)
+    return run_chunks_in_threads(extractor, _extract_chunk, chunks, workers=workers, ordered=ordered,
+                                 max_pending_chunks=max_pending_chunks)
+
+
+def run_chunks_in_threads(extractor, function: Callable, chunks: Iterable[list], workers: int = None,
+                          ordered: bool = True, max_pending_chunks: int = None) -> Iterator:
+    # Все потоки разбирают документы одним экстрактором: правила после загрузки не меняются, а состояние разбора
+    # у каждого документа свое. Загрузка страниц по сети идет параллельно с разбором, а сам разбор
+    # масштабируется по ядрам только в сборках CPython без GIL.
+    workers = workers if workers else min(32, (os.cpu_count() or 1) + 4)
+    max_pending_chunks = max_pending_chunks if max_pending_chunks else workers * 2
+    with ThreadPoolExecutor(workers, thread_name_prefix="extractor") as executor:
+        yield from _run_pending(chunks, lambda chunk: executor.submit(function, extractor, chunk), ordered,
+                                max_pending_chunks)
+
+
+def create_worker_pool(rules_file_name: str, extractor_options: dict = None,
+                       workers: int = None) -> ProcessPoolExecutor:
+    # в каждом процессе пула один раз создается экстрактор с загруженными правилами
+    workers = workers if workers else os.cpu_count() or 1
+    initargs = (rules_file_name, extractor_options if extractor_options else dict())
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs)
+
+
+def submit_chunk(executor: ProcessPoolExecutor, function: Callable, chunk: list) -> Future:
+    return executor.submit(_run_chunk, function, chunk)
+
+
+def _split_to_chunks(addresses: Iterable, encoding: str, host_name: str, chunk_size: int) -> Iterator[list]:
+    chunk = []
+    for address in addresses:
+        if isinstance(address, str):
+            chunk.append((address, host_name, encoding))
+        else:
+            chunk.append((address[0], address[1], encoding))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _run_pending(chunks: Iterable[list], submit: Callable[[list], Future], ordered: bool,
+                 max_pending_chunks: int) -> Iterator:
+    pending = deque()
+    for chunk in chunks:
+        if len(pending) >= max_pending_chunks:
+            yield from _take_results(pending, ordered)
+        pending.append(submit(chunk))
+    while pending:
+        yield from _take_results(pending, ordered)
+
+
+def _take_results(pending: deque, ordered: bool) -> Iterator:
+    if ordered:
+        yield from pending.popleft().result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+    for future in done:
+        yield from future.result()
+
+
+def _init_worker(rules_file_name: str, extractor_options: dict):
+    global _worker_extractor
+    from .extractor import ContentExtractor
+    _worker_extractor = ContentExtractor(rules_file_name, **extractor_options)
+    # экстрактор закрывается при завершении процесса пула, например, чтобы сохранить кэш шаблонных блоков
+    util.Finalize(_worker_extractor, _worker_extractor.close, exitpriority=10)
+
+
+def _run_chunk(function: Callable, chunk: list) -> list:
+    return function(_worker_extractor, chunk)
+
+
+def _extract_chunk(extractor, chunk: list) -> list:
+    results = []
+    for address, host_name, encoding in chunk:
+        try:
+            results.append((address, extractor.extract(address, encoding=encoding, host_name=host_name)))
+        except Exception as e:
+            results.append((address, ExtractionError(f"{type(e).__name__}: {e}")))
+    return results
@@ -0,0 +1,208 @@
+import getopt
+import json
+import os.path
+import sys
+import time
+import tracemalloc
+from textwrap import dedent
+from typing import Callable, Dict, List, Tuple
+
+from .extractor import ContentExtractor
+from .html import HtmlParserListener, create_parser
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "data")
+_DATA_PAGES = (("lenta_ru_01.html", "lenta.ru"), ("lenta_ru_02.html", "lenta.ru"), ("gazeta_01.html", "www.gazeta.ru"),
+               ("rbc_01.html", "rbc.ru"), ("simple_01.html", "*"), ("simple_02.html", "*"))
+_STAGES = ("decode", "tokenize", "extract")
+
+
+class BenchmarkDocument:
+    def __init__(self, name: str, data: bytes, host_name: str = "*", encoding: str = "utf-8"):
+        self.name = name
+        self.data = data
+        self.host_name = host_name
+        self.encoding = encoding
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, size: int, stages: Dict[str, float], peak_memory: int):
+        self.name = name
+        self.size = size
+        # лучшее время одного прогона каждой стадии, в секундах
+        self.stages = stages
+        self.peak_memory = peak_memory
+
+    @property
+    def total(self) -> float:
+        return self.stages["decode"] + self.stages["extract"]
+
+    def to_json(self) -> dict:
+        return {"size": self.size, "stages": self.stages, "total": self.total, "peak_memory": self.peak_memory}
+
+
+def data_documents() -> List[BenchmarkDocument]:
+    documents = []
+    for file_name, host_name in _DATA_PAGES:
+        with open(os.path.join(_DATA_DIR, file_name), "rb") as f:
+            documents.append(BenchmarkDocument(file_name, f.read(), host_name))
+    return documents
+
+
+def synthetic_documents(scale: int = 1) -> List[BenchmarkDocument]:
+    def page(body: str) -> bytes:
+        return f"<html><head><title>Тест</title></head><body>{body}</body></html>".encode("utf-8")
+
+    depth = 500 * scale
+    deep = "<div class=\"level\">" * depth + "<p>Текст в глубине документа</p>" + "</div>" * depth
+
+    paragraphs = "".join(f"<h2>Заголовок {i}</h2><p>Параграф {i} <b>с выделением</b> и <a href=\"/{i}\">ссылкой</a>. "
+                         f"Обычный текст статьи, который нужно перенести по ширине строки.</p>"
+                         for i in range(2000 * scale))
+
+    attrs = " ".join(f"data-attr-{i}=\"значение {i}\"" for i in range(200))
+    attributes = "".join(f"<div class=\"item item-{i}\" {attrs}><span {attrs}>Элемент {i}</span></div>"
+                         for i in range(100 * scale))
+
+    return [BenchmarkDocument("synthetic_deep_nesting", page(deep)),
+            BenchmarkDocument("synthetic_paragraphs", page(paragraphs)),
+            BenchmarkDocument("synthetic_attributes", page(attributes))]
+
+
+def run_benchmark(documents: List[BenchmarkDocument], extractor: ContentExtractor = None,
+                  repeat: int = 5) -> List[BenchmarkResult]:
+    extractor = extractor if extractor else ContentExtractor()
+    results = []
+    for document in documents:
+        html = document.data.decode(document.encoding)
+        stages = {
+            "decode": _best_time(lambda: document.data.decode(document.encoding), repeat),
+            "tokenize": _best_time(lambda: _tokenize(extractor, html), repeat),
+            "extract": _best_time(lambda: _extract(extractor, document, html), repeat),
+        }
+        results.append(BenchmarkResult(document.name, len(document.data), stages,
+                                       _peak_memory(lambda: _extract(extractor, document, html))))
+    return results
+
+
+def compare_with_baseline(results: List[BenchmarkResult], baseline: dict,
+                          threshold: float) -> List[Tuple[str, float, float]]:
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected is None:
+            continue
+        if result.total > expected["total"] * (1 + threshold):
+            regressions.append((result.name, expected["total"], result.total))
+    return regressions
+
+
+def format_report(results: List[BenchmarkResult]) -> str:
+    lines = [f"{'документ':<26}{'размер, КБ':>12}{'decode, мс':>12}{'tokenize, мс':>14}{'extract, мс':>13}"
+             f"{'док/с':>9}{'МБ/с':>8}{'память, КБ':>12}"]
+    for result in results:
+        stages = result.stages
+        lines.append(f"{result.name:<26}{result.size / 1024:>12.1f}{stages['decode'] * 1000:>12.2f}"
+                     f"{stages['tokenize'] * 1000:>14.2f}{stages['extract'] * 1000:>13.2f}"
+                     f"{1 / result.total:>9.1f}{result.size / result.total / 1024 / 1024:>8.2f}"
+                     f"{result.peak_memory / 1024:>12.0f}")
+    total_time = sum(result.total for result in results)
+    total_size = sum(result.size for result in results)
+    lines.append(f"Всего: {len(results)} документов, {len(results) / total_time:.1f} док/с, "
+                 f"{total_size / total_time / 1024 / 1024:.2f} МБ/с")
+    return "\n".join(lines)
+
+
+def _tokenize(extractor: ContentExtractor, html: str):
+    parser = create_parser(HtmlParserListener(), backend=extractor._parser_backend, prescan=extractor._prescan)
+    parser.feed_chunk(html)
+    parser.flush_chunks()
+
+
+def _extract(extractor: ContentExtractor, document: BenchmarkDocument, html: str):
+    for _ in extractor.extract_stream((html,), host_name=document.host_name):
+        pass
+
+
+def _best_time(function: Callable, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(function: Callable) -> int:
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _help():
+    print(dedent("""
+    Использование:
+
+    python3 -m content_extractor.benchmark <параметры>
+
+    Параметры:
+      -h, --help                    показать страницу помощи
+      -r <путь>, --rules=<путь>     путь до файла с правилами разбора html
+      -n <число>, --repeat=<число>  количество прогонов каждого документа, берется лучшее время (по умолчанию 5)
+      --scale=<число>               множитель размера синтетических документов (по умолчанию 1)
+      --parser=<имя>                html-парсер: html.parser (по умолчанию) или lxml
+      --baseline=<путь>             файл с эталонными результатами в формате JSON для сравнения
+      --threshold=<доля>            допустимое замедление относительно эталона (по умолчанию 0.2, т.е. 20%)
+      --save-baseline=<путь>        сохранить результаты как эталон
+    """).strip("\n"))
+    sys.exit()
+
+
+def main(argv: List[str]) -> int:
+    opts, _ = getopt.getopt(argv, "hr:n:", ["help", "rules=", "repeat=", "scale=", "parser=", "baseline=",
+                                            "threshold=", "save-baseline="])
+    rules_file, repeat, scale, parser_backend = None, 5, 1, "html.parser"
+    baseline_file, threshold, save_baseline_file = None, 0.2, None
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            _help()
+        elif opt in ("-r", "--rules"):
+            rules_file = arg
+        elif opt in ("-n", "--repeat"):
+            repeat = int(arg)
+        elif opt == "--scale":
+            scale = int(arg)
+        elif opt == "--parser":
+            parser_backend = arg
+        elif opt == "--baseline":
+            baseline_file = arg
+        elif opt == "--threshold":
+            threshold = float(arg)
+        elif opt == "--save-baseline":
+            save_baseline_file = arg
+
+    extractor = ContentExtractor(rules_file, parser_backend=parser_backend)
+    results = run_benchmark(data_documents() + synthetic_documents(scale), extractor, repeat=repeat)
+    print(format_report(results))
+
+    if save_baseline_file:
+        with open(save_baseline_file, "w", encoding="utf-8") as f:
+            json.dump({result.name: result.to_json() for result in results}, f, indent=2, sort_keys=True)
+
+    if baseline_file:
+        with open(baseline_file, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, threshold)
+        for name, expected, actual in regressions:
+            print(f"Замедление {name}: {expected * 1000:.2f} мс -> {actual * 1000:.2f} мс "
+                  f"(+{(actual / expected - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
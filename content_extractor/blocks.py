@@ -0,0 +1,251 @@
+import abc
+import io
+import json
+import re
+from typing import BinaryIO, Iterator, NamedTuple, Tuple, Union
+
+from .writer import TextWriter
+
+HEADER = "header"
+PARAGRAPH = "paragraph"
+
+_SPACES_RE = re.compile(r"\s+")
+_MARKDOWN_SPECIAL_RE = re.compile(r"([\\`*_\[\]<>#|])")
+_MARKDOWN_BULLET_RE = re.compile(r"^([-+])(?=\s)")
+_MARKDOWN_ORDERED_RE = re.compile(r"^(\d+)\.(?=\s)")
+
+# типы записей двоичного формата
+_RECORD_HEADER = 0
+_RECORD_PARAGRAPH = 1
+_RECORD_END = 2
+
+
+class Link(NamedTuple):
+    # позиция в тексте блока, с которой начинается текст ссылки
+    offset: int
+    url: str
+
+
+class Block(NamedTuple):
+    type: str
+    text: str
+    links: Tuple[Link, ...] = ()
+
+
+class BlockWriter(abc.ABC):
+    # принимает от обходчика документа те же события, что и TextWriter, но вместо форматирования текста
+    # собирает блоки (заголовки и параграфы) и передает готовые блоки в _render
+    def __init__(self):
+        self._blocks = []
+        self._type = PARAGRAPH
+        self._fragments = []
+        self._length = 0
+        self._links = []
+
+    def start_header(self):
+        self._finish_block()
+        self._type = HEADER
+
+    def write_header(self, text: str):
+        self._write(HEADER, text)
+
+    def start_paragraph(self):
+        self._finish_block()
+        self._type = PARAGRAPH
+
+    def write_paragraph(self, text: str):
+        self._write(PARAGRAPH, text)
+
+    def write_link(self, url: str):
+        self._links.append(Link(self._length + 1 if self._fragments else 0, url))
+
+    def newline(self):
+        # перевод строки в заголовке не разделяет его на части
+        if self._type == PARAGRAPH:
+            self._finish_block()
+
+    def pop_blocks(self, final: bool = False) -> list:
+        if final:
+            self._finish_block()
+        blocks = self._blocks
+        self._blocks = []
+        return blocks
+
+    def pop_text(self, final: bool = False):
+        return self._render(self.pop_blocks(final), final)
+
+    @abc.abstractmethod
+    def _render(self, blocks: list, final: bool):
+        pass
+
+    def _write(self, block_type: str, text: str):
+        if block_type != self._type:
+            self._finish_block()
+            self._type = block_type
+        normalized = _SPACES_RE.sub(" ", text).strip()
+        if not normalized:
+            return
+        if self._fragments:
+            self._length += 1
+        self._fragments.append(normalized)
+        self._length += len(normalized)
+
+    def _finish_block(self):
+        if self._fragments or self._links:
+            self._blocks.append(Block(self._type, " ".join(self._fragments), tuple(self._links)))
+        self._fragments = []
+        self._length = 0
+        self._links = []
+
+
+class MarkdownWriter(BlockWriter):
+    # текст без переносов строк: заголовки с префиксом "# ", ссылки в виде [адрес](адрес)
+    def __init__(self):
+        super().__init__()
+        self._started = False
+
+    def _render(self, blocks: list, final: bool) -> str:
+        parts = []
+        for block in blocks:
+            if self._started:
+                parts.append("\n")
+            self._started = True
+            text = _markdown_text(block)
+            parts.append(f"# {text}\n" if block.type == HEADER else f"{text}\n")
+        return "".join(parts)
+
+
+class JsonLinesWriter(BlockWriter):
+    # по одному json-объекту на блок: {"type": ..., "text": ..., "links": [{"offset": ..., "url": ...}]}
+    def _render(self, blocks: list, final: bool) -> str:
+        return "".join(json.dumps({"type": block.type, "text": block.text,
+                                   "links": [{"offset": link.offset, "url": link.url} for link in block.links]},
+                                  ensure_ascii=False) + "\n"
+                       for block in blocks)
+
+
+class BinaryWriter(BlockWriter):
+    # запись блока: тип (байт), длина текста в utf-8 и текст, количество ссылок, для каждой ссылки позиция,
+    # длина адреса в utf-8 и адрес; все числа - varint. Документ завершается записью _RECORD_END,
+    # поэтому несколько документов можно писать в один поток подряд
+    def _render(self, blocks: list, final: bool) -> bytes:
+        output = bytearray()
+        for block in blocks:
+            output.append(_RECORD_HEADER if block.type == HEADER else _RECORD_PARAGRAPH)
+            _write_string(output, block.text)
+            _write_varint(output, len(block.links))
+            for link in block.links:
+                _write_varint(output, link.offset)
+                _write_string(output, link.url)
+        if final:
+            output.append(_RECORD_END)
+        return bytes(output)
+
+
+def read_binary_blocks(source: Union[bytes, BinaryIO]) -> Iterator[list]:
+    # читает документы, записанные BinaryWriter, и возвращает блоки каждого документа
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    blocks = []
+    while True:
+        record_type = stream.read(1)
+        if not record_type:
+            if blocks:
+                raise RuntimeError("Двоичный поток блоков оборван")
+            return
+        if record_type[0] == _RECORD_END:
+            yield blocks
+            blocks = []
+            continue
+        if record_type[0] not in (_RECORD_HEADER, _RECORD_PARAGRAPH):
+            raise RuntimeError(f"Неизвестный тип записи в двоичном потоке блоков: {record_type[0]}")
+        text = _read_string(stream)
+        links = tuple(Link(_read_varint(stream), _read_string(stream)) for _ in range(_read_varint(stream)))
+        blocks.append(Block(HEADER if record_type[0] == _RECORD_HEADER else PARAGRAPH, text, links))
+
+
+class _OutputFormat(NamedTuple):
+    writer: type
+    suffix: str
+    content_type: str
+
+
+OUTPUT_FORMATS = {
+    "text": _OutputFormat(TextWriter, ".txt", "text/plain; charset=utf-8"),
+    "markdown": _OutputFormat(MarkdownWriter, ".md", "text/markdown; charset=utf-8"),
+    "jsonl": _OutputFormat(JsonLinesWriter, ".jsonl", "application/x-ndjson; charset=utf-8"),
+    "binary": _OutputFormat(BinaryWriter, ".bin", "application/octet-stream"),
+}
+
+
+def check_output_format(output_format: str):
+    if output_format not in OUTPUT_FORMATS:
+        raise RuntimeError(f"Неизвестный формат вывода: {output_format}, "
+                           f"допустимые значения: {', '.join(OUTPUT_FORMATS)}")
+
+
+def create_writer(output_format: str = "text"):
+    check_output_format(output_format)
+    return OUTPUT_FORMATS[output_format].writer()
+
+
+def output_suffix(output_format: str) -> str:
+    check_output_format(output_format)
+    return OUTPUT_FORMATS[output_format].suffix
+
+
+def output_content_type(output_format: str) -> str:
+    check_output_format(output_format)
+    return OUTPUT_FORMATS[output_format].content_type
+
+
+def _markdown_text(block: Block) -> str:
+    parts = []
+    position = 0
+    for link in block.links:
+        parts.append(_escape_markdown(block.text[position:link.offset].strip()))
+        url = link.url.replace(" ", "%20").replace("(", "%28").replace(")", "%29")
+        parts.append(f"[{_escape_markdown(link.url)}]({url})")
+        position = link.offset
+    parts.append(_escape_markdown(block.text[position:].strip()))
+    text = " ".join(part for part in parts if part)
+    # строки, похожие на элементы списка, иначе будут разобраны как список
+    text = _MARKDOWN_BULLET_RE.sub(r"\\\1", text)
+    return _MARKDOWN_ORDERED_RE.sub(r"\1\\.", text)
+
+
+def _escape_markdown(text: str) -> str:
+    return _MARKDOWN_SPECIAL_RE.sub(r"\\\1", text)
+
+
+def _write_varint(output: bytearray, value: int):
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _write_string(output: bytearray, text: str):
+    data = text.encode("utf-8")
+    _write_varint(output, len(data))
+    output.extend(data)
+
+
+def _read_varint(stream: BinaryIO) -> int:
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise RuntimeError("Двоичный поток блоков оборван")
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _read_string(stream: BinaryIO) -> str:
+    length = _read_varint(stream)
+    data = stream.read(length)
+    if len(data) != length:
+        raise RuntimeError("Двоичный поток блоков оборван")
+    return data.decode("utf-8")
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .cache import FileLock
+
+_BOILERPLATE_FORMAT = 2
+_DEFAULT_THRESHOLD = 0.5
+# сколько документов хоста нужно увидеть, прежде чем считать блоки шаблонными
+_DEFAULT_MIN_DOCUMENTS = 5
+_DEFAULT_MAX_HOSTS = 256
+_DEFAULT_MAX_PATHS = 2048
+_DEFAULT_RECHECK_INTERVAL = 20
+_PATH_SIZE = 8
+
+
+class BoilerplateCache:
+    # Блоки, которые повторяются на страницах одного хоста: навигация, промо, подписи. Блок определяется путем
+    # элемента от body (теги и классы всех предков) и текстом элемента. Для каждого пути хранится последний
+    # текст и число документов, в которых путь встретился с этим текстом. Другой текст на том же пути
+    # сбрасывает счетчик, поэтому пути, общие для шаблонных блоков и текста статей, счет не набирают.
+    # Путь считается шаблонным, если счетчик не меньше min_documents и не меньше threshold от числа документов
+    # хоста с момента появления текста (без документов, в которых элемент был пропущен как шаблонный).
+    # Каждый recheck_interval-й документ хоста шаблонные элементы не пропускаются, а только не выводятся,
+    # чтобы заметить изменение их текста.
+    def __init__(self, file_name: str = None, threshold: float = None, min_documents: int = None,
+                 max_hosts: int = None, max_paths: int = None, recheck_interval: int = None):
+        self._file_name = file_name
+        self._threshold = threshold if threshold is not None else _DEFAULT_THRESHOLD
+        if not 0 < self._threshold <= 1:
+            raise RuntimeError(f"Доля документов для шаблонных блоков должна быть больше 0 и не больше 1: "
+                               f"{self._threshold}")
+        self._min_documents = min_documents if min_documents is not None else _DEFAULT_MIN_DOCUMENTS
+        self._max_hosts = max_hosts if max_hosts else _DEFAULT_MAX_HOSTS
+        self._max_paths = max_paths if max_paths else _DEFAULT_MAX_PATHS
+        self._recheck_interval = recheck_interval if recheck_interval else _DEFAULT_RECHECK_INTERVAL
+        self._lock = threading.Lock()
+        self._hosts = OrderedDict()
+        # состояние хостов при последней загрузке или сохранении файла, относительно него считаются
+        # счетчики, накопленные этим процессом
+        self._saved = dict()
+        if file_name and os.path.exists(file_name):
+            self._hosts = self._read()
+            self._saved = self._snapshot()
+
+    def document(self, host_name: str) -> "BoilerplateDocument":
+        with self._lock:
+            host = self._hosts.get(host_name)
+            if host is None:
+                return BoilerplateDocument(self, host_name, _EMPTY_PATHS, 0, False)
+            documents = host.documents
+        recheck = documents % self._recheck_interval == self._recheck_interval - 1
+        return BoilerplateDocument(self, host_name, host.paths, documents, recheck)
+
+    def is_boilerplate(self, entry: list, documents: int) -> bool:
+        text_hash, count, since, skipped = entry
+        return count >= self._min_documents and count >= (documents - since - skipped) * self._threshold
+
+    def is_boilerplate_path(self, paths: dict, path: bytes, documents: int) -> bool:
+        # пути хоста читаются под той же блокировкой, под которой add_document их вытесняет
+        with self._lock:
+            entry = paths.get(path)
+            return entry is not None and self.is_boilerplate(entry, documents)
+
+    def add_document(self, host_name: str, fingerprints: set, skipped: set):
+        with self._lock:
+            host = self._hosts.get(host_name)
+            if host is None:
+                host = _HostBoilerplate()
+                self._hosts[host_name] = host
+            else:
+                self._hosts.move_to_end(host_name)
+            documents = host.documents
+            host.documents += 1
+            paths = host.paths
+            # Путь с разным текстом в одном документе счет не набирает, а порядок делает результат воспроизводимым.
+            for path, text_hash in sorted(fingerprints):
+                entry = paths.get(path)
+                if entry is None or entry[0] != text_hash:
+                    paths[path] = [text_hash, 1, documents, 0]
+                else:
+                    entry[1] += 1
+                paths.move_to_end(path)
+            for path in skipped:
+                entry = paths.get(path)
+                if entry is not None:
+                    entry[3] += 1
+                    paths.move_to_end(path)
+            while len(paths) > self._max_paths:
+                paths.popitem(last=False)
+            while len(self._hosts) > self._max_hosts:
+                self._hosts.popitem(last=False)
+
+    def count_boilerplate(self, host_name: str) -> int:
+        # сколько путей хоста сейчас считаются шаблонными
+        with self._lock:
+            host = self._hosts.get(host_name)
+            if host is None:
+                return 0
+            return sum(1 for entry in host.paths.values() if self.is_boilerplate(entry, host.documents))
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+
+    def save(self):
+        # Файл могут сохранять и другие процессы (например, процессы пакетной обработки с тем же файлом),
+        # поэтому под блокировкой файла счетчики этого процесса добавляются к сохраненным на диске.
+        if not self._file_name:
+            return
+        with self._lock, FileLock(self._file_name + ".lock"):
+            self._merge(self._read() if os.path.exists(self._file_name) else OrderedDict())
+            self._saved = self._snapshot()
+            hosts = [[host_name, host.documents, [[path.hex(), text_hash.hex(), count, since, skipped]
+                                                  for path, (text_hash, count, since, skipped) in host.paths.items()]]
+                     for host_name, host in self._hosts.items()]
+            directory = os.path.dirname(os.path.abspath(self._file_name))
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"format": _BOILERPLATE_FORMAT, "hosts": hosts}, f, ensure_ascii=False)
+                os.replace(temp_path, self._file_name)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+    def _merge(self, disk_hosts: OrderedDict):
+        for host_name, disk_host in disk_hosts.items():
+            host = self._hosts.get(host_name)
+            if host is None:
+                self._hosts[host_name] = disk_host
+                continue
+            saved_documents, saved_paths = self._saved.get(host_name, (0, _EMPTY_PATHS))
+            # документы, разобранные другими процессами после загрузки, идут раньше документов этого процесса
+            other_documents = max(disk_host.documents - saved_documents, 0)
+            host.documents = disk_host.documents + host.documents - saved_documents
+            for path, entry in host.paths.items():
+                saved_entry = saved_paths.get(path)
+                if tuple(entry) == saved_entry:
+                    # путь этим процессом не менялся
+                    continue
+                disk_entry = disk_host.paths.get(path)
+                if disk_entry is not None and entry[0] == disk_entry[0]:
+                    own = saved_entry if saved_entry is not None and saved_entry[0] == entry[0] else (None, 0, 0, 0)
+                    disk_entry[1] += entry[1] - own[1]
+                    disk_entry[3] += entry[3] - own[3]
+                else:
+                    # новый текст пути видели только документы этого процесса, они идут после документов других
+                    entry[2] += other_documents
+                    disk_entry = list(entry)
+                disk_host.paths[path] = disk_entry
+            # обновляем словарь на месте: на него ссылаются разбираемые сейчас документы
+            host.paths.clear()
+            host.paths.update(disk_host.paths)
+            while len(host.paths) > self._max_paths:
+                host.paths.popitem(last=False)
+        while len(self._hosts) > self._max_hosts:
+            self._hosts.popitem(last=False)
+
+    def _snapshot(self) -> dict:
+        return {host_name: (host.documents, {path: tuple(entry) for path, entry in host.paths.items()})
+                for host_name, host in self._hosts.items()}
+
+    def _read(self) -> OrderedDict:
+        hosts = OrderedDict()
+        try:
+            with open(self._file_name, encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            raise RuntimeError(f"Файл шаблонных блоков поврежден: {self._file_name}")
+        # файл другого формата не используем, он будет перезаписан при сохранении
+        if data.get("format") != _BOILERPLATE_FORMAT:
+            return hosts
+        for host_name, documents, paths in data["hosts"][-self._max_hosts:]:
+            host = _HostBoilerplate()
+            host.documents = documents
+            for path, text_hash, count, since, skipped in paths[-self._max_paths:]:
+                host.paths[bytes.fromhex(path)] = [bytes.fromhex(text_hash), count, since, skipped]
+            hosts[host_name] = host
+        return hosts
+
+
+class BoilerplateDocument:
+    # отпечатки блоков одного документа; в кэш попадают после завершения разбора документа
+    def __init__(self, cache: BoilerplateCache, host_name: str, paths: dict, documents: int, recheck: bool):
+        self._cache = cache
+        self._host_name = host_name
+        self._paths = paths
+        self._documents = documents
+        # шаблонные элементы разбираются, но не выводятся
+        self.recheck = recheck
+        self._fingerprints = set()
+        self._skipped = set()
+
+    @staticmethod
+    def path(parent: bytes, tag: str, attrs: list) -> bytes:
+        # путь элемента от body: хэш пути родителя (пустой для элементов верхнего уровня), тега и классов
+        classes = ""
+        for name, value in attrs:
+            if name == "class":
+                classes = value or ""
+        digest = hashlib.blake2b(parent, digest_size=_PATH_SIZE)
+        digest.update(f"{tag}.{classes.lower()}".encode("utf-8"))
+        return digest.digest()
+
+    def is_boilerplate(self, path: bytes) -> bool:
+        return self._cache.is_boilerplate_path(self._paths, path, self._documents)
+
+    def skip(self, path: bytes):
+        self._skipped.add(path)
+
+    def add(self, path: bytes, fingerprint: "BlockFingerprint"):
+        if not fingerprint.empty:
+            self._fingerprints.add((path, fingerprint.digest()))
+
+    def finish(self):
+        self._cache.add_document(self._host_name, self._fingerprints, self._skipped)
+        self._fingerprints = set()
+        self._skipped = set()
+
+
+class BlockFingerprint:
+    # Отпечаток текста блока: слова собственного текста блока и отпечатки вложенных блоков в порядке документа.
+    # Каждый фрагмент текста хэшируется один раз, в самом глубоком блоке, поэтому отпечатки всех предков
+    # обходятся в O(текст + элементы), а не O(глубина x текст).
+    __slots__ = ("_hash", "_digest", "empty")
+
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=_PATH_SIZE)
+        self._digest = None
+        self.empty = True
+
+    def add_text(self, text: str):
+        words = text.lower().split()
+        if words:
+            self._hash.update(" ".join(words).encode("utf-8"))
+            self._hash.update(b" ")
+            self.empty = False
+
+    def add_block(self, fingerprint: "BlockFingerprint"):
+        if not fingerprint.empty:
+            self._hash.update(b"\0")
+            self._hash.update(fingerprint.digest())
+            self.empty = False
+
+    def digest(self) -> bytes:
+        if self._digest is None:
+            self._digest = self._hash.digest()
+        return self._digest
+
+
+class _HostBoilerplate:
+    def __init__(self):
+        self.documents = 0
+        # путь -> [хэш текста, документов с этим текстом, документов хоста до появления текста,
+        # документов, в которых элемент был пропущен], в порядке последнего использования
+        self.paths = OrderedDict()
+
+
+_EMPTY_PATHS = dict()
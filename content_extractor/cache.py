@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_CACHE_FORMAT = "1"
+_DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# после вытеснения в кэше остается не больше этой доли от максимального размера
+_EVICTION_TARGET = 0.9
+# через сколько записей пересчитывать размер кэша, в который могут писать и другие процессы:
+# между пересчетами кэш может превысить предел на объем, записанный другими процессами
+_RESCAN_INTERVAL = 256
+_RESULT_SUFFIX = ".txt"
+
+
+class ResultCache:
+    def __init__(self, directory: str, max_size: int = None):
+        self._directory = directory
+        self._max_size = max_size if max_size else _DEFAULT_MAX_SIZE
+        os.makedirs(directory, exist_ok=True)
+        self._size = self._scan_size()
+        self._puts_since_scan = 0
+        if self._size > self._max_size:
+            self._evict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data: bytes, host_name: str, rules_version: str, settings: str, encoding: str = None) -> str:
+        # encoding - кодировка, в которой декодируются data; None, если data - уже декодированный текст в utf-8
+        digest = hashlib.sha256()
+        for part in (_CACHE_FORMAT, rules_version, host_name or "", settings, encoding or ""):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # время изменения файла служит меткой последнего использования для вытеснения
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return text
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            # после замены запись может сразу удалить вытеснение в другом процессе, поэтому размер берем до нее
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            _remove(temp_path)
+            raise
+
+        self._size += size
+        self._puts_since_scan += 1
+        if self._puts_since_scan >= _RESCAN_INTERVAL:
+            self._size = self._scan_size()
+            self._puts_since_scan = 0
+        if self._size > self._max_size:
+            self._evict()
+
+    def clear(self):
+        with self._lock():
+            for path, _, _ in self._entries():
+                _remove(path)
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key[:2], key + _RESULT_SUFFIX)
+
+    def _entries(self) -> list:
+        entries = []
+        for sub_directory in os.scandir(self._directory):
+            if not sub_directory.is_dir():
+                continue
+            for entry in os.scandir(sub_directory.path):
+                if not entry.name.endswith(_RESULT_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        with self._lock():
+            entries = self._entries()
+            size = sum(entry_size for _, _, entry_size in entries)
+            target_size = self._max_size * _EVICTION_TARGET
+            for path, _, entry_size in sorted(entries, key=lambda entry: entry[1]):
+                if size <= target_size:
+                    break
+                _remove(path)
+                size -= entry_size
+            self._size = size
+            self._puts_since_scan = 0
+
+    def _lock(self):
+        return FileLock(os.path.join(self._directory, ".lock"))
+
+
+class FileLock:
+    # Блокировка между процессами на файле path. Без fcntl (на Windows) работаем без блокировки: одновременное
+    # вытеснение из кэша приводит только к лишним удалениям, а при сохранении шаблонных блоков теряется
+    # только часть счетчиков.
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self._path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
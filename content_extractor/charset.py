@@ -0,0 +1,24 @@
+import codecs
+import re
+from typing import Optional
+
+# объявление кодировки должно быть в первых 1024 байтах документа, берем с запасом
+SNIFF_SIZE = 4096
+
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+_META_CHARSET_RE = re.compile(rb"<meta[^>]*?charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.IGNORECASE)
+
+
+def sniff_encoding(data: bytes) -> Optional[str]:
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+
+    for match in _META_CHARSET_RE.finditer(data[:SNIFF_SIZE]):
+        try:
+            encoding = codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            continue
+        # документ без BOM, в котором удалось прочитать meta, не может быть в utf-16
+        return "utf-8" if encoding.startswith("utf-16") else encoding
+    return None
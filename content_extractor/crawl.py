@@ -0,0 +1,320 @@
+import glob
+import gzip
+import hashlib
+import http.client
+import io
+import os
+import posixpath
+import queue
+import sys
+import tarfile
+import threading
+import time
+import urllib.parse
+import zipfile
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from .batch import run_chunks
+from .blocks import output_suffix
+from .fetcher import decompress_body
+
+_HTML_SUFFIXES = (".html", ".htm", ".shtml", ".xhtml")
+_WARC_SUFFIXES = (".warc", ".warc.gz")
+
+
+class CrawlEntry(NamedTuple):
+    # путь результата относительно выходного каталога
+    output_name: str
+    host_name: str
+    file_name: Optional[str] = None
+    data: Optional[bytes] = None
+    encoding: Optional[str] = None
+
+
+class CrawlSummary:
+    def __init__(self):
+        self.documents = 0
+        self.bytes = 0
+        self.errors = 0
+        self.written = 0
+        self.unchanged = 0
+        self.seconds = 0.0
+
+    def __str__(self) -> str:
+        seconds = self.seconds if self.seconds > 0 else 1e-9
+        return (f"Обработано документов: {self.documents} ({self.bytes / 1024 / 1024:.1f} МБ) за {self.seconds:.1f} с, "
+                f"{self.documents / seconds:.1f} док/с, {self.bytes / 1024 / 1024 / seconds:.2f} МБ/с. "
+                f"Записано: {self.written}, без изменений: {self.unchanged}, ошибок: {self.errors}")
+
+
+def iter_entries(source: str, host_name: str = None, encoding: str = None,
+                 suffix: str = ".txt") -> Iterator[CrawlEntry]:
+    if os.path.isdir(source):
+        yield from _directory_entries(source, host_name, encoding, suffix)
+    elif source.endswith(_WARC_SUFFIXES):
+        yield from _warc_entries(source, host_name, suffix)
+    elif os.path.isfile(source) and zipfile.is_zipfile(source):
+        yield from _zip_entries(source, host_name, encoding, suffix)
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        yield from _tar_entries(source, host_name, encoding, suffix)
+    else:
+        for file_name in sorted(glob.glob(source, recursive=True)):
+            entry = _path_entry(os.path.relpath(file_name, _glob_root(source)), host_name, suffix,
+                                file_name=file_name, encoding=encoding)
+            if entry is not None and os.path.isfile(file_name):
+                yield entry
+
+
+def crawl(rules_file_name: str, source: str, output_directory: str, extractor_options: dict = None,
+          host_name: str = None, encoding: str = None, workers: int = None, chunk_size: int = 8) -> CrawlSummary:
+    summary = CrawlSummary()
+    start = time.perf_counter()
+    writer = OutputWriter(output_directory)
+    suffix = output_suffix((extractor_options or dict()).get("output_format", "text"))
+    try:
+        chunks = _split_to_chunks(iter_entries(source, host_name, encoding, suffix), chunk_size)
+        results = run_chunks(rules_file_name, _extract_entries, chunks, extractor_options=extractor_options,
+                             workers=workers, ordered=False)
+        for output_name, size, text, error in results:
+            summary.documents += 1
+            summary.bytes += size
+            if error is not None:
+                summary.errors += 1
+                print(f"Ошибка обработки {output_name}: {error}", file=sys.stderr)
+                continue
+            writer.write(output_name, text)
+    finally:
+        writer.close()
+    summary.written = writer.written
+    summary.unchanged = writer.unchanged
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+class OutputWriter:
+    def __init__(self, directory: str, max_pending: int = 256):
+        self._directory = directory
+        self._queue = queue.Queue(max_pending)
+        self._directories = set()
+        self._error = None
+        self.written = 0
+        self.unchanged = 0
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, output_name: str, text: str):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((output_name, text))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+
+    def _write(self, output_name: str, text):
+        path = os.path.join(self._directory, output_name)
+        directory = os.path.realpath(self._directory)
+        if os.path.commonpath([directory, os.path.realpath(path)]) != directory:
+            raise RuntimeError(f"Файл результата вне выходного каталога: {output_name}")
+        data = text if isinstance(text, bytes) else text.encode("utf-8")
+        directory = os.path.dirname(path)
+        # каталоги создаются один раз на запуск, а не перед каждым файлом
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        if _same_content(path, data):
+            self.unchanged += 1
+            return
+        with open(path, "wb") as f:
+            f.write(data)
+        self.written += 1
+
+
+def _same_content(path: str, data: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except FileNotFoundError:
+        return False
+
+
+def _split_to_chunks(entries: Iterable[CrawlEntry], chunk_size: int) -> Iterator[list]:
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _extract_entries(extractor, chunk: list) -> list:
+    results = []
+    for entry in chunk:
+        try:
+            if entry.file_name is not None:
+                size = os.path.getsize(entry.file_name)
+                text = extractor.extract_from_file(entry.file_name, encoding=entry.encoding,
+                                                   host_name=entry.host_name)
+            else:
+                size = len(entry.data)
+                text = extractor.extract_from_bytes(entry.data, host_name=entry.host_name, encoding=entry.encoding)
+        except Exception as e:
+            results.append((entry.output_name, 0, None, f"{type(e).__name__}: {e}"))
+            continue
+        results.append((entry.output_name, size, text, None))
+    return results
+
+
+def _directory_entries(directory: str, host_name: str, encoding: str, suffix: str) -> Iterator[CrawlEntry]:
+    for root, directories, file_names in os.walk(directory):
+        directories.sort()
+        for file_name in sorted(file_names):
+            if not file_name.lower().endswith(_HTML_SUFFIXES):
+                continue
+            path = os.path.join(root, file_name)
+            yield _path_entry(os.path.relpath(path, directory), host_name, suffix, file_name=path, encoding=encoding)
+
+
+def _zip_entries(file_name: str, host_name: str, encoding: str, suffix: str) -> Iterator[CrawlEntry]:
+    with zipfile.ZipFile(file_name) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(_HTML_SUFFIXES):
+                continue
+            entry = _path_entry(info.filename, host_name, suffix, encoding=encoding)
+            if entry is not None:
+                yield entry._replace(data=archive.read(info))
+
+
+def _tar_entries(file_name: str, host_name: str, encoding: str, suffix: str) -> Iterator[CrawlEntry]:
+    with tarfile.open(file_name) as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.lower().endswith(_HTML_SUFFIXES):
+                continue
+            entry = _path_entry(member.name, host_name, suffix, encoding=encoding)
+            if entry is not None:
+                yield entry._replace(data=archive.extractfile(member).read())
+
+
+def _warc_entries(file_name: str, host_name: str, suffix: str) -> Iterator[CrawlEntry]:
+    for headers, block in _warc_records(file_name):
+        if headers.get("warc-type") != "response" or not headers.get("warc-target-uri"):
+            continue
+        response = _parse_http_response(block)
+        if response is None:
+            continue
+        status, http_headers, body = response
+        if status != 200 or http_headers.get_content_type() not in ("text/html", "application/xhtml+xml"):
+            continue
+        url = urllib.parse.urlsplit(headers["warc-target-uri"])
+        entry_host_name = url.hostname if url.hostname else host_name
+        yield CrawlEntry(_url_output_name(url, host_name, suffix), entry_host_name, data=decompress_body(body, http_headers),
+                         encoding=http_headers.get_content_charset())
+
+
+def _warc_records(file_name: str) -> Iterator[tuple]:
+    # файлы .warc.gz состоят из отдельных gzip-блоков на каждую запись, gzip.open читает их подряд
+    with (gzip.open(file_name, "rb") if file_name.endswith(".gz") else open(file_name, "rb")) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b"WARC/"):
+                raise RuntimeError(f"Некорректная запись в файле WARC {file_name}: {line[:50]!r}")
+            headers = dict()
+            for line in iter(f.readline, b""):
+                if not line.strip():
+                    break
+                name, _, value = line.decode("utf-8", errors="replace").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            yield headers, f.read(int(headers.get("content-length", 0)))
+
+
+def _parse_http_response(block: bytes) -> Optional[tuple]:
+    stream = io.BytesIO(block)
+    status_line = stream.readline().split(maxsplit=2)
+    if len(status_line) < 2 or not status_line[0].startswith(b"HTTP/") or not status_line[1].isdigit():
+        return None
+    headers = http.client.parse_headers(stream)
+    body = stream.read()
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        body = _dechunk(body)
+    return int(status_line[1]), headers, body
+
+
+def _dechunk(body: bytes) -> bytes:
+    stream = io.BytesIO(body)
+    parts = []
+    while True:
+        size_line = stream.readline()
+        if not size_line:
+            break
+        size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            break
+        parts.append(stream.read(size))
+        stream.readline()
+    return b"".join(parts)
+
+
+def _path_entry(name: str, host_name: str, suffix: str, **kwargs) -> Optional[CrawlEntry]:
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    # записи архива вида ../file.html не должны попадать за пределы выходного каталога
+    if name == ".." or name.startswith("../"):
+        return None
+    # зеркало сайта обычно лежит в каталоге с именем хоста: lenta.ru/news/2023/07/04/page.html
+    parts = name.split("/")
+    if len(parts) > 1 and "." in parts[0]:
+        entry_host_name = parts[0]
+    else:
+        entry_host_name = host_name if host_name else "*"
+    return CrawlEntry(posixpath.splitext(name)[0] + suffix, entry_host_name, **kwargs)
+
+
+def _url_output_name(url: urllib.parse.SplitResult, host_name: str, suffix: str) -> str:
+    # путь декодируется и нормализуется от корня, поэтому адреса вида http://host/../../file.html
+    # и %2e%2e не выводят результат за пределы каталога хоста
+    path = urllib.parse.unquote(url.path).replace("\\", "/")
+    name = posixpath.normpath("/" + path).lstrip("/")
+    if not name or path.endswith("/"):
+        name = posixpath.join(name, "index")
+    else:
+        name = posixpath.splitext(name)[0]
+    if url.query:
+        name += "_" + hashlib.sha1(url.query.encode("utf-8")).hexdigest()[:8]
+    # у адресов без хоста (urn:..., file:///...) результат кладется в каталог домена из параметров
+    for directory in (url.hostname, host_name):
+        if directory not in (None, "", "*", ".", "..") and "/" not in directory and "\\" not in directory:
+            return f"{directory}/{name}{suffix}"
+    return name + suffix
+
+
+def _glob_root(pattern: str) -> str:
+    # для одного файла имя результата строится от его имени, а не от пустого относительного пути
+    if os.path.isfile(pattern):
+        return os.path.dirname(pattern) or "."
+    root = []
+    for part in pattern.replace("\\", "/").split("/"):
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    return "/".join(root) if root else "."
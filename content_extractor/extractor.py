@@ -1,108 +1,486 @@
+import asyncio
+import codecs
+import io
+import mmap
+import os
+import stat
+import threading
+import urllib.error
 import urllib.request
 import urllib.parse
-from collections import deque
+from contextlib import contextmanager, nullcontext
 from enum import Enum
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple, Union
 
-from .rules import Rules
-from .writer import TextWriter
-from .html import FilteredHtmlParser, HtmlParserListener
+from . import batch
+from .blocks import check_output_format, create_writer
+from .boilerplate import BlockFingerprint, BoilerplateCache, BoilerplateDocument
+from .cache import ResultCache
+from .charset import SNIFF_SIZE, sniff_encoding
+from .fetcher import ACCEPT_ENCODING, AsyncFetcher, Validators, decode_body
+from .rules import Rules, ElementClass, ElementClassifier, RulesWatcher, load_rules
+from .stats import ExtractionStats
+from .url_store import StoredExtraction, UrlStore
+from .writer import DEFAULT_MAX_LINE_LENGTH, TextWriter
+from .html import HtmlParserListener, check_parser_backend, create_parser
+
+
+_STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class ContentExtractor:
+    # Один экстрактор можно использовать из нескольких потоков: правила после загрузки не меняются, кэши классов
+    # элементов и хостов - словари с атомарными операциями, а обходчик и писатель создаются для каждого документа.
+
+    def __init__(self, rules_file_name: str = None, binary_rules_cache: bool = False,
+                 rules_reload_interval: float = None, prescan: bool = True, parser_backend: str = "html.parser",
+                 instrumentation: bool = False, on_stats: Callable[[ExtractionStats], None] = None,
+                 cache_directory: str = None, cache_max_size: int = None, url_store_directory: str = None,
+                 output_format: str = "text", learn_boilerplate: bool = False, boilerplate_file: str = None,
+                 boilerplate_threshold: float = None):
+        check_output_format(output_format)
+        if output_format == "binary" and (cache_directory or url_store_directory):
+            raise RuntimeError("Кэш результатов и хранилище адресов не поддерживают двоичный формат вывода")
+        learn_boilerplate = learn_boilerplate or boilerplate_file is not None
+        if learn_boilerplate and (cache_directory or url_store_directory):
+            # результат разбора зависит от ранее разобранных документов хоста
+            raise RuntimeError("Кэш результатов и хранилище адресов нельзя использовать вместе с поиском "
+                               "шаблонных блоков")
+        self._rules_file_name = rules_file_name
+        self._binary_rules_cache = binary_rules_cache
+        self._prescan = prescan
+        self._parser_backend = parser_backend
+        self._output_format = output_format
+        self._instrumentation = instrumentation or on_stats is not None
+        self._on_stats = on_stats
+        self._stats = ExtractionStats() if self._instrumentation else None
+        self._stats_lock = threading.Lock()
+        self._cache_directory = cache_directory
+        self._cache_max_size = cache_max_size
+        self._result_cache = ResultCache(cache_directory, cache_max_size) if cache_directory else None
+        self._url_store_directory = url_store_directory
+        self._url_store = UrlStore(url_store_directory) if url_store_directory else None
+        self._boilerplate_file = boilerplate_file
+        self._boilerplate_threshold = boilerplate_threshold
+        self._boilerplate = None
+        if learn_boilerplate:
+            self._boilerplate = BoilerplateCache(boilerplate_file, threshold=boilerplate_threshold)
+        # все, кроме правил и документа, от чего зависит результат разбора
+        self._result_settings = f"parser={parser_backend};width={DEFAULT_MAX_LINE_LENGTH};format={output_format}"
+        check_parser_backend(parser_backend)
+        self._rules = load_rules(rules_file_name, binary_cache=binary_rules_cache)
+        self._rules_watcher = None
+        if rules_reload_interval:
+            self._rules_watcher = RulesWatcher(rules_file_name, rules_reload_interval, self._set_rules,
+                                               binary_cache=binary_rules_cache)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._rules_watcher:
+            self._rules_watcher.stop()
+            self._rules_watcher = None
+        if self._boilerplate is not None:
+            self._boilerplate.save()
+
+    @property
+    def stats(self) -> ExtractionStats:
+        return self._stats
+
+    @property
+    def result_cache(self) -> ResultCache:
+        return self._result_cache
+
+    @property
+    def boilerplate_cache(self) -> BoilerplateCache:
+        return self._boilerplate
+
+    @property
+    def rules_version(self) -> str:
+        return self._rules.version
 
-    def __init__(self, rules_file_name: str = None):
-        self._rules = Rules()
-        self._rules.load(file_name=rules_file_name)
+    def extract(self, address: str, encoding: str = None, host_name: str = "*") -> str:
+        if urllib.parse.urlparse(address).scheme:
+            return self.extract_from_url(address)
+        return self.extract_from_file(address, encoding=encoding, host_name=host_name)
+
+    def extract_many(self, addresses: Iterable, encoding: str = None, host_name: str = "*", workers: int = None,
+                     ordered: bool = True, chunk_size: int = 8, max_pending_chunks: int = None,
+                     threads: bool = False) -> Iterator[Tuple[str, str]]:
+        if threads:
+            # документы разбираются этим же экстрактором в пуле потоков, с общими правилами и кэшами
+            return batch.extract_many_in_threads(self, addresses, encoding=encoding, host_name=host_name,
+                                                 workers=workers, ordered=ordered, chunk_size=chunk_size,
+                                                 max_pending_chunks=max_pending_chunks)
+        # в процессах пакетной обработки создаются такие же экстракторы, но без перезагрузки правил и статистики
+        extractor_options = {"binary_rules_cache": self._binary_rules_cache, "prescan": self._prescan,
+                             "parser_backend": self._parser_backend, "cache_directory": self._cache_directory,
+                             "cache_max_size": self._cache_max_size, "url_store_directory": self._url_store_directory,
+                             "output_format": self._output_format,
+                             "learn_boilerplate": self._boilerplate is not None,
+                             "boilerplate_file": self._boilerplate_file,
+                             "boilerplate_threshold": self._boilerplate_threshold}
+        return batch.extract_many(self._rules_file_name, addresses, extractor_options=extractor_options,
+                                  encoding=encoding, host_name=host_name, workers=workers, ordered=ordered,
+                                  chunk_size=chunk_size, max_pending_chunks=max_pending_chunks)
 
     def extract_from_url(self, url_text: str) -> str:
         url = urllib.parse.urlparse(url_text)
-        html = self._load_by_url(url_text)
-        return self._extract_from(url.hostname, html)
+        stats = self._new_stats(url_text, url.hostname)
+        stored = self._stored_extraction(url_text)
+        html, validators = self._load_by_url(url_text, stats, stored.validators if stored else None)
+        if html is None:
+            return stored.text
+        text = self._extract_from(url.hostname, html, stats)
+        self._store_extraction(url_text, validators, text)
+        return text
 
-    def extract_from_file(self, file_name: str, encoding: str = "utf-8", host_name: str = "*") -> str:
-        with open(file_name, encoding=encoding) as f:
-            html = f.read()
-            return self._extract_from(host_name, html)
+    def extract_from_file(self, file_name: str, encoding: str = None, host_name: str = "*") -> str:
+        stats = self._new_stats(file_name, host_name)
+        with open(file_name, "rb") as f, _map_file(f) as data:
+            return self._extract_from_data(data, host_name, encoding, stats)
 
-    def _load_by_url(self, url: str) -> str:
-        request = urllib.request.Request(url)
-        response = urllib.request.urlopen(request)
-        response_encoding = response.headers.get_content_charset(failobj="utf-8")
-        return response.read().decode(response_encoding)
+    def extract_from_bytes(self, data: bytes, host_name: str = "*", encoding: str = None) -> str:
+        return self._extract_from_data(data, host_name, encoding, self._new_stats(None, host_name))
 
-    def _extract_from(self, host: str, html: str) -> str:
-        writer = TextWriter()
-        parser = FilteredHtmlParser(_HtmlWalker(host, writer, self._rules))
-        parser.feed(html)
-        return writer.get_text()
+    def extract_stream(self, source, host_name: str = "*", encoding: str = None,
+                       chunk_size: int = _STREAM_CHUNK_SIZE) -> Iterator[str]:
+        return self._extract_stream(source, host_name, encoding, chunk_size, self._new_stats(None, host_name))
 
+    def _extract_stream(self, source, host_name: str, encoding: str, chunk_size: int,
+                        stats: ExtractionStats = None) -> Iterator[str]:
+        if stats is not None:
+            yield from self._extract_stream_instrumented(source, host_name, encoding, chunk_size, stats)
+            return
+        writer = create_writer(self._output_format)
+        boilerplate = self._boilerplate.document(host_name) if self._boilerplate is not None else None
+        walker = _HtmlWalker(host_name, writer, self._rules, boilerplate)
+        parser = create_parser(walker, backend=self._parser_backend, prescan=self._prescan)
+        for chunk in _decode_chunks(source, encoding, chunk_size):
+            parser.feed_chunk(chunk)
+            text = writer.pop_text()
+            if text:
+                yield text
+            if walker.is_finished():
+                # остаток документа после области содержимого не читаем и не декодируем
+                break
+        parser.flush_chunks()
+        if boilerplate is not None:
+            boilerplate.finish()
+        yield writer.pop_text(final=True)
 
-class _State(Enum):
-    Header = 1
-    Paragraph = 2
+    def _extract_stream_instrumented(self, source, host_name: str, encoding: str, chunk_size: int,
+                                     stats: ExtractionStats) -> Iterator[str]:
+        writer = create_writer(self._output_format)
+        boilerplate = self._boilerplate.document(host_name) if self._boilerplate is not None else None
+        walker = _InstrumentedHtmlWalker(host_name, writer, self._rules, stats, boilerplate)
+        writer = _InstrumentedWriter(writer, stats)
+        parser = create_parser(walker, backend=self._parser_backend, prescan=self._prescan)
+        for chunk in _decode_chunks(source, encoding, chunk_size, stats):
+            with stats.measure("parse"):
+                parser.feed_chunk(chunk)
+            text = writer.pop_text()
+            if text:
+                yield text
+            if walker.is_finished():
+                break
+        with stats.measure("parse"):
+            parser.flush_chunks()
+        if boilerplate is not None:
+            boilerplate.finish()
+        text = writer.pop_text(final=True)
+        # обработчики парсера вызываются внутри стадии parse, их время переносим в classify и write,
+        # а время подсчета срабатываний правил не входит ни в одну стадию
+        for stage in ("classify", "write"):
+            stage_time = walker.timings.stages[stage]
+            stats.add_time(stage, stage_time.wall, stage_time.cpu)
+            stats.add_time("parse", -stage_time.wall, -stage_time.cpu)
+        accounting_time = walker.classifier_accounting.stages["classify"]
+        stats.add_time("parse", -accounting_time.wall, -accounting_time.cpu)
+        self._finish_stats(stats)
+        yield text
 
+    async def extract_from_urls(self, urls: Iterable[str],
+                                connections_per_host: int = 4) -> AsyncIterator[Tuple[str, str]]:
+        # страница, которую не удалось загрузить или разобрать, возвращается с ExtractionError вместо текста
+        async with AsyncFetcher(connections_per_host=connections_per_host) as fetcher:
+            tasks = [asyncio.ensure_future(self._fetch_and_extract(fetcher, url)) for url in urls]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
 
-class _HtmlElementType(Enum):
-    Unknown = 0
-    Header = 1
-    Paragraph = 2
+    async def _fetch_and_extract(self, fetcher: AsyncFetcher, url_text: str) -> Tuple[str, str]:
+        try:
+            html, validators, stored, stats = await self._fetch(fetcher, url_text)
+            if html is None:
+                return url_text, stored.text
+            host_name = urllib.parse.urlparse(url_text).hostname
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(None, self._extract_from, host_name, html, stats)
+            self._store_extraction(url_text, validators, text)
+            return url_text, text
+        except Exception as e:
+            error = batch.ExtractionError(f"{type(e).__name__}: {e}")
+            error.__cause__ = e
+            return url_text, error
+
+    async def _fetch(self, fetcher: AsyncFetcher,
+                     url_text: str) -> Tuple[Optional[str], Validators, Optional[StoredExtraction], ExtractionStats]:
+        stats = self._new_stats(url_text, urllib.parse.urlparse(url_text).hostname)
+        stored = self._stored_extraction(url_text)
+        with stats.measure("fetch") if stats is not None else nullcontext():
+            html, validators = await fetcher.fetch_if_modified(
+                url_text, stored.validators if stored else Validators(None, None))
+        return html, validators, stored, stats
+
+    def _set_rules(self, rules: Rules):
+        self._rules = rules
+
+    def _new_stats(self, address: str, host_name: str):
+        return ExtractionStats(address, host_name) if self._instrumentation else None
+
+    def _finish_stats(self, stats: ExtractionStats):
+        stats.documents = 1
+        with self._stats_lock:
+            self._stats.merge(stats)
+        if self._on_stats is not None:
+            self._on_stats(stats)
+
+    def _load_by_url(self, url: str, stats: ExtractionStats = None,
+                     validators: Validators = None) -> Tuple[Optional[str], Validators]:
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if validators:
+            headers.update(validators.request_headers())
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with stats.measure("fetch") if stats is not None else nullcontext():
+                response = urllib.request.urlopen(request)
+                data = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and validators:
+                return None, validators
+            raise
+        with stats.measure("decode") if stats is not None else nullcontext():
+            return decode_body(data, response.headers), Validators.from_headers(response.headers)
+
+    def _url_store_version(self) -> str:
+        return f"{self._rules.version};{self._result_settings}"
+
+    def _stored_extraction(self, url_text: str) -> Optional[StoredExtraction]:
+        if self._url_store is None:
+            return None
+        return self._url_store.get(url_text, self._url_store_version())
+
+    def _store_extraction(self, url_text: str, validators: Validators, text: str):
+        if self._url_store is not None:
+            self._url_store.put(url_text, self._url_store_version(), validators, text)
+
+    def _extract_from(self, host: str, html: str, stats: ExtractionStats = None) -> str:
+        if self._result_cache is not None:
+            return self._extract_cached(html.encode("utf-8"), host, None, lambda: (html,), stats)
+        return _join_output(self._extract_stream((html,), host, None, _STREAM_CHUNK_SIZE, stats))
+
+    def _extract_from_data(self, data, host_name: str, encoding: str, stats: ExtractionStats = None) -> str:
+        if self._result_cache is not None:
+            # одни и те же байты в разных кодировках дают разный текст, поэтому кодировка входит в ключ кэша
+            encoding = codecs.lookup(encoding or sniff_encoding(data[:SNIFF_SIZE]) or "utf-8").name
+            return self._extract_cached(data, host_name, encoding,
+                                        lambda: _decode_windows(data, encoding, _STREAM_CHUNK_SIZE), stats)
+        chunks = _decode_windows(data, encoding, _STREAM_CHUNK_SIZE)
+        return _join_output(self._extract_stream(chunks, host_name, None, _STREAM_CHUNK_SIZE, stats))
+
+    def _extract_cached(self, data: bytes, host_name: str, encoding: Optional[str], source_factory: Callable,
+                        stats: ExtractionStats = None) -> str:
+        key = ResultCache.key(data, host_name, self._rules.version, self._result_settings, encoding)
+        text = self._result_cache.get(key)
+        if text is None:
+            text = "".join(self._extract_stream(source_factory(), host_name, None, _STREAM_CHUNK_SIZE, stats))
+            self._result_cache.put(key, text)
+        return text
+
+
+def _join_output(parts: Iterable) -> Union[str, bytes]:
+    # двоичный формат вывода возвращает части документа в bytes, остальные форматы - в str
+    parts = list(parts)
+    return b"".join(parts) if parts and isinstance(parts[0], bytes) else "".join(parts)
+
+
+def _decode_chunks(source, encoding: str, chunk_size: int, stats: ExtractionStats = None) -> Iterator[str]:
+    if encoding is None:
+        headers = getattr(source, "headers", None)
+        encoding = headers.get_content_charset(failobj="utf-8") if headers is not None else "utf-8"
+    chunks = _read_chunks(source, chunk_size) if hasattr(source, "read") else source
+    if stats is not None:
+        # чтение из файла или ответа сервера (вместе с декодированием в text-режиме) считаем загрузкой
+        chunks = stats.timed(chunks, "fetch")
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            yield chunk
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(encoding)()
+        if stats is not None:
+            with stats.measure("decode"):
+                text = decoder.decode(chunk)
+        else:
+            text = decoder.decode(chunk)
+        if text:
+            yield text
+    if decoder is not None:
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+
+@contextmanager
+def _map_file(f):
+    # пустые файлы, каналы и устройства (например, /dev/stdin) в память не отображаются, их читаем целиком
+    info = os.fstat(f.fileno())
+    if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+        yield f.read()
+        return
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        yield f.read()
+        return
+    with data:
+        yield data
+
+
+def _decode_windows(data, encoding: str, window: int) -> Iterator[str]:
+    if encoding is None:
+        encoding = sniff_encoding(data[:SNIFF_SIZE]) or "utf-8"
+    # переводы строк приводим так же, как open в текстовом режиме
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    for position in range(0, len(data), window):
+        text = decoder.decode(data[position:position + window])
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def _read_chunks(source, chunk_size: int) -> Iterator:
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
 
 
-class _HtmlElement:
-    def __init__(self, element_type: _HtmlElementType, tag: str, attrs: list, skip_element=False):
-        self.element_type: _HtmlElementType = element_type
-        self.tag: str = tag
-        self.attrs: list = attrs
-        self.data: str = ""
-        self.skip_element: bool = skip_element
+class _State(Enum):
+    Header = 1
+    Paragraph = 2
 
-    def __str__(self) -> str:
-        return f"<{self.tag} __skip_element={self.skip_element} attrs={self.attrs}/>"
 
-    def __repr__(self) -> str:
-        return f"<{self.tag} __skip_element={self.skip_element} attrs={self.attrs}/>"
+# элементы стека обхода: для закрытия тега нужно знать только, пропускается ли элемент и является ли он заголовком
+_ELEMENT_PLAIN = 0
+_ELEMENT_HEADER = 1
+_ELEMENT_SKIPPED = 2
+# признаки элемента, текст которого запоминается для поиска шаблонных блоков,
+# и шаблонного элемента, который разбирается для проверки, но не выводится
+_ELEMENT_TRACKED = 4
+_ELEMENT_MUTED = 8
 
 
 class _HtmlWalker(HtmlParserListener):
-    def __init__(self, host_name: str, writer: TextWriter, elements_filter: Rules):
+    def __init__(self, host_name: str, writer: TextWriter, elements_filter: Rules,
+                 boilerplate: BoilerplateDocument = None):
         self._writer = writer
-        self._stack = deque()
+        self._stack = []
         self._in_header_node_deep: int = 0
         self._in_ignored_node_deep: int = 0
         self._state: _State = _State.Paragraph
         self._filter = elements_filter
         self._host_name = host_name
+        self._classifier = elements_filter.classifier(host_name)
+        # с правилами start: документ разбирается только внутри первого элемента-начала области содержимого,
+        # после его закрытия или после элемента из правил stop: разбор завершается
+        self._has_region = self._classifier.has_start_rules
+        self._region_tag = None
+        self._outside_content = self._has_region
+        self._finished = False
+        # пути и отпечатки текста отслеживаемых элементов
+        self._boilerplate = boilerplate
+        self._in_muted_node_deep = 0
+        self._paths = []
+        self._fingerprints = []
 
     def on_starttag(self, tag: str, attrs):
-        super().on_starttag(tag, attrs)
-
-        element_type = self._detect_element_type(attrs, tag)
-        skip_element_content = self._should_skip(tag, attrs)
-        self._stack.append(_HtmlElement(element_type, tag, attrs, skip_element=skip_element_content))
+        if self._outside_content:
+            self._on_starttag_outside_content(tag, attrs)
+            return
+        if self._in_ignored_node_deep > 0 and self._in_header_node_deep == 0:
+            # внутри пропускаемого элемента тип вложенных элементов важен только для закрытия заголовков
+            # (см. on_endtag), а вне заголовка их закрытие ничего не меняет, поэтому не классифицируем
+            self._stack.append(_ELEMENT_PLAIN)
+            return
 
-        if skip_element_content:
+        element_class = self._classifier.classify(tag, attrs)
+        if element_class.stop:
+            self._finish()
+            return
+        if element_class.exclude:
+            self._stack.append(_ELEMENT_SKIPPED)
             self._in_ignored_node_deep += 1
-        if self._in_ignored_node_deep > 0:
+            return
+        element = _ELEMENT_HEADER if element_class.header else _ELEMENT_PLAIN
+        if self._boilerplate is not None and self._in_ignored_node_deep == 0:
+            path = self._boilerplate.path(self._paths[-1] if self._paths else b"", tag, attrs)
+            if self._boilerplate.is_boilerplate(path):
+                if not self._boilerplate.recheck:
+                    self._boilerplate.skip(path)
+                    self._stack.append(_ELEMENT_SKIPPED)
+                    self._in_ignored_node_deep += 1
+                    return
+                element += _ELEMENT_MUTED
+                self._in_muted_node_deep += 1
+            self._paths.append(path)
+            self._fingerprints.append(BlockFingerprint())
+            element += _ELEMENT_TRACKED
+        self._stack.append(element)
+        if self._in_ignored_node_deep > 0 or self._in_muted_node_deep > 0:
             return
 
         if tag == "a":
             self._on_link(attrs)
         elif tag == "br":
             self._writer.newline()
-        elif element_type == _HtmlElementType.Header:
+        elif element_class.header:
             self._in_header_node_deep = self._in_header_node_deep + 1
             is_header_started = self._in_header_node_deep == 1
             if is_header_started:
                 self._state = _State.Header
                 self._writer.start_header()
-        elif element_type == _HtmlElementType.Paragraph:
+        elif element_class.paragraph:
             if self._state == _State.Paragraph:
                 self._writer.start_paragraph()
 
+    def skips_content(self) -> bool:
+        return self._in_ignored_node_deep > 0 and self._in_header_node_deep == 0
+
+    def is_finished(self) -> bool:
+        return self._finished
+
     def on_data(self, data: str):
-        super().on_data(data)
-        if self._in_ignored_node_deep > 0:
+        if self._in_ignored_node_deep > 0 or self._outside_content:
             return
+        if self._boilerplate is not None:
+            if self._fingerprints:
+                self._fingerprints[-1].add_text(data)
+            if self._in_muted_node_deep > 0:
+                return
 
         if self._state == _State.Header:
             self._writer.write_header(data)
@@ -110,37 +488,130 @@ class _HtmlWalker(HtmlParserListener):
             self._writer.write_paragraph(data)
 
     def on_endtag(self, tag: str):
-        super().on_endtag(tag)
-        el: _HtmlElement = self._stack.pop()
-        if el.skip_element:
+        if self._outside_content or not self._stack:
+            # закрывающий тег без открывающего не меняет состояние обхода
+            return
+        element = self._stack.pop()
+        if self._has_region and not self._stack and tag == self._region_tag:
+            self._finish()
+            return
+        if element == _ELEMENT_SKIPPED:
             self._in_ignored_node_deep = max(self._in_ignored_node_deep - 1, 0)
             return
+        if element >= _ELEMENT_MUTED:
+            self._in_muted_node_deep -= 1
+            element -= _ELEMENT_MUTED
+        if element >= _ELEMENT_TRACKED:
+            self._add_fingerprint()
+            element -= _ELEMENT_TRACKED
 
-        if el.element_type == _HtmlElementType.Header:
+        if element == _ELEMENT_HEADER:
             self._in_header_node_deep = max(self._in_header_node_deep - 1, 0)
             if self._in_header_node_deep == 0:
                 self._state = _State.Paragraph
 
-    def _detect_element_type(self, attrs, tag):
-        element_type: _HtmlElementType
-        if self._is_header(tag, attrs):
-            element_type = _HtmlElementType.Header
-        elif self._is_paragraph(tag, attrs):
-            element_type = _HtmlElementType.Paragraph
-        else:
-            element_type = _HtmlElementType.Unknown
-        return element_type
+    def _on_starttag_outside_content(self, tag: str, attrs):
+        # до начала области содержимого элементы только классифицируются
+        if self._finished or not self._classifier.classify(tag, attrs).start:
+            return
+        self._outside_content = False
+        self._region_tag = tag
+        self.on_starttag(tag, attrs)
 
-    def _is_header(self, tag, attrs) -> bool:
-        return self._filter.is_header(self._host_name, tag, attrs)
+    def _finish(self):
+        self._finished = True
+        self._outside_content = True
 
-    def _is_paragraph(self, tag, attrs):
-        return self._filter.is_paragraph(self._host_name, tag, attrs)
+    def _add_fingerprint(self):
+        fingerprint = self._fingerprints.pop()
+        self._boilerplate.add(self._paths.pop(), fingerprint)
+        if self._fingerprints:
+            self._fingerprints[-1].add_block(fingerprint)
 
     def _on_link(self, attrs):
         attrs_dict = dict(attrs)
         if "href" in attrs_dict:
             self._writer.write_link(attrs_dict["href"])
 
-    def _should_skip(self, tag, attrs) -> bool:
-        return self._filter.exclude(self._host_name, tag, attrs)
+
+class _InstrumentedClassifier:
+    # Класс элемента берется тем же путем, что без инструментирования. Проверки правил и срабатывания
+    # считаются только при промахе кэша, когда правила действительно проверяются; их подсчет идет
+    # в отдельный замер accounting, который не входит ни в одну стадию.
+    def __init__(self, classifier: ElementClassifier, stats: ExtractionStats, timings: ExtractionStats):
+        self._classifier = classifier
+        self._stats = stats
+        self._timings = timings
+        self.accounting = ExtractionStats()
+
+    def classify(self, tag: str, attrs) -> ElementClass:
+        with self._timings.measure("classify"):
+            element_class, cache_hit = self._classifier.lookup(tag, attrs)
+        if cache_hit:
+            self._stats.cache_hits += 1
+            return element_class
+        self._stats.cache_misses += 1
+        with self.accounting.measure("classify"):
+            self._stats.rule_evaluations += self._classifier.rule_evaluations(tag, attrs)
+            self._stats.rule_hits.update(self._classifier.matching_rules(tag, attrs))
+        return element_class
+
+
+class _InstrumentedWriter:
+    def __init__(self, writer: TextWriter, stats: ExtractionStats):
+        self._writer = writer
+        self._stats = stats
+
+    def start_header(self):
+        with self._stats.measure("write"):
+            self._writer.start_header()
+
+    def write_header(self, text: str):
+        with self._stats.measure("write"):
+            self._writer.write_header(text)
+
+    def start_paragraph(self):
+        with self._stats.measure("write"):
+            self._writer.start_paragraph()
+
+    def write_paragraph(self, text: str):
+        with self._stats.measure("write"):
+            self._writer.write_paragraph(text)
+
+    def write_link(self, url: str):
+        with self._stats.measure("write"):
+            self._writer.write_link(url)
+
+    def newline(self):
+        with self._stats.measure("write"):
+            self._writer.newline()
+
+    def pop_text(self, final: bool = False) -> str:
+        with self._stats.measure("write"):
+            return self._writer.pop_text(final=final)
+
+    def get_text(self) -> str:
+        with self._stats.measure("write"):
+            return self._writer.get_text()
+
+
+class _InstrumentedHtmlWalker(_HtmlWalker):
+    def __init__(self, host_name: str, writer: TextWriter, elements_filter: Rules, stats: ExtractionStats,
+                 boilerplate: BoilerplateDocument = None):
+        super().__init__(host_name, writer, elements_filter, boilerplate)
+        self._stats = stats
+        self.timings = ExtractionStats()
+        self._writer = _InstrumentedWriter(writer, self.timings)
+        self._classifier = _InstrumentedClassifier(self._classifier, stats, self.timings)
+        self.classifier_accounting = self._classifier.accounting
+
+    def on_starttag(self, tag: str, attrs):
+        self._stats.elements_visited += 1
+        if self._in_ignored_node_deep > 0:
+            self._stats.elements_skipped += 1
+        depth = len(self._stack)
+        super().on_starttag(tag, attrs)
+        # элементы вне области содержимого в стек не попадают
+        if len(self._stack) > depth and self._stack[-1] == _ELEMENT_SKIPPED:
+            self._stats.elements_excluded += 1
+
@@ -0,0 +1,192 @@
+import asyncio
+import gzip
+import http.client
+import ssl
+import sys
+import urllib.error
+import urllib.parse
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_USER_AGENT = f"Python-urllib/{sys.version_info[0]}.{sys.version_info[1]}"
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+_MAX_REDIRECTS = 10
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
+
+class Validators(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @staticmethod
+    def from_headers(headers) -> "Validators":
+        return Validators(headers.get("ETag"), headers.get("Last-Modified"))
+
+    def request_headers(self) -> dict:
+        headers = dict()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def __bool__(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+def decode_body(body: bytes, headers) -> str:
+    return decompress_body(body, headers).decode(headers.get_content_charset(failobj="utf-8"))
+
+
+def decompress_body(body: bytes, headers) -> bytes:
+    for content_encoding in reversed(headers.get("Content-Encoding", "").lower().split(",")):
+        content_encoding = content_encoding.strip()
+        if content_encoding in ("gzip", "x-gzip"):
+            body = gzip.decompress(body)
+        elif content_encoding == "deflate":
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                # часть серверов отдает deflate без zlib-заголовка
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+        elif content_encoding == "br" and brotli is not None:
+            body = brotli.decompress(body)
+        elif content_encoding not in ("", "identity"):
+            raise RuntimeError(f"Неподдерживаемое сжатие ответа: {content_encoding}")
+    return body
+
+
+class _Response:
+    def __init__(self, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class _HostConnections:
+    def __init__(self, scheme: str, host: str, port: int, limit: int, timeout: float):
+        self.semaphore = asyncio.Semaphore(limit)
+        self._scheme = scheme
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._idle = deque()
+
+    def request(self, target: str, headers: dict) -> _Response:
+        try:
+            connection = self._idle.pop()
+        except IndexError:
+            return self._request(self._connect(), target, headers)
+        try:
+            return self._request(connection, target, headers)
+        except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+            # сервер мог закрыть простаивающее соединение, повторяем запрос через новое
+            return self._request(self._connect(), target, headers)
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self._timeout,
+                                               context=ssl.create_default_context())
+        return http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    def _request(self, connection: http.client.HTTPConnection, target: str, headers: dict) -> _Response:
+        try:
+            connection.request("GET", target, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._idle.append(connection)
+        return _Response(response.status, response.reason, response.headers, body)
+
+
+class AsyncFetcher:
+    def __init__(self, connections_per_host: int = 4, max_connections: int = 32, timeout: float = 30):
+        self._connections_per_host = connections_per_host
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._hosts = dict()
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # close ждет завершения запросов в потоках пула, цикл событий при этом не блокируется
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def fetch(self, url: str) -> str:
+        text, _ = await self.fetch_if_modified(url, Validators(None, None))
+        return text
+
+    async def fetch_if_modified(self, url: str, validators: Validators) -> Tuple[Optional[str], Validators]:
+        for _ in range(_MAX_REDIRECTS + 1):
+            response = await self._get(url, validators.request_headers())
+            location = response.headers.get("Location")
+            if response.status in _REDIRECT_CODES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if response.status == 304:
+                # без условных заголовков 304 - ошибка сервера: сохраненного текста, который можно вернуть, нет
+                if not validators:
+                    raise urllib.error.HTTPError(url, response.status, "Ответ 304 на безусловный запрос",
+                                                 response.headers, None)
+                return None, validators
+            if response.status >= 400:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            return decode_body(response.body, response.headers), Validators.from_headers(response.headers)
+        raise urllib.error.HTTPError(url, response.status, "Слишком много перенаправлений", response.headers, None)
+
+    def close(self):
+        # соединения закрываются только после того, как потоки пула закончили начатые на них запросы
+        self._executor.shutdown(wait=True)
+        for host in self._hosts.values():
+            host.close()
+
+    async def _get(self, url: str, extra_headers: dict) -> _Response:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise urllib.error.URLError(f"Неподдерживаемая схема адреса: {url}")
+        target = parts.path if parts.path else "/"
+        if parts.query:
+            target += "?" + parts.query
+        # netloc может содержать имя пользователя и пароль, в заголовок Host они попасть не должны
+        host_name = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+        if parts.port is not None:
+            host_name += f":{parts.port}"
+        headers = {"Host": host_name, "User-Agent": _USER_AGENT, "Connection": "keep-alive",
+                   "Accept-Encoding": ACCEPT_ENCODING}
+        headers.update(extra_headers)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_connections)
+        host = self._host_connections(parts)
+        async with self._semaphore, host.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, host.request, target, headers)
+
+    def _host_connections(self, parts: urllib.parse.SplitResult) -> _HostConnections:
+        key = (parts.scheme, parts.netloc)
+        host = self._hosts.get(key)
+        if host is None:
+            host = _HostConnections(parts.scheme, parts.hostname, parts.port, self._connections_per_host,
+                                    self._timeout)
+            self._hosts[key] = host
+        return host
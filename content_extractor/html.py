@@ -1,10 +1,36 @@
 import html.parser
 
+_VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+_STARTTAGOPEN_RE = html.parser.starttagopen
+_TAGFIND_RE = html.parser.tagfind_tolerant
+_ATTRFIND_RE = html.parser.attrfind_tolerant
+_ENDTAGFIND_RE = html.parser.endtagfind
+
+_rawtext_end_res = dict()
+
+
+def _rawtext_end_re(tag: str):
+    end_re = _rawtext_end_res.get(tag)
+    if end_re is None:
+        parser = html.parser.HTMLParser()
+        parser.set_cdata_mode(tag)
+        end_re = parser.interesting
+        _rawtext_end_res[tag] = end_re
+    return end_re
+
 
 class HtmlParserListener:
     def on_starttag(self, tag: str, attrs: list):
         pass
 
+    def skips_content(self) -> bool:
+        return False
+
+    def is_finished(self) -> bool:
+        # остаток документа можно не разбирать
+        return False
+
     def on_endtag(self, tag: str):
         pass
 
@@ -12,41 +38,270 @@ class HtmlParserListener:
         pass
 
 
-class FilteredHtmlParser(html.parser.HTMLParser):
-    _void_elements = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track",
-                      "wbr"}
-
+class BodyFilter(HtmlParserListener):
     def __init__(self, listener: HtmlParserListener):
-        super().__init__()
         self._listener = listener
-        self._in_body: bool = False
+        self.in_body: bool = False
 
-    def handle_starttag(self, tag, attrs):
-        if tag in FilteredHtmlParser._void_elements:
+    def on_starttag(self, tag: str, attrs: list):
+        if tag in _VOID_ELEMENTS:
             return
-        if not self._in_body:
+        if not self.in_body:
             if tag == "body":
-                self._in_body = True
+                self.in_body = True
             return
         self._listener.on_starttag(tag, attrs)
 
-    def handle_endtag(self, tag):
-        if tag in FilteredHtmlParser._void_elements:
+    def on_endtag(self, tag: str):
+        if tag in _VOID_ELEMENTS:
             return
-        if not self._in_body:
+        if not self.in_body:
             return
         elif tag == "body":
-            self._in_body = False
+            self.in_body = False
             return
 
         self._listener.on_endtag(tag)
 
+    def on_data(self, data: str):
+        if not self.in_body:
+            return
+        self._listener.on_data(data)
+
+    def skips_content(self) -> bool:
+        return self._listener.skips_content()
+
+    def is_finished(self) -> bool:
+        return self._listener.is_finished()
+
+
+class FilteredHtmlParser(html.parser.HTMLParser):
+    def __init__(self, listener: HtmlParserListener, prescan: bool = True):
+        super().__init__()
+        self._filter = BodyFilter(listener)
+        self._pending_chunks = []
+        self._prescan = prescan
+        self._prescan_blocked_until = 0
+
+    def feed(self, data):
+        self._prescan_blocked_until = 0
+        super().feed(data)
+
+    def feed_chunk(self, chunk: str):
+        if self._filter.is_finished():
+            return
+        # текст до границы фрагмента HTMLParser передал бы отдельным событием, поэтому
+        # разбору передаем только текст до последнего начала тега
+        tag_start = chunk.rfind("<")
+        if tag_start < 0:
+            self._pending_chunks.append(chunk)
+            return
+        self._pending_chunks.append(chunk[:tag_start])
+        self.feed("".join(self._pending_chunks))
+        self._pending_chunks = [chunk[tag_start:]]
+
+    def flush_chunks(self):
+        if self._pending_chunks and not self._filter.is_finished():
+            self.feed("".join(self._pending_chunks))
+        self._pending_chunks = []
+
+    def parse_starttag(self, i):
+        end_pos = super().parse_starttag(i)
+        if end_pos >= 0 and self._filter.is_finished():
+            return self._skip_rest()
+        if not self._prescan or end_pos < self._prescan_blocked_until or self.cdata_elem is not None:
+            return end_pos
+        if not self._filter.in_body:
+            skip_pos = self._skip_markup(end_pos, to_body=True)
+        elif self._filter.skips_content():
+            skip_pos = self._skip_markup(end_pos, to_body=False)
+        else:
+            return end_pos
+        return skip_pos if skip_pos >= 0 else end_pos
+
+    def _skip_markup(self, i: int, to_body: bool) -> int:
+        # Пропускаем разметку, события которой все равно будут отброшены: все до открытия body
+        # или остаток содержимого игнорируемого элемента до его закрывающего тега. Разбор здесь
+        # упрощенный, поэтому при любой неоднозначности возвращаем -1 и разбор идет обычным путем.
+        rawdata = self.rawdata
+        n = len(rawdata)
+        depth = 0
+        while True:
+            j = rawdata.find("<", i)
+            if j < 0 or j + 1 >= n:
+                return self._block_prescan(n)
+            if _STARTTAGOPEN_RE.match(rawdata, j):
+                tag_end = self.check_for_whole_start_tag(j)
+                if tag_end < 0:
+                    return self._block_prescan(n)
+                tag, self_closing = self._scan_starttag(j, tag_end)
+                if tag == "body":
+                    return j if to_body else self._block_prescan(j)
+                i = tag_end
+                if tag is None or self_closing or tag in _VOID_ELEMENTS:
+                    continue
+                if tag in self.CDATA_CONTENT_ELEMENTS:
+                    i = self._skip_rawtext(tag, tag_end)
+                    if i < 0:
+                        return self._block_prescan(n)
+                    continue
+                if tag in getattr(self, "RCDATA_CONTENT_ELEMENTS", ()):
+                    return self._block_prescan(j)
+                depth += 1
+            elif rawdata.startswith("</", j):
+                match = _ENDTAGFIND_RE.match(rawdata, j)
+                if not match:
+                    return self._block_prescan(j)
+                tag = match.group(1).lower()
+                i = match.end()
+                if to_body or tag in _VOID_ELEMENTS:
+                    continue
+                if tag == "body":
+                    return self._block_prescan(j)
+                if depth == 0:
+                    return j
+                depth -= 1
+            elif rawdata.startswith("<!--", j):
+                i = self.parse_comment(j)
+            elif rawdata.startswith("<![", j):
+                return self._block_prescan(j)
+            elif rawdata.startswith("<!", j):
+                i = self.parse_html_declaration(j)
+            elif rawdata.startswith("<?", j):
+                i = self.parse_pi(j)
+            else:
+                i = j + 1
+            if i < 0:
+                return self._block_prescan(n)
+
+    def parse_endtag(self, i):
+        end_pos = super().parse_endtag(i)
+        if end_pos >= 0 and self._filter.is_finished():
+            return self._skip_rest()
+        return end_pos
+
+    def _skip_rest(self) -> int:
+        # разбор завершен: весь оставшийся текст считаем разобранным, дальнейшие фрагменты не разбираются
+        self.cdata_elem = None
+        return len(self.rawdata)
+
+    def _scan_starttag(self, i: int, tag_end: int) -> tuple:
+        rawdata = self.rawdata
+        match = _TAGFIND_RE.match(rawdata, i + 1)
+        k = match.end()
+        while k < tag_end:
+            match_attr = _ATTRFIND_RE.match(rawdata, k)
+            if not match_attr:
+                break
+            k = match_attr.end()
+        end = rawdata[k:tag_end].strip()
+        if end not in (">", "/>"):
+            return None, False
+        return match.group(1).lower(), end == "/>"
+
+    def _skip_rawtext(self, tag: str, i: int) -> int:
+        match = _rawtext_end_re(tag).search(self.rawdata, i)
+        if not match:
+            return -1
+        end_tag = _ENDTAGFIND_RE.match(self.rawdata, match.start())
+        if not end_tag or end_tag.group(1).lower() != tag:
+            return -1
+        return end_tag.end()
+
+    def _block_prescan(self, i: int) -> int:
+        self._prescan_blocked_until = i
+        return -1
+
+    def handle_starttag(self, tag, attrs):
+        self._filter.on_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._filter.on_endtag(tag)
+
     def handle_startendtag(self, tag, attrs):
-        if tag in FilteredHtmlParser._void_elements:
+        if tag in _VOID_ELEMENTS:
             return
         super().handle_startendtag(tag, attrs)
 
     def handle_data(self, data):
-        if not self._in_body:
-            return
-        self._listener.on_data(data)
+        self._filter.on_data(data)
+
+
+class LxmlHtmlParser:
+    def __init__(self, listener: HtmlParserListener, prescan: bool = True):
+        from lxml import etree
+        self._filter = BodyFilter(listener)
+        self._target = _LxmlTarget(self._filter)
+        self._parser = etree.HTMLParser(target=self._target)
+
+    def feed_chunk(self, chunk: str):
+        # события внутри уже переданного фрагмента обходчик после завершения разбора пропускает сам
+        if not self._filter.is_finished():
+            self._parser.feed(chunk)
+
+    def flush_chunks(self):
+        self._parser.close()
+
+
+class _LxmlTarget:
+    # libxml2 делит текст узла на несколько событий, а html.parser передает его целиком
+    # до следующего тега или комментария, поэтому текст копим до следующего события
+    def __init__(self, listener: HtmlParserListener):
+        self._listener = listener
+        self._data = []
+
+    def start(self, tag: str, attrib: dict):
+        self._flush_data()
+        self._listener.on_starttag(tag, list(attrib.items()))
+
+    def end(self, tag: str):
+        self._flush_data()
+        self._listener.on_endtag(tag)
+
+    def data(self, data: str):
+        self._data.append(data)
+
+    def comment(self, text: str):
+        self._flush_data()
+
+    def pi(self, target: str, data: str = None):
+        self._flush_data()
+
+    def close(self):
+        self._flush_data()
+
+    def _flush_data(self):
+        if self._data:
+            self._listener.on_data("".join(self._data))
+            self._data = []
+
+
+_PARSER_BACKENDS = {
+    "html.parser": FilteredHtmlParser,
+    "lxml": LxmlHtmlParser,
+}
+
+
+def parser_backends() -> list:
+    return list(_PARSER_BACKENDS.keys())
+
+
+def is_parser_backend_available(backend: str) -> bool:
+    if backend == "lxml":
+        try:
+            import lxml.etree  # noqa: F401
+        except ImportError:
+            return False
+    return backend in _PARSER_BACKENDS
+
+
+def check_parser_backend(backend: str):
+    if backend not in _PARSER_BACKENDS:
+        raise RuntimeError(f"Неизвестный html-парсер: {backend}")
+    if not is_parser_backend_available(backend):
+        raise RuntimeError(f"html-парсер {backend} не установлен")
+
+
+def create_parser(listener: HtmlParserListener, backend: str = "html.parser", prescan: bool = True):
+    check_parser_backend(backend)
+    return _PARSER_BACKENDS[backend](listener, prescan=prescan)
@@ -1,10 +1,44 @@
+import functools
+import hashlib
+import itertools
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
 from enum import Enum
 from os.path import dirname
+from typing import NamedTuple, Tuple
 
 _DEFAULT_RULES_FILE_NAME = dirname(__file__) + "/default_rules.txt"
+_BINARY_RULES_SUFFIX = ".pickle"
+_BINARY_RULES_FORMAT = 8
+_CLASSIFICATION_CACHE_SIZE = 4096
+# сколько хостов документов помнить вместе с найденными для них правилами
+_HOST_CACHE_SIZE = 4096
 
+# секции правил домена: фильтр элементов и классификаторы
+_SECTIONS = ("filter", "header", "paragraph", "start", "stop")
 
-class Rule:
+_rules_cache = dict()
+
+
+class _Frozen:
+    # после загрузки правила не меняются, поэтому один набор правил без блокировок разбирает документы
+    # в нескольких потоках
+    _frozen = False
+
+    def freeze(self):
+        object.__setattr__(self, "_frozen", True)
+
+    def __setattr__(self, name: str, value):
+        if self._frozen:
+            raise RuntimeError(f"Загруженные правила нельзя изменить: {type(self).__name__}.{name}")
+        object.__setattr__(self, name, value)
+
+
+class Rule(_Frozen):
     def __init__(self, exclude: bool = True):
         self.exclude = exclude
 
@@ -18,33 +52,82 @@ class RuleResolution(Enum):
     Include = 2
 
 
-class Domain:
-    def __init__(self, hosts: str):
+class Domain(_Frozen):
+    def __init__(self, hosts: str, debug: bool = False):
         self._hosts: str = hosts
         self._filter_rules = []
         self._header_rules = []
         self._paragraph_rules = []
-        self._debug = False
+        self._start_rules = []
+        self._stop_rules = []
+        self._indexes = None
+        self._debug = debug
 
     def resolve(self, tag: str, attrs: list) -> RuleResolution:
-        return self._resolve(tag, attrs, self._filter_rules)
+        return self._resolve(tag, attrs, "filter")
 
     def resolve_header(self, tag, attrs: list) -> RuleResolution:
-        return self._resolve(tag, attrs, self._header_rules)
+        return self._resolve(tag, attrs, "header")
 
     def resolve_paragraph(self, tag, attrs: list) -> RuleResolution:
-        return self._resolve(tag, attrs, self._paragraph_rules)
+        return self._resolve(tag, attrs, "paragraph")
+
+    def resolve_start(self, tag, attrs: list) -> RuleResolution:
+        return self._resolve(tag, attrs, "start")
+
+    def resolve_stop(self, tag, attrs: list) -> RuleResolution:
+        return self._resolve(tag, attrs, "stop")
 
     def add_filter_rule(self, rule: Rule):
-        self._filter_rules.append(rule)
+        self._add_rule(self._filter_rules, rule)
 
     def add_header_rule(self, rule: Rule):
-        self._header_rules.append(rule)
+        self._add_rule(self._header_rules, rule)
 
     def add_paragraph_rule(self, rule: Rule):
-        self._paragraph_rules.append(rule)
+        self._add_rule(self._paragraph_rules, rule)
+
+    def add_start_rule(self, rule: Rule):
+        self._add_rule(self._start_rules, rule)
 
-    def _resolve(self, tag: str, attrs: list, rules: list) -> RuleResolution:
+    def add_stop_rule(self, rule: Rule):
+        self._add_rule(self._stop_rules, rule)
+
+    def freeze(self):
+        if self._frozen:
+            return
+        if self._indexes is None:
+            self.compile()
+        for section in _SECTIONS:
+            rules = tuple(getattr(self, f"_{section}_rules"))
+            for rule in rules:
+                rule.freeze()
+            setattr(self, f"_{section}_rules", rules)
+        super().freeze()
+
+    def compile(self):
+        # индекс правил каждой секции: проверяются только правила, относящиеся к тегу и атрибутам элемента
+        self._indexes = {section: _CompiledRuleList(getattr(self, f"_{section}_rules")) for section in _SECTIONS}
+
+    def index(self, section: str) -> "_CompiledRuleList":
+        if self._indexes is None:
+            self.compile()
+        return self._indexes[section]
+
+    def _add_rule(self, rules: list, rule: Rule):
+        if self._frozen:
+            raise RuntimeError(f"Загруженные правила нельзя изменить: domain:{self._hosts}")
+        rules.append(rule)
+        self._indexes = None
+
+    def _resolve(self, tag: str, attrs: list, section: str) -> RuleResolution:
+        if self._debug:
+            return self._resolve_by_rules(tag, attrs, getattr(self, f"_{section}_rules"))
+        attrs_dict = dict(attrs)
+        classes = (attrs_dict.get("class") or "").lower()
+        return self.index(section).resolve(tag, attrs_dict, classes, classes.split())
+
+    def _resolve_by_rules(self, tag: str, attrs: list, rules: list) -> RuleResolution:
         attrs_dict = dict(attrs)
         resolution = RuleResolution.Unknown
         for rule in rules:
@@ -62,13 +145,13 @@ class Domain:
 class TagNamesRule(Rule):
     def __init__(self, tags: str, exclude: bool = True):
         super().__init__(exclude)
-        self._tags = set(map(str.strip, tags.split(",")))
+        self._tags = frozenset(map(str.strip, tags.split(",")))
 
     def matches(self, tag: str, attrs: dict) -> bool:
         return tag in self._tags
 
     def __repr__(self) -> str:
-        return f"{'-' if self.exclude else '+'}TagNamesRule[tags={self._tags}]"
+        return f"{'-' if self.exclude else '+'}TagNamesRule[tags={set(self._tags)}]"
 
 
 class ClassNameRule(Rule):
@@ -93,7 +176,7 @@ class ClassNameRule(Rule):
             self._equals = True
 
     def matches(self, tag: str, attrs: dict) -> bool:
-        class_names = (attrs["class"] if "class" in attrs else "").lower().split()
+        class_names = (attrs.get("class") or "").lower().split()
         condition_value = self._condition_value
         for cls in class_names:
             if self._substring and condition_value in cls:
@@ -138,7 +221,7 @@ class AttributeRule(Rule):
     def matches(self, tag: str, attrs: dict) -> bool:
         if self._attr not in attrs:
             return False
-        attr_value = attrs[self._attr].lower()
+        attr_value = (attrs[self._attr] or "").lower()
         condition_value = self._condition_value
         if self._substring and condition_value in attr_value:
             return True
@@ -155,42 +238,403 @@ class AttributeRule(Rule):
         return f"{'-' if self.exclude else '+'}AttributeRule[{self._rule_spec}]"
 
 
+class ElementClass(NamedTuple):
+    exclude: bool
+    header: bool
+    paragraph: bool
+    # элемент начинает область содержимого документа (start:) или завершает разбор документа (stop:)
+    start: bool = False
+    stop: bool = False
+
+
+_ELEMENT_CLASSES = {flags: ElementClass(*flags) for flags in itertools.product((False, True), repeat=5)}
+
+
+class _ValueIndex:
+    # значения правил class или attr: точные значения и префиксы/суффиксы в множествах по длине,
+    # подстроки - в одном регулярном выражении
+    def __init__(self, rules: list):
+        self._values = set()
+        self._prefixes = dict()
+        self._suffixes = dict()
+        substrings = []
+        for rule in rules:
+            value = rule._condition_value
+            if rule._substring:
+                substrings.append(re.escape(value))
+            elif rule._starts:
+                self._prefixes.setdefault(len(value), set()).add(value)
+            elif rule._ends:
+                self._suffixes.setdefault(len(value), set()).add(value)
+            else:
+                self._values.add(value)
+        self._substring_re = re.compile("|".join(substrings)) if substrings else None
+        self.empty = not (self._values or self._prefixes or self._suffixes or substrings)
+
+    def matches(self, value: str) -> bool:
+        if value in self._values:
+            return True
+        return self._matches_affix(value) or (self._substring_re is not None
+                                              and self._substring_re.search(value) is not None)
+
+    def matches_any(self, values: list, text: str) -> bool:
+        # text - значения через пробел, в нем ищутся подстроки, которые не могут содержать пробелов
+        if self._values and not self._values.isdisjoint(values):
+            return True
+        if self._prefixes or self._suffixes:
+            for value in values:
+                if self._matches_affix(value):
+                    return True
+        return self._substring_re is not None and self._substring_re.search(text) is not None
+
+    def _matches_affix(self, value: str) -> bool:
+        for length, prefixes in self._prefixes.items():
+            if value[:length] in prefixes:
+                return True
+        for length, suffixes in self._suffixes.items():
+            if value[len(value) - length:] in suffixes:
+                return True
+        return False
+
+
+class _RuleMatcher:
+    def __init__(self, rules: list):
+        self._tags = set()
+        class_rules = []
+        attr_rules = dict()
+        self._other_rules = []
+        for rule in rules:
+            if isinstance(rule, TagNamesRule):
+                self._tags.update(rule._tags)
+            elif isinstance(rule, ClassNameRule):
+                # имя класса не содержит пробелов, правило с пробелом в значении никогда не сработает
+                if not any(c.isspace() for c in rule._condition_value):
+                    class_rules.append(rule)
+            elif isinstance(rule, AttributeRule):
+                attr_rules.setdefault(rule._attr, []).append(rule)
+            else:
+                self._other_rules.append(rule)
+        self._class_index = _ValueIndex(class_rules)
+        self._attr_indexes = {attr: _ValueIndex(rules) for attr, rules in attr_rules.items()}
+        self.uses_classes = not self._class_index.empty
+        self.uses_attrs = bool(self._attr_indexes) or bool(self._other_rules)
+        self.attr_names = set(self._attr_indexes.keys())
+        self.uses_any_attr = bool(self._other_rules)
+        self.empty = not (self._tags or self.uses_classes or self.uses_attrs)
+
+    def matches(self, tag: str, attrs: dict, classes: str, class_names: list) -> bool:
+        if tag in self._tags:
+            return True
+        if class_names and self.uses_classes and self._class_index.matches_any(class_names, classes):
+            return True
+        if self._attr_indexes:
+            for attr, value in attrs.items():
+                attr_index = self._attr_indexes.get(attr)
+                if attr_index is not None and attr_index.matches((value or "").lower()):
+                    return True
+        return any(rule.matches(tag, attrs) for rule in self._other_rules)
+
+
+class _CompiledRuleList:
+    def __init__(self, rules: list):
+        self._include = _RuleMatcher([rule for rule in rules if not rule.exclude])
+        self._exclude = _RuleMatcher([rule for rule in rules if rule.exclude])
+        self.uses_classes = self._include.uses_classes or self._exclude.uses_classes
+        self.uses_attrs = self._include.uses_attrs or self._exclude.uses_attrs
+        self.attr_names = self._include.attr_names | self._exclude.attr_names
+        self.uses_any_attr = self._include.uses_any_attr or self._exclude.uses_any_attr
+        self.empty = self._include.empty and self._exclude.empty
+
+    def resolve(self, tag: str, attrs: dict, classes: str, class_names: list) -> RuleResolution:
+        if not self._include.empty and self._include.matches(tag, attrs, classes, class_names):
+            return RuleResolution.Include
+        if not self._exclude.empty and self._exclude.matches(tag, attrs, classes, class_names):
+            return RuleResolution.Exclude
+        return RuleResolution.Unknown
+
+    def resolve_counted(self, tag: str, attrs: dict, classes: str,
+                        class_names: list) -> Tuple[RuleResolution, int]:
+        # то же, что resolve, и число проверенных наборов правил (включающих и исключающих)
+        checks = 0
+        if not self._include.empty:
+            checks += 1
+            if self._include.matches(tag, attrs, classes, class_names):
+                return RuleResolution.Include, checks
+        if not self._exclude.empty:
+            checks += 1
+            if self._exclude.matches(tag, attrs, classes, class_names):
+                return RuleResolution.Exclude, checks
+        return RuleResolution.Unknown, checks
+
+
+class ElementClassifier:
+    def __init__(self, domains: list, cache_size: int = _CLASSIFICATION_CACHE_SIZE):
+        self._domains = tuple(domains)
+        self._filter_chain = self._chain(domains, "filter")
+        self._header_chain = self._chain(domains, "header")
+        self._paragraph_chain = self._chain(domains, "paragraph")
+        self._start_chain = self._chain(domains, "start")
+        self._stop_chain = self._chain(domains, "stop")
+        # при наличии правил start: содержимое документа до начала области не учитывается
+        self.has_start_rules = bool(self._start_chain)
+        chains = (self._filter_chain + self._header_chain + self._paragraph_chain + self._start_chain
+                  + self._stop_chain)
+        self._uses_classes = any(rules.uses_classes for rules in chains)
+        self._uses_attrs = any(rules.uses_attrs for rules in chains)
+        # результат зависит только от тега, классов и атрибутов из правил attr,
+        # а для правил других типов - от всех атрибутов элемента
+        self._signature_attrs = set().union(*(rules.attr_names for rules in chains))
+        self._signature_uses_all_attrs = any(rules.uses_any_attr for rules in chains)
+        # LRU-кэш классов по сигнатуре элемента. Классификатор общий для всех потоков экстрактора, а операции
+        # functools.lru_cache потокобезопасны и не требуют отдельной блокировки на каждый элемент.
+        self._cache_size = cache_size
+        self._local = threading.local()
+        self._create_cache()
+
+    def _create_cache(self):
+        self._cached_classify = functools.lru_cache(maxsize=self._cache_size)(self._classify_signature)
+
+    @staticmethod
+    def _chain(domains: list, section: str) -> list:
+        indexes = [domain.index(section) for domain in domains]
+        return tuple(rules for rules in indexes if not rules.empty)
+
+    def classify(self, tag: str, attrs: list) -> ElementClass:
+        return self._cached_classify(self._signature(tag, attrs))
+
+    def lookup(self, tag: str, attrs: list) -> Tuple[ElementClass, bool]:
+        # класс элемента и признак попадания в кэш: промах отмечается в потоке, который классифицирует элемент,
+        # поэтому признак не зависит от разбора в других потоках
+        local = self._local
+        local.miss = False
+        element_class = self._cached_classify(self._signature(tag, attrs))
+        return element_class, not local.miss
+
+    def cache_info(self) -> Tuple[int, int, int]:
+        info = self._cached_classify.cache_info()
+        return info.hits, info.misses, info.currsize
+
+    def clear_cache(self):
+        self._cached_classify.cache_clear()
+
+    def __getstate__(self) -> dict:
+        # кэш и состояние потоков не сохраняются в бинарный кэш правил, при загрузке кэш создается пустым
+        state = self.__dict__.copy()
+        del state["_cached_classify"]
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._create_cache()
+
+    def _classify_signature(self, key) -> ElementClass:
+        # вызывается только при промахе кэша, атрибуты для правил восстанавливаются из сигнатуры
+        self._local.miss = True
+        if isinstance(key, str):
+            return self._classify(key, [])
+        if self._signature_uses_all_attrs:
+            tag, attrs = key
+            return self._classify(tag, list(attrs))
+        tag, classes, values = key
+        attrs = list(values)
+        if classes is not None:
+            attrs.append(("class", classes))
+        return self._classify(tag, attrs)
+
+    def _signature(self, tag: str, attrs: list):
+        if not attrs:
+            return tag
+        if self._signature_uses_all_attrs:
+            return tag, tuple(attrs)
+        classes = None
+        values = []
+        for name, value in attrs:
+            if name == "class":
+                classes = value
+            elif name in self._signature_attrs:
+                values.append((name, value))
+        return tag, classes, tuple(values)
+
+    def _classify(self, tag: str, attrs: list) -> ElementClass:
+        attrs_dict, classes, class_names = self._match_args(attrs)
+        exclude = False
+        for rules in self._filter_chain:
+            resolution = rules.resolve(tag, attrs_dict, classes, class_names)
+            if resolution != RuleResolution.Unknown:
+                exclude = resolution == RuleResolution.Exclude
+                break
+        header = self._resolve_include(self._header_chain, tag, attrs_dict, classes, class_names)
+        paragraph = self._resolve_include(self._paragraph_chain, tag, attrs_dict, classes, class_names)
+        start = self._resolve_include(self._start_chain, tag, attrs_dict, classes, class_names)
+        stop = self._resolve_include(self._stop_chain, tag, attrs_dict, classes, class_names)
+        return _ELEMENT_CLASSES[(exclude, header, paragraph, start, stop)]
+
+    def rule_evaluations(self, tag: str, attrs: list) -> int:
+        # сколько проверок скомпилированных наборов правил выполняет _classify для элемента
+        attrs_dict, classes, class_names = self._match_args(attrs)
+        evaluations = 0
+        for chain in (self._filter_chain, self._header_chain, self._paragraph_chain, self._start_chain,
+                      self._stop_chain):
+            for rules in chain:
+                resolution, checks = rules.resolve_counted(tag, attrs_dict, classes, class_names)
+                evaluations += checks
+                if resolution != RuleResolution.Unknown:
+                    break
+        return evaluations
+
+    def matching_rules(self, tag: str, attrs: list) -> list:
+        # Сработавшие правила при проверке по одному, как Domain._resolve: эквивалент классификации без
+        # скомпилированных наборов, нужен только для подсчета срабатываний каждого правила
+        attrs_dict = dict(attrs)
+        matched = []
+        for section in _SECTIONS:
+            for domain in self._domains:
+                domain_matched = False
+                for rule in getattr(domain, f"_{section}_rules"):
+                    if rule.matches(tag, attrs_dict):
+                        matched.append(f"{domain._hosts} {section}: {rule!r}")
+                        domain_matched = True
+                if domain_matched:
+                    break
+        return matched
+
+    def _match_args(self, attrs: list) -> Tuple[dict, str, list]:
+        attrs_dict = dict(attrs) if attrs and self._uses_attrs else _EMPTY_ATTRS
+        classes = ""
+        class_names = _EMPTY_CLASS_NAMES
+        if attrs and self._uses_classes:
+            for name, value in attrs:
+                if name == "class":
+                    classes = value or ""
+            if classes:
+                classes = classes.lower()
+                class_names = classes.split()
+        return attrs_dict, classes, class_names
+
+    @staticmethod
+    def _resolve_include(chain: list, tag: str, attrs: dict, classes: str, class_names: list) -> bool:
+        for rules in chain:
+            resolution = rules.resolve(tag, attrs, classes, class_names)
+            if resolution != RuleResolution.Unknown:
+                return resolution == RuleResolution.Include
+        return False
+
+
+_EMPTY_ATTRS = dict()
+_EMPTY_CLASS_NAMES = []
+
+
 class Rules:
-    def __init__(self):
+    def __init__(self, debug: bool = False):
+        # debug - печатать решения правил, проверяя их по одному
+        self._debug = debug
         self._domains = dict()
-        self._current_domain = Domain("*")
+        self._current_domain = Domain("*", debug)
         self._domains["*"] = self._current_domain
+        self._classifiers = None
+        self._hosts = None
+        self._host_cache = dict()
+        # хэш текста правил, меняется вместе с результатом разбора
+        self.version = ""
 
     def load(self, file_name: str = None):
+        if self._classifiers is not None:
+            raise RuntimeError("Правила уже загружены, для другого файла нужен новый объект Rules")
         _file_name = file_name if file_name else _DEFAULT_RULES_FILE_NAME
+        digest = hashlib.sha256()
         with open(_file_name, encoding="utf-8") as f:
             for line in f:
+                digest.update(line.encode("utf-8"))
                 self._process_line(line.strip())
+        self.version = digest.hexdigest()
+        self._compile()
+
+    def classification_cache_info(self) -> Tuple[int, int, int]:
+        hits, misses, size = 0, 0, 0
+        for classifier in self._classifiers.values() if self._classifiers else ():
+            classifier_hits, classifier_misses, classifier_size = classifier.cache_info()
+            hits += classifier_hits
+            misses += classifier_misses
+            size += classifier_size
+        return hits, misses, size
+
+    def classifier(self, host: str) -> ElementClassifier:
+        # правила хоста вместе с правилами по умолчанию, один классификатор на все хосты домена
+        return self._find_domain(host)[1]
+
+    def _compile(self):
+        default_domain = self._domains["*"]
+        classifiers = dict()
+        hosts = _HostTrie()
+        for host, domain in self._domains.items():
+            # один классификатор на все хосты строки domain:
+            domain_host = domain._hosts
+            if domain_host not in classifiers:
+                domain.freeze()
+                domains = [domain] if domain is default_domain else [domain, default_domain]
+                classifiers[domain_host] = ElementClassifier(domains)
+            if domain is not default_domain:
+                hosts.add(host, (domain, classifiers[domain_host]))
+        self._classifiers = classifiers
+        self._hosts = hosts
+        self._host_cache = dict()
+
+    def _find_domain(self, host: str) -> Tuple[Domain, ElementClassifier]:
+        # точное совпадение хоста, иначе самый длинный подходящий шаблон *.<домен>, иначе правила по умолчанию
+        found = self._host_cache.get(host)
+        if found is None:
+            if self._classifiers is None:
+                self._compile()
+            found = self._hosts.find(host) if host else None
+            if found is None:
+                found = (self._domains["*"], self._classifiers["*"])
+            if len(self._host_cache) >= _HOST_CACHE_SIZE:
+                self._host_cache.clear()
+            self._host_cache[host] = found
+        return found
 
     def exclude(self, host: str, tag: str, attrs: list):
-        domain = self._domains.get(host)
-        resolution = domain.resolve(tag, attrs) if domain else RuleResolution.Unknown
-        if resolution == RuleResolution.Unknown:
-            default_rules = self._domains["*"]
+        domain = self._find_domain(host)[0]
+        resolution = domain.resolve(tag, attrs)
+        default_rules = self._domains["*"]
+        if resolution == RuleResolution.Unknown and domain is not default_rules:
             resolution = default_rules.resolve(tag, attrs)
         return resolution == RuleResolution.Exclude
 
     def is_header(self, host: str, tag: str, attrs: list):
-        domain = self._domains.get(host)
-        resolution = domain.resolve_header(tag, attrs) if domain else RuleResolution.Unknown
-        if resolution == RuleResolution.Unknown:
-            default_rules = self._domains["*"]
+        domain = self._find_domain(host)[0]
+        resolution = domain.resolve_header(tag, attrs)
+        default_rules = self._domains["*"]
+        if resolution == RuleResolution.Unknown and domain is not default_rules:
             resolution = default_rules.resolve_header(tag, attrs)
         return resolution == RuleResolution.Include
 
     def is_paragraph(self, host: str, tag: str, attrs: list):
-        domain = self._domains.get(host)
-        resolution = domain.resolve_paragraph(tag, attrs) if domain else RuleResolution.Unknown
-        if resolution == RuleResolution.Unknown:
-            default_rules = self._domains["*"]
+        domain = self._find_domain(host)[0]
+        resolution = domain.resolve_paragraph(tag, attrs)
+        default_rules = self._domains["*"]
+        if resolution == RuleResolution.Unknown and domain is not default_rules:
             resolution = default_rules.resolve_paragraph(tag, attrs)
         return resolution == RuleResolution.Include
 
+    def is_start(self, host: str, tag: str, attrs: list):
+        domain = self._find_domain(host)[0]
+        resolution = domain.resolve_start(tag, attrs)
+        default_rules = self._domains["*"]
+        if resolution == RuleResolution.Unknown and domain is not default_rules:
+            resolution = default_rules.resolve_start(tag, attrs)
+        return resolution == RuleResolution.Include
+
+    def is_stop(self, host: str, tag: str, attrs: list):
+        domain = self._find_domain(host)[0]
+        resolution = domain.resolve_stop(tag, attrs)
+        default_rules = self._domains["*"]
+        if resolution == RuleResolution.Unknown and domain is not default_rules:
+            resolution = default_rules.resolve_stop(tag, attrs)
+        return resolution == RuleResolution.Include
+
     def _process_line(self, line):
         if line.startswith("#"):
             return
@@ -202,13 +646,17 @@ class Rules:
             self._add_header_rule(line)
         elif line.startswith("paragraph:"):
             self._add_paragraph_rule(line)
+        elif line.startswith("start:"):
+            self._add_start_rule(line)
+        elif line.startswith("stop:"):
+            self._add_stop_rule(line)
 
     def _add_domain(self, domain_rule):
         host_names = domain_rule.split(":")[1]
         hosts = list(map(str.strip, host_names.split(",")))
         self._current_domain = self._domains.get(hosts[0])
         if not self._current_domain:
-            self._current_domain = Domain(host_names)
+            self._current_domain = Domain(host_names, self._debug)
             for host in hosts:
                 self._domains[host] = self._current_domain
 
@@ -244,3 +692,135 @@ class Rules:
         rule_spec = "+" + rule_parts[1]
         rule = self._create_filter_rule(rule_spec)
         self._current_domain.add_paragraph_rule(rule)
+
+    def _add_start_rule(self, filter_rule: str):
+        rule_parts = filter_rule.split(":", maxsplit=1)
+        rule_spec = "+" + rule_parts[1]
+        rule = self._create_filter_rule(rule_spec)
+        self._current_domain.add_start_rule(rule)
+
+    def _add_stop_rule(self, filter_rule: str):
+        rule_parts = filter_rule.split(":", maxsplit=1)
+        rule_spec = "+" + rule_parts[1]
+        rule = self._create_filter_rule(rule_spec)
+        self._current_domain.add_stop_rule(rule)
+
+
+class _HostTrieNode:
+    def __init__(self):
+        self.children = dict()
+        # правила для самого хоста и для шаблона *.<хост>
+        self.exact = None
+        self.wildcard = None
+
+
+class _HostTrie:
+    # хосты из строк domain: по меткам справа налево, "*.lenta.ru" подходит для всех поддоменов lenta.ru
+    def __init__(self):
+        self._root = _HostTrieNode()
+
+    def add(self, pattern: str, value):
+        wildcard = pattern.startswith("*.")
+        node = self._root
+        for label in _host_labels(pattern[2:] if wildcard else pattern):
+            node = node.children.setdefault(label, _HostTrieNode())
+        if wildcard:
+            node.wildcard = value
+        else:
+            node.exact = value
+
+    def find(self, host: str):
+        node = self._root
+        found = None
+        for label in _host_labels(host):
+            if node.wildcard is not None:
+                found = node.wildcard
+            node = node.children.get(label)
+            if node is None:
+                return found
+        return node.exact if node.exact is not None else found
+
+
+def _host_labels(host: str) -> list:
+    labels = host.lower().rstrip(".").split(".")
+    labels.reverse()
+    return labels
+
+
+def load_rules(file_name: str = None, binary_cache: bool = False) -> Rules:
+    path = os.path.abspath(file_name if file_name else _DEFAULT_RULES_FILE_NAME)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _rules_cache.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    rules = _load_binary_rules(path, version) if binary_cache else None
+    if rules is None:
+        rules = Rules()
+        rules.load(path)
+        if binary_cache:
+            _save_binary_rules(path, version, rules)
+    _rules_cache[path] = (version, rules)
+    return rules
+
+
+class RulesWatcher:
+    def __init__(self, file_name: str, interval: float, on_change, binary_cache: bool = False):
+        self._file_name = file_name
+        self._interval = interval
+        self._on_change = on_change
+        self._binary_cache = binary_cache
+        self._rules = load_rules(file_name, binary_cache=binary_cache)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="rules-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _watch(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                rules = load_rules(self._file_name, binary_cache=self._binary_cache)
+            except Exception as e:
+                print(f"Ошибка загрузки правил из файла {self._file_name}: {e}", file=sys.stderr)
+                continue
+            if rules is not self._rules:
+                self._rules = rules
+                self._on_change(rules)
+
+
+def clear_rules_cache():
+    _rules_cache.clear()
+
+
+def _load_binary_rules(path: str, version: tuple):
+    try:
+        with open(path + _BINARY_RULES_SUFFIX, "rb") as f:
+            binary_format, binary_version, rules = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if binary_format != _BINARY_RULES_FORMAT or binary_version != version:
+        return None
+    return rules
+
+
+def _save_binary_rules(path: str, version: tuple, rules: Rules):
+    # у каждого сохранения свой временный файл: правила одновременно могут сохранять несколько потоков и процессов
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=dirname(os.path.abspath(path)), suffix=_BINARY_RULES_SUFFIX + ".tmp")
+    except OSError:
+        # каталог с правилами может быть недоступен для записи, тогда работаем без бинарного кеша
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((_BINARY_RULES_FORMAT, version, rules), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path + _BINARY_RULES_SUFFIX)
+    except OSError:
+        # файл не удалось записать (например, закончилось место), временный файл не оставляем
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,471 @@
+import getopt
+import os
+import sys
+import tempfile
+from collections import Counter
+from textwrap import dedent
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .benchmark import BenchmarkDocument, data_documents
+from .blocks import create_writer
+from .crawl import iter_entries
+from .extractor import ContentExtractor, _HtmlWalker, _STREAM_CHUNK_SIZE, _decode_windows
+from .html import create_parser
+from .rules import (_DEFAULT_RULES_FILE_NAME, _SECTIONS, AttributeRule, ClassNameRule, ElementClass, Rule, Rules,
+                    TagNamesRule)
+
+# элемент корпуса: хост документа, тег и атрибуты элемента
+_Element = Tuple[str, str, tuple]
+
+
+class RuleLine:
+    def __init__(self, text: str, section: str, rule: Rule, line_number: int, comments: List[str]):
+        self.text = text
+        self.section = section
+        self.rule = rule
+        self.line_number = line_number
+        # комментарии и пустые строки перед правилом переносятся вместе с ним
+        self.comments = comments
+
+
+class _DomainBlock:
+    def __init__(self, hosts: str, line: Optional[str], comments: List[str]):
+        self.hosts = hosts
+        self.line = line
+        self.comments = comments
+        self.rules = {section: [] for section in _SECTIONS}
+
+
+class RulesFile:
+    # Текст файла правил, разобранный по доменам и секциям так же, как его разбирает Rules. Повторные строки
+    # domain: одного домена объединяются, правила внутри секции можно удалять и переставлять: результат
+    # секции (включить, исключить, неизвестно) от порядка правил в ней не зависит.
+    def __init__(self, lines: Iterable[str]):
+        parser = Rules()
+        default_block = _DomainBlock("*", None, [])
+        self._blocks = [default_block]
+        blocks_by_host = {"*": default_block}
+        block = default_block
+        comments = []
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            section = _line_section(line)
+            if line.startswith("domain:"):
+                host_names = line.split(":")[1]
+                hosts = list(map(str.strip, host_names.split(",")))
+                block = blocks_by_host.get(hosts[0])
+                if block is None:
+                    block = _DomainBlock(host_names, line, comments)
+                    self._blocks.append(block)
+                    for host in hosts:
+                        blocks_by_host[host] = block
+                elif block.line is None:
+                    block.line = line
+                    block.comments = comments
+                else:
+                    block.comments.extend(comments)
+                comments = []
+            elif section is not None:
+                rule_spec = line if section == "filter" else "+" + line.split(":", maxsplit=1)[1]
+                block.rules[section].append(RuleLine(line, section, parser._create_filter_rule(rule_spec),
+                                                     line_number, comments))
+                comments = []
+            else:
+                comments.append(line)
+        self._trailer = comments
+
+    @classmethod
+    def load(cls, file_name: str = None) -> "RulesFile":
+        with open(file_name if file_name else _DEFAULT_RULES_FILE_NAME, encoding="utf-8") as f:
+            return cls(f)
+
+    def sections(self) -> Iterable[List[RuleLine]]:
+        for block in self._blocks:
+            for section in _SECTIONS:
+                yield block.rules[section]
+
+    def chain(self, rules: Rules, host: str, section: str) -> List[List[RuleLine]]:
+        # правила секции в порядке проверки: правила домена хоста, затем правила по умолчанию
+        hosts = rules._find_domain(host)[0]._hosts
+        chain = [block.rules[section] for block in self._blocks if block.hosts == hosts]
+        if hosts != "*":
+            chain.append(self._blocks[0].rules[section])
+        return chain
+
+    def remove(self, rule_line: RuleLine):
+        for section_rules in self.sections():
+            if rule_line in section_rules:
+                section_rules.remove(rule_line)
+
+    def copy(self) -> "RulesFile":
+        rules_file = RulesFile(())
+        rules_file._blocks = []
+        for block in self._blocks:
+            block_copy = _DomainBlock(block.hosts, block.line, block.comments)
+            block_copy.rules = {section: list(rule_lines) for section, rule_lines in block.rules.items()}
+            rules_file._blocks.append(block_copy)
+        rules_file._trailer = self._trailer
+        return rules_file
+
+    def lines(self) -> List[str]:
+        lines = []
+        for block in self._blocks:
+            lines.extend(block.comments)
+            if block.line is not None:
+                lines.append(block.line)
+            for rule_line in (rule_line for section in _SECTIONS for rule_line in block.rules[section]):
+                lines.extend(rule_line.comments)
+                lines.append(rule_line.text)
+        lines.extend(self._trailer)
+        return lines
+
+    def text(self) -> str:
+        return "\n".join(self.lines()) + "\n"
+
+    def compile(self) -> Rules:
+        rules = Rules()
+        for line in self.lines():
+            rules._process_line(line)
+        rules._compile()
+        return rules
+
+
+class RuleProfile:
+    def __init__(self, rule_line: RuleLine, hosts: str):
+        self.rule_line = rule_line
+        self.hosts = hosts
+        # элементов корпуса, подошедших под правило, проверок правила и элементов, класс которых без правила
+        # был бы другим
+        self.hits = 0
+        self.evaluations = 0
+        self.decisive = 0
+        # правило той же секции, которое срабатывает на всех элементах этого правила
+        self.covered_by: Optional[RuleLine] = None
+
+    @property
+    def dead(self) -> bool:
+        return self.hits == 0
+
+    @property
+    def shadowed(self) -> bool:
+        return self.hits > 0 and self.decisive == 0
+
+
+class RulesProfile:
+    def __init__(self, rules_file: RulesFile, elements: Counter, documents: int):
+        self.rules_file = rules_file
+        self.elements = elements
+        self.documents = documents
+        self.rules = {rule_line: RuleProfile(rule_line, block.hosts)
+                      for block in rules_file._blocks for section in _SECTIONS for rule_line in block.rules[section]}
+        self.evaluations = 0
+
+    @property
+    def element_count(self) -> int:
+        return sum(self.elements.values())
+
+
+def corpus_documents(sources: List[str], host_name: str = None, encoding: str = None) -> List[BenchmarkDocument]:
+    documents = []
+    for source in sources:
+        for entry in iter_entries(source, host_name, encoding):
+            data = entry.data
+            if data is None:
+                with open(entry.file_name, "rb") as f:
+                    data = f.read()
+            documents.append(BenchmarkDocument(entry.output_name, data, entry.host_name, entry.encoding))
+    return documents
+
+
+def collect_elements(documents: List[BenchmarkDocument], rules: Rules, parser_backend: str = "html.parser",
+                     prescan: bool = True) -> Counter:
+    # элементы, которые обходчик классифицирует при разборе корпуса: если новые правила классифицируют
+    # каждый из них так же, обход и текст каждого документа не изменятся
+    elements = Counter()
+    for document in documents:
+        walker = _RecordingHtmlWalker(document.host_name, create_writer("text"), rules, elements)
+        parser = create_parser(walker, backend=parser_backend, prescan=prescan)
+        for chunk in _decode_windows(document.data, document.encoding, _STREAM_CHUNK_SIZE):
+            parser.feed_chunk(chunk)
+            if walker.is_finished():
+                break
+        parser.flush_chunks()
+    return elements
+
+
+def profile_rules(rules_file: RulesFile, elements: Counter, documents: int = 0) -> RulesProfile:
+    profile = RulesProfile(rules_file, elements, documents)
+    covered = dict()
+    for section_rules in rules_file.sections():
+        covered.update(_covered_rules(section_rules))
+    for rule_line, covering in covered.items():
+        profile.rules[rule_line].covered_by = covering
+    rules = rules_file.compile()
+    for (host, tag, attrs), count in elements.items():
+        attrs_dict = dict(attrs)
+        for section in _SECTIONS:
+            chain = rules_file.chain(rules, host, section)
+            matches = [[rule_line for rule_line in rule_lines if rule_line.rule.matches(tag, attrs_dict)]
+                       for rule_lines in chain]
+            # перекрытые правила на результат не влияют, без них решающим оказывается и правило, у которого есть повтор
+            kept_matches = [[rule_line for rule_line in matched if rule_line not in covered] for matched in matches]
+            result = _chain_result(section, kept_matches)
+            for rule_lines, matched in zip(chain, matches):
+                evaluated = _evaluated_rules(rule_lines, matched)
+                profile.evaluations += evaluated * count
+                for rule_line in rule_lines[:evaluated]:
+                    profile.rules[rule_line].evaluations += count
+                for rule_line in matched:
+                    rule_profile = profile.rules[rule_line]
+                    rule_profile.hits += count
+                    if _chain_result(section, kept_matches, without=rule_line) != result:
+                        rule_profile.decisive += count
+                if matched:
+                    break
+    return profile
+
+
+def optimize_rules(profile: RulesProfile, drop_unused: bool = False) -> RulesFile:
+    # Правила, перекрытые другими правилами той же секции, не меняют результат ни на каком документе и удаляются
+    # всегда. С drop_unused удаляются и правила, которые на корпусе ни разу не решили класс элемента: по одному,
+    # с проверкой классов всех элементов корпуса. Оставшиеся правила секции упорядочиваются: сначала правила
+    # включения, затем исключения, каждые по убыванию срабатываний, чтобы проверка заканчивалась раньше.
+    rules_file = profile.rules_file.copy()
+    expected = _classify(rules_file, profile.elements)
+    for rule_profile in profile.rules.values():
+        if rule_profile.covered_by is not None:
+            rules_file.remove(rule_profile.rule_line)
+    if drop_unused:
+        candidates = sorted((rule_profile for rule_profile in profile.rules.values()
+                             if rule_profile.covered_by is None and rule_profile.decisive == 0),
+                            key=lambda rule_profile: (rule_profile.hits, rule_profile.rule_line.line_number))
+        for rule_profile in candidates:
+            candidate = rules_file.copy()
+            candidate.remove(rule_profile.rule_line)
+            if rule_profile.dead or _classify(candidate, profile.elements) == expected:
+                rules_file = candidate
+    for section_rules in rules_file.sections():
+        section_rules.sort(key=lambda rule_line: (rule_line.rule.exclude, -profile.rules[rule_line].hits))
+    if _classify(rules_file, profile.elements) != expected:
+        raise RuntimeError("Оптимизированные правила классифицируют элементы корпуса иначе")
+    return rules_file
+
+
+def compare_output(documents: List[BenchmarkDocument], rules_file_name: str, optimized_file_name: str,
+                   parser_backend: str = "html.parser") -> List[str]:
+    # документы корпуса, текст которых с новыми правилами отличается
+    extractor = ContentExtractor(rules_file_name, parser_backend=parser_backend)
+    optimized_extractor = ContentExtractor(optimized_file_name, parser_backend=parser_backend)
+    return [document.name for document in documents
+            if extractor.extract_from_bytes(document.data, document.host_name, document.encoding)
+            != optimized_extractor.extract_from_bytes(document.data, document.host_name, document.encoding)]
+
+
+def format_report(profile: RulesProfile, optimized: RulesProfile = None) -> str:
+    lines = [f"{'строка':>7}  {'хосты':<24}{'срабатываний':>14}{'проверок':>10}{'решений':>9}  правило"]
+    for rule_profile in sorted(profile.rules.values(), key=lambda rule_profile: rule_profile.rule_line.line_number):
+        lines.append(f"{rule_profile.rule_line.line_number:>7}  {rule_profile.hosts[:23]:<24}{rule_profile.hits:>14}"
+                     f"{rule_profile.evaluations:>10}{rule_profile.decisive:>9}  {rule_profile.rule_line.text}")
+
+    def rule_list(title: str, rule_profiles: list, describe=lambda rule_profile: ""):
+        if rule_profiles:
+            lines.append(f"{title}: {len(rule_profiles)}")
+            for rule_profile in rule_profiles:
+                lines.append(f"  {rule_profile.rule_line.line_number}: {rule_profile.rule_line.text}"
+                             f"{describe(rule_profile)}")
+
+    rule_profiles = sorted(profile.rules.values(), key=lambda rule_profile: rule_profile.rule_line.line_number)
+    rule_list("Избыточные правила (перекрыты другим правилом секции)",
+              [rule_profile for rule_profile in rule_profiles if rule_profile.covered_by is not None],
+              lambda rule_profile: f" -> {rule_profile.covered_by.line_number}: {rule_profile.covered_by.text}")
+    rule_list("Неиспользуемые правила (ни разу не сработали на корпусе)",
+              [rule_profile for rule_profile in rule_profiles
+               if rule_profile.dead and rule_profile.covered_by is None])
+    rule_list("Затененные правила (срабатывали, но класс элемента решали другие правила)",
+              [rule_profile for rule_profile in rule_profiles
+               if rule_profile.shadowed and rule_profile.covered_by is None],
+              lambda rule_profile: f" ({rule_profile.hits} срабатываний)")
+
+    lines.append(f"Документов: {profile.documents}, классифицировано элементов: {profile.element_count} "
+                 f"({len(profile.elements)} различных), проверок правил: {profile.evaluations} "
+                 f"({_per_element(profile):.2f} на элемент)")
+    if optimized is not None:
+        lines.append(f"После оптимизации: правил {len(optimized.rules)} вместо {len(profile.rules)}, "
+                     f"проверок правил: {optimized.evaluations} ({_per_element(optimized):.2f} на элемент)")
+    return "\n".join(lines)
+
+
+class _RecordingClassifier:
+    def __init__(self, classifier, host_name: str, elements: Counter):
+        self._classifier = classifier
+        self._host_name = host_name
+        self._elements = elements
+
+    def classify(self, tag: str, attrs) -> ElementClass:
+        self._elements[(self._host_name, tag, tuple(attrs))] += 1
+        return self._classifier.classify(tag, attrs)
+
+
+class _RecordingHtmlWalker(_HtmlWalker):
+    def __init__(self, host_name: str, writer, elements_filter: Rules, elements: Counter):
+        super().__init__(host_name, writer, elements_filter)
+        self._classifier = _RecordingClassifier(self._classifier, host_name, elements)
+
+
+def _line_section(line: str) -> Optional[str]:
+    # секция правила в строке файла, как в Rules._process_line
+    if line.startswith("-") or line.startswith("+"):
+        return "filter"
+    for section in _SECTIONS[1:]:
+        if line.startswith(section + ":"):
+            return section
+    return None
+
+
+def _chain_result(section: str, matches: List[List[RuleLine]], without: RuleLine = None) -> bool:
+    # флаг секции в классе элемента по сработавшим правилам домена хоста и правил по умолчанию
+    for matched in matches:
+        matched = [rule_line for rule_line in matched if rule_line is not without]
+        if any(not rule_line.rule.exclude for rule_line in matched):
+            return section != "filter"
+        if matched:
+            return section == "filter"
+    return False
+
+
+def _evaluated_rules(rule_lines: List[RuleLine], matched: List[RuleLine]) -> int:
+    # Правила секции проверяются по порядку до первого сработавшего правила включения, а после сработавшего
+    # правила исключения - до последнего правила включения: дальше результат уже не изменится
+    last_include = max((i for i, rule_line in enumerate(rule_lines) if not rule_line.rule.exclude), default=-1)
+    for i, rule_line in enumerate(rule_lines):
+        if rule_line in matched and (not rule_line.rule.exclude or i > last_include):
+            return i + 1
+    return len(rule_lines)
+
+
+def _covered_rules(rule_lines: List[RuleLine]) -> Dict[RuleLine, RuleLine]:
+    # правила секции, которые можно удалить: каждое перекрыто оставшимся правилом той же секции
+    covered = dict()
+    kept = []
+    for rule_line in rule_lines:
+        covering = next((kept_line for kept_line in kept if _makes_redundant(kept_line.rule, rule_line.rule)), None)
+        if covering is not None:
+            covered[rule_line] = covering
+            continue
+        for kept_line in [kept_line for kept_line in kept if _makes_redundant(rule_line.rule, kept_line.rule)]:
+            kept.remove(kept_line)
+            covered[kept_line] = rule_line
+        kept.append(rule_line)
+    # перекрывающее правило могло быть удалено позже, тогда указываем перекрывшее его
+    for rule_line, covering in covered.items():
+        while covering not in kept:
+            covering = covered[covering]
+        covered[rule_line] = covering
+    return covered
+
+
+def _makes_redundant(rule: Rule, other: Rule) -> bool:
+    # other срабатывает только вместе с rule, а правило исключения не решает результат при правиле включения
+    return (not rule.exclude or other.exclude) and _covers(rule, other)
+
+
+def _covers(rule: Rule, other: Rule) -> bool:
+    if isinstance(rule, TagNamesRule) and isinstance(other, TagNamesRule):
+        return other._tags <= rule._tags
+    if isinstance(rule, ClassNameRule) and isinstance(other, ClassNameRule):
+        return _covers_value(rule, other)
+    if isinstance(rule, AttributeRule) and isinstance(other, AttributeRule):
+        return rule._attr == other._attr and _covers_value(rule, other)
+    return False
+
+
+def _covers_value(rule, other) -> bool:
+    value, other_value = rule._condition_value, other._condition_value
+    if rule._substring:
+        return value in other_value
+    # направление сравнения такое же, как в ClassNameRule.matches и AttributeRule.matches
+    if rule._ends:
+        # "value*" срабатывает на значениях, которые заканчиваются на value
+        return (other._ends or other._equals) and other_value.endswith(value)
+    if rule._starts:
+        # "*value" срабатывает на значениях, которые начинаются с value
+        return (other._starts or other._equals) and other_value.startswith(value)
+    return other._equals and other_value == value
+
+
+def _classify(rules_file: RulesFile, elements: Counter) -> Dict[_Element, ElementClass]:
+    rules = rules_file.compile()
+    return {(host, tag, attrs): rules.classifier(host)._classify(tag, list(attrs))
+            for host, tag, attrs in elements}
+
+
+def _per_element(profile: RulesProfile) -> float:
+    return profile.evaluations / profile.element_count if profile.element_count else 0.0
+
+
+def _help():
+    print(dedent("""
+    Использование:
+
+    python3 -m content_extractor.rules_profiler <параметры> [<каталог, архив или шаблон пути>...]
+
+    Без корпуса разбираются страницы из tests/data.
+
+    Параметры:
+      -h, --help                    показать страницу помощи
+      -r <путь>, --rules=<путь>     путь до файла с правилами разбора html
+      -o <путь>, --output=<путь>    записать оптимизированные правила, если текст документов корпуса не изменился
+      --drop-unused                 удалить и правила, которые на корпусе ни разу не решили класс элемента
+      --host=<хост>                 хост документов корпуса, если он не задан каталогом зеркала сайта
+      --encoding=<кодировка>        кодировка документов корпуса
+      --parser=<имя>                html-парсер: html.parser (по умолчанию) или lxml
+    """).strip("\n"))
+    sys.exit()
+
+
+def main(argv: List[str]) -> int:
+    opts, sources = getopt.getopt(argv, "hr:o:", ["help", "rules=", "output=", "drop-unused", "host=", "encoding=",
+                                                  "parser="])
+    rules_file_name, output_file_name, drop_unused = None, None, False
+    host_name, encoding, parser_backend = None, None, "html.parser"
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            _help()
+        elif opt in ("-r", "--rules"):
+            rules_file_name = arg
+        elif opt in ("-o", "--output"):
+            output_file_name = arg
+        elif opt == "--drop-unused":
+            drop_unused = True
+        elif opt == "--host":
+            host_name = arg
+        elif opt == "--encoding":
+            encoding = arg
+        elif opt == "--parser":
+            parser_backend = arg
+
+    documents = corpus_documents(sources, host_name, encoding) if sources else data_documents()
+    rules_file = RulesFile.load(rules_file_name)
+    elements = collect_elements(documents, rules_file.compile(), parser_backend)
+    profile = profile_rules(rules_file, elements, len(documents))
+    optimized_file = optimize_rules(profile, drop_unused)
+    print(format_report(profile, profile_rules(optimized_file, elements, len(documents))))
+
+    if output_file_name:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file_name)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(optimized_file.text())
+            changed = compare_output(documents, rules_file_name, temp_path, parser_backend)
+            if changed:
+                print(f"Текст документов изменился, правила не записаны: {', '.join(changed)}")
+                return 1
+            os.replace(temp_path, output_file_name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
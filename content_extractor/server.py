@@ -0,0 +1,252 @@
+import json
+import os
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple, Union
+
+from . import batch
+from .blocks import output_content_type
+from .extractor import ContentExtractor
+
+_UNIX_PREFIX = "unix:"
+_MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class ExtractionServer:
+    # сервер держит загруженные правила и процессы-обработчики между запросами.
+    # Запросы:
+    #   POST /extract?host=<хост>&encoding=<кодировка> с html в теле запроса
+    #   POST /extract с json {"url": ...} или {"html": ..., "host": ...}
+    #   GET /extract?url=<адрес>
+    #   GET /health - состояние сервера, 503 если он перегружен или останавливается
+    # Соединения поддерживают keep-alive, запросы в одном соединении можно отправлять не дожидаясь ответов.
+    # Если обрабатывается уже max_pending запросов, новые получают 503 с заголовком Retry-After.
+    def __init__(self, address: Union[str, Tuple[str, int]], rules_file_name: str = None,
+                 extractor_options: dict = None, workers: int = None, max_pending: int = None,
+                 rules_reload_interval: float = None):
+        self._rules_file_name = rules_file_name
+        self._extractor_options = extractor_options if extractor_options else dict()
+        # без workers документы разбираются в потоках сервера, иначе - в пуле процессов
+        self._workers = workers
+        self._max_pending = max_pending if max_pending else (workers if workers else os.cpu_count() or 1) * 4
+        self._slots = threading.BoundedSemaphore(self._max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self.extractor = ContentExtractor(rules_file_name, rules_reload_interval=rules_reload_interval,
+                                          **self._extractor_options)
+        self._executor = None
+        if workers:
+            self._executor = batch.create_worker_pool(rules_file_name, self._extractor_options, workers)
+            # процессы запускаются и загружают правила до первого запроса
+            for future in [batch.submit_chunk(self._executor, _extract_chunk, []) for _ in range(workers)]:
+                future.result()
+        self.content_type = output_content_type(self._extractor_options.get("output_format", "text"))
+        self._server = _create_http_server(parse_address(address))
+        self._server.extraction_server = self
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self) -> "ExtractionServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="extraction-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping = True
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        if isinstance(self._server, socketserver.UnixStreamServer) and os.path.exists(self._server.server_address):
+            os.remove(self._server.server_address)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.extractor.close()
+
+    def health(self) -> dict:
+        if self._stopping:
+            status = "stopping"
+        elif self._pending >= self._max_pending:
+            status = "overloaded"
+        else:
+            status = "ok"
+        return {"status": status, "pending": self._pending, "max_pending": self._max_pending,
+                "workers": self._workers if self._workers else 0, "rules_version": self.extractor.rules_version}
+
+    def try_acquire(self) -> bool:
+        if self._stopping or not self._slots.acquire(blocking=False):
+            return False
+        with self._pending_lock:
+            self._pending += 1
+        return True
+
+    def release(self):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def extract(self, request: dict) -> str:
+        if self._executor is None:
+            return _extract_request(self.extractor, request)
+        return batch.submit_chunk(self._executor, _extract_chunk, [request]).result()[0]
+
+
+def parse_address(address: Union[str, Tuple[str, int]]) -> Union[str, Tuple[str, int]]:
+    # "unix:/run/extractor.sock", "127.0.0.1:8080", "localhost:8080" или просто порт "8080"
+    if not isinstance(address, str):
+        return address
+    if address.startswith(_UNIX_PREFIX):
+        return address[len(_UNIX_PREFIX):]
+    host, _, port = address.rpartition(":")
+    if not port.isdigit():
+        raise RuntimeError(f"Некорректный адрес сервера: {address}")
+    return host if host else "127.0.0.1", int(port)
+
+
+def _create_http_server(address: Union[str, Tuple[str, int]]):
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.remove(address)
+        return _UnixHTTPServer(address, _ExtractionHandler)
+    return _TcpHTTPServer(address, _ExtractionHandler)
+
+
+class _TcpHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _ExtractionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/health":
+            health = self.server.extraction_server.health()
+            self._send_json(200 if health["status"] == "ok" else 503, health)
+        elif url.path == "/extract":
+            query = urllib.parse.parse_qs(url.query)
+            if "url" not in query:
+                self._send_text(400, "Не задан параметр url")
+                return
+            self._extract({"url": query["url"][0]})
+        else:
+            self._send_text(404, f"Неизвестный путь: {url.path}")
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        length = self.headers.get("Content-Length") or "0"
+        if not length.isdigit():
+            # без корректной длины границу тела не найти, соединение дальше не читаем
+            self.close_connection = True
+            self._send_text(400, f"Некорректный заголовок Content-Length: {length}")
+            return
+        length = int(length)
+        if length > _MAX_BODY_SIZE:
+            self.close_connection = True
+            self._send_text(413, f"Размер документа больше {_MAX_BODY_SIZE} байт")
+            return
+        # тело читаем всегда, иначе следующий запрос в соединении будет прочитан неверно
+        body = self.rfile.read(length)
+        if url.path != "/extract":
+            self._send_text(404, f"Неизвестный путь: {url.path}")
+            return
+        query = {name: values[0] for name, values in urllib.parse.parse_qs(url.query).items()}
+        if self.headers.get_content_type() == "application/json":
+            try:
+                request = json.loads(body)
+            except ValueError as e:
+                self._send_text(400, f"Некорректный json: {e}")
+                return
+            if not isinstance(request, dict) or ("url" not in request and "html" not in request):
+                self._send_text(400, "В запросе должен быть задан url или html")
+                return
+        else:
+            request = {"data": body, "encoding": query.get("encoding") or self.headers.get_content_charset()}
+        if "host" in query:
+            request.setdefault("host", query["host"])
+        self._extract(request)
+
+    def _extract(self, request: dict):
+        if "url" in request and not _is_http_url(request["url"]):
+            self._send_text(400, f"Поддерживаются только адреса http и https: {request['url']}")
+            return
+        server = self.server.extraction_server
+        if not server.try_acquire():
+            self._send_text(503, "Сервер перегружен", {"Retry-After": "1"})
+            return
+        try:
+            text = server.extract(request)
+        except OSError as e:
+            self._send_text(502, f"Ошибка загрузки страницы: {e}")
+        except Exception as e:
+            self._send_text(500, f"Ошибка разбора страницы: {type(e).__name__}: {e}")
+        else:
+            self._send(200, text if isinstance(text, bytes) else text.encode("utf-8"), server.content_type)
+        finally:
+            server.release()
+
+    def _send_json(self, status: int, value: dict):
+        self._send(status, json.dumps(value, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _send_text(self, status: int, text: str, headers: dict = None):
+        self._send(status, text.encode("utf-8"), "text/plain; charset=utf-8", headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # у unix-сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _extract_request(extractor: ContentExtractor, request: dict) -> str:
+    host_name = request.get("host") or "*"
+    if "url" in request:
+        # локальные файлы и другие схемы адресов через сервер не читаются
+        if not _is_http_url(request["url"]):
+            raise RuntimeError(f"Поддерживаются только адреса http и https: {request['url']}")
+        return extractor.extract_from_url(request["url"])
+    if "html" in request:
+        return extractor.extract_from_bytes(request["html"].encode("utf-8"), host_name=host_name, encoding="utf-8")
+    return extractor.extract_from_bytes(request["data"], host_name=host_name, encoding=request.get("encoding"))
+
+
+def _is_http_url(url) -> bool:
+    try:
+        return isinstance(url, str) and urllib.parse.urlsplit(url).scheme.lower() in ("http", "https")
+    except ValueError:
+        return False
+
+
+def _extract_chunk(extractor: ContentExtractor, chunk: list) -> list:
+    return [_extract_request(extractor, request) for request in chunk]
@@ -0,0 +1,94 @@
+import time
+from collections import Counter
+from typing import Iterable, Iterator
+
+STAGES = ("fetch", "decode", "parse", "classify", "write")
+
+
+class StageTime:
+    def __init__(self, wall: float = 0.0, cpu: float = 0.0):
+        self.wall = wall
+        self.cpu = cpu
+
+    def __repr__(self) -> str:
+        return f"StageTime[wall={self.wall:.6f}, cpu={self.cpu:.6f}]"
+
+
+class ExtractionStats:
+    def __init__(self, address: str = None, host_name: str = None):
+        self.address = address
+        self.host_name = host_name
+        self.documents = 0
+        self.stages = {stage: StageTime() for stage in STAGES}
+        self.elements_visited = 0
+        self.elements_skipped = 0
+        self.elements_excluded = 0
+        # проверки скомпилированных наборов правил при промахах кэша классов
+        self.rule_evaluations = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # срабатывания каждого правила при промахах кэша классов, как если бы правила проверялись по одному,
+        # ключ - "<хосты> <секция>: <правило>"
+        self.rule_hits = Counter()
+
+    def add_time(self, stage: str, wall: float, cpu: float):
+        stage_time = self.stages[stage]
+        stage_time.wall += wall
+        stage_time.cpu += cpu
+
+    def measure(self, stage: str) -> "_StageTimer":
+        return _StageTimer(self, stage)
+
+    def timed(self, iterable: Iterable, stage: str) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            with self.measure(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, other: "ExtractionStats"):
+        self.documents += other.documents
+        for stage, stage_time in other.stages.items():
+            self.add_time(stage, stage_time.wall, stage_time.cpu)
+        self.elements_visited += other.elements_visited
+        self.elements_skipped += other.elements_skipped
+        self.elements_excluded += other.elements_excluded
+        self.rule_evaluations += other.rule_evaluations
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.rule_hits.update(other.rule_hits)
+
+    def to_dict(self) -> dict:
+        return {
+            "address": self.address,
+            "host_name": self.host_name,
+            "documents": self.documents,
+            "stages": {stage: {"wall": stage_time.wall, "cpu": stage_time.cpu}
+                       for stage, stage_time in self.stages.items()},
+            "elements_visited": self.elements_visited,
+            "elements_skipped": self.elements_skipped,
+            "elements_excluded": self.elements_excluded,
+            "rule_evaluations": self.rule_evaluations,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "rule_hits": dict(self.rule_hits),
+        }
+
+
+class _StageTimer:
+    def __init__(self, stats: ExtractionStats, stage: str):
+        self._stats = stats
+        self._stage = stage
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stats.add_time(self._stage, time.perf_counter() - self._wall, time.thread_time() - self._cpu)
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+from .fetcher import Validators
+
+
+class StoredExtraction(NamedTuple):
+    validators: Validators
+    text: str
+
+
+class UrlStore:
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url: str, version: str) -> Optional[StoredExtraction]:
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # текст, разобранный другими правилами, не годится, даже если страница не менялась
+        if entry.get("url") != url or entry.get("version") != version:
+            return None
+        return StoredExtraction(Validators(entry.get("etag"), entry.get("last_modified")), entry["text"])
+
+    def put(self, url: str, version: str, validators: Validators, text: str):
+        if not validators:
+            return
+        entry = {"url": url, "version": version, "etag": validators.etag, "last_modified": validators.last_modified,
+                 "text": text}
+        path = self._path(url)
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self._directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
@@ -2,14 +2,18 @@ import re
 import textwrap
 
 _SPACES_RE = re.compile(r"\s+")
+DEFAULT_MAX_LINE_LENGTH = 80
 
 
 class TextWriter:
-    def __init__(self, max_line_length=80):
+    def __init__(self, max_line_length=DEFAULT_MAX_LINE_LENGTH):
         self._max_line_length = max_line_length
+        self._wrapper = textwrap.TextWrapper(width=max_line_length)
         self._new_block_started: bool = True
         self._lines = []
-        self._buffer = ""
+        self._fragments = []
+        self._popped_lines = 0
+        self._any_line_popped = False
 
     def start_header(self):
         self._new_block_started = True
@@ -32,7 +36,22 @@ class TextWriter:
         pass
 
     def get_text(self) -> str:
-        return "\n".join(self._lines) + "\n" + self._buffer
+        self._wrap_pending()
+        return "\n".join(self._lines) + "\n" + "".join(self._fragments)
+
+    def pop_text(self, final: bool = False) -> str:
+        self._wrap_pending()
+        lines = self._lines[self._popped_lines:]
+        text = "".join(line + "\n" for line in lines)
+        if final:
+            if not self._any_line_popped and not lines:
+                text = "\n"
+            text += "".join(self._fragments)
+        if lines:
+            self._any_line_popped = True
+            del self._lines[:-1]
+            self._popped_lines = len(self._lines)
+        return text
 
     def write_link(self, url: str):
         self._write(f"[{url}]")
@@ -43,7 +62,7 @@ class TextWriter:
             self._lines.append("")
 
     def _has_data(self) -> bool:
-        return len(self._lines) > 0 or len(self._buffer) > 0
+        return len(self._lines) > 0 or len(self._fragments) > 0
 
     def _write_data(self, text: str):
         normalized = _SPACES_RE.sub(" ", text).strip()
@@ -54,21 +73,28 @@ class TextWriter:
     def _write(self, text: str):
         if len(text) == 0:
             return
-        if len(self._buffer) > 0 and not self._buffer[-1].isspace() and not text[0].isspace():
-            self._buffer += " "
-        self._buffer += text
-        buffer_lines = self._buffer.splitlines()
-        wrapped_lines = []
-        for line in buffer_lines:
-            wrapped_lines.extend(textwrap.wrap(line, width=self._max_line_length))
+        if "\t" in text:
+            # табуляция раскрывается относительно начала строки, поэтому текущий блок
+            # переносим сразу, как это делалось бы при немедленном переносе строк
+            self._wrap_pending()
+        if len(self._fragments) > 0 and not text[0].isspace():
+            self._fragments.append(" ")
+        self._fragments.append(text)
+
+    def _flush(self):
+        self._lines.extend(self._wrap_block())
+        self._fragments = []
+
+    def _wrap_pending(self):
+        wrapped_lines = self._wrap_block()
         if len(wrapped_lines) > 1:
             self._lines.extend(wrapped_lines[:-1])
-        self._buffer = wrapped_lines[-1]
+        self._fragments = wrapped_lines[-1:]
 
-    def _flush(self):
-        buffer_lines = self._buffer.splitlines()
+    def _wrap_block(self) -> list:
+        if len(self._fragments) == 0:
+            return []
         wrapped_lines = []
-        for line in buffer_lines:
-            wrapped_lines.extend(textwrap.wrap(line, width=self._max_line_length))
-        self._lines.extend(wrapped_lines)
-        self._buffer = ""
+        for line in "".join(self._fragments).splitlines():
+            wrapped_lines.extend(self._wrapper.wrap(line))
+        return wrapped_lines
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+from content_extractor.batch import ExtractionError, read_manifest
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+_FILES = [f"{_DATA_DIR}/{name}" for name in ("simple_01.html", "lenta_ru_01.html", "simple_02.html",
+                                             "gazeta_01.html", "rbc_01.html", "lenta_ru_02.html")]
+
+
+class ExtractManyTests(unittest.TestCase):
+    def setUp(self):
+        self.extractor = ContentExtractor(f"{_DATA_DIR}/test_rules.txt")
+        self.addresses = _FILES + [(f"{_DATA_DIR}/simple_01.html", "test")]
+        self.expected = [(address, self.extractor.extract_from_file(address)) for address in _FILES]
+        self.expected.append((f"{_DATA_DIR}/simple_01.html",
+                              self.extractor.extract_from_file(f"{_DATA_DIR}/simple_01.html", host_name="test")))
+
+    def test_results_in_input_order(self):
+        results = list(self.extractor.extract_many(self.addresses, workers=2, chunk_size=2, max_pending_chunks=1))
+        self.assertEqual(self.expected, results)
+
+    def test_results_in_completion_order(self):
+        results = list(self.extractor.extract_many(self.addresses, workers=2, chunk_size=1, ordered=False))
+        self.assertCountEqual(self.expected, results)
+
+    def test_threads(self):
+        results = list(self.extractor.extract_many(self.addresses, workers=3, chunk_size=1, max_pending_chunks=2,
+                                                   threads=True))
+        self.assertEqual(self.expected, results)
+        results = list(self.extractor.extract_many(self.addresses, workers=3, ordered=False, threads=True))
+        self.assertCountEqual(self.expected, results)
+
+    def test_failed_document(self):
+        missing = f"{_DATA_DIR}/missing.html"
+        addresses = [_FILES[0], missing, _FILES[1]]
+        for threads in (False, True):
+            results = list(self.extractor.extract_many(addresses, workers=2, chunk_size=2, threads=threads))
+            self.assertEqual([_FILES[0], missing, _FILES[1]], [address for address, _ in results])
+            self.assertEqual([self.expected[0][1], self.expected[1][1]], [results[0][1], results[2][1]])
+            self.assertIsInstance(results[1][1], ExtractionError)
+            self.assertIn("FileNotFoundError", str(results[1][1]))
+
+    def test_read_manifest(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+            f.write("# список страниц\n\n/data/a.html\n  /data/b.html  lenta.ru\nhttps://lenta.ru/news/1/\n"
+                    "/data/my pages/c.html lenta.ru\n/data/my pages/d.html\tgazeta.ru\n")
+        try:
+            self.assertEqual(["/data/a.html", ("/data/b.html", "lenta.ru"), "https://lenta.ru/news/1/",
+                              ("/data/my pages/c.html", "lenta.ru"), ("/data/my pages/d.html", "gazeta.ru")],
+                             read_manifest(f.name))
+        finally:
+            os.remove(f.name)
+
+    def test_read_manifest_file_with_spaces(self):
+        directory = tempfile.mkdtemp()
+        try:
+            page_file_name = f"{directory}/my page.html"
+            with open(page_file_name, "w", encoding="utf-8") as f:
+                f.write("<html><body><p>Текст</p></body></html>")
+            manifest_file_name = f"{directory}/manifest.txt"
+            with open(manifest_file_name, "w", encoding="utf-8") as f:
+                f.write(f"{page_file_name}\n")
+            self.assertEqual([page_file_name], read_manifest(manifest_file_name))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
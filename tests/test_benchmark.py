@@ -0,0 +1,28 @@
+import unittest
+
+from content_extractor.benchmark import BenchmarkDocument, compare_with_baseline, run_benchmark, synthetic_documents
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_run_benchmark(self):
+        documents = [BenchmarkDocument("simple", "<html><body><h1>Заголовок</h1><p>Текст</p></body></html>".encode())]
+        documents.extend(synthetic_documents(scale=0))
+        results = run_benchmark(documents, repeat=1)
+        self.assertEqual(["simple", "synthetic_deep_nesting", "synthetic_paragraphs", "synthetic_attributes"],
+                         [result.name for result in results])
+        for result in results:
+            self.assertEqual({"decode", "tokenize", "extract"}, set(result.stages.keys()))
+            self.assertGreater(result.total, 0)
+            self.assertGreater(result.peak_memory, 0)
+
+    def test_compare_with_baseline(self):
+        results = run_benchmark([BenchmarkDocument("simple", b"<html><body><p>Text</p></body></html>")], repeat=1)
+        total = results[0].total
+        self.assertEqual([], compare_with_baseline(results, {"simple": {"total": total}}, 0.2))
+        self.assertEqual([], compare_with_baseline(results, {"other": {"total": total / 10}}, 0.2))
+        regressions = compare_with_baseline(results, {"simple": {"total": total / 2}}, 0.2)
+        self.assertEqual([("simple", total / 2, total)], regressions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import tempfile
+import unittest
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+from content_extractor.blocks import HEADER, PARAGRAPH, Block, Link, read_binary_blocks
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+_PAGES = ["simple_01.html", "simple_02.html", "lenta_ru_01.html", "lenta_ru_02.html", "gazeta_01.html",
+          "rbc_01.html"]
+_HTML = ("<html><body><h1>Заголовок <span>статьи</span></h1><p>Текст  со <a href='/link'>ссылкой</a></p>"
+         "<p>- не список *и* не _курсив_<br>Вторая строка</p><p><a href='http://localhost/a b'></a></p>"
+         "</body></html>")
+
+
+def _render_as_text(blocks: list) -> str:
+    parts = []
+    for block in blocks:
+        text = block.text
+        for link in reversed(block.links):
+            text = f"{text[:link.offset]}[{link.url}]{text[link.offset:]}"
+        parts.append(f"# {text}" if block.type == HEADER else text)
+    return "".join(parts)
+
+
+def _jsonl_blocks(text: str) -> list:
+    return [Block(item["type"], item["text"], tuple(Link(link["offset"], link["url"]) for link in item["links"]))
+            for item in map(json.loads, text.splitlines())]
+
+
+class OutputFormatTests(unittest.TestCase):
+    def test_blocks_keep_text_content(self):
+        for host_name, rules_file_name in (("*", None), ("test", f"{_DATA_DIR}/test_rules.txt")):
+            text_extractor = ContentExtractor(rules_file_name)
+            jsonl_extractor = ContentExtractor(rules_file_name, output_format="jsonl")
+            binary_extractor = ContentExtractor(rules_file_name, output_format="binary")
+            for page in _PAGES:
+                file_name = f"{_DATA_DIR}/{page}"
+                text = text_extractor.extract_from_file(file_name, host_name=host_name)
+                blocks = _jsonl_blocks(jsonl_extractor.extract_from_file(file_name, host_name=host_name))
+                # без учета пробелов и переносов строк блоки содержат тот же текст, что и обычный вывод
+                self.assertEqual("".join(text.split()), "".join(_render_as_text(blocks).split()), page)
+                binary = binary_extractor.extract_from_file(file_name, host_name=host_name)
+                self.assertEqual([blocks], list(read_binary_blocks(binary)), page)
+
+    def test_block_model(self):
+        extractor = ContentExtractor(output_format="jsonl")
+        self.assertEqual([
+            Block(HEADER, "Заголовок статьи"),
+            Block(PARAGRAPH, "Текст со ссылкой", (Link(9, "/link"),)),
+            Block(PARAGRAPH, "- не список *и* не _курсив_ Вторая строка"),
+            Block(PARAGRAPH, "", (Link(0, "http://localhost/a b"),)),
+        ], _jsonl_blocks("".join(extractor.extract_stream([_HTML]))))
+
+    def test_markdown(self):
+        extractor = ContentExtractor(output_format="markdown")
+        self.assertEqual("# Заголовок статьи\n\n"
+                         "Текст со [/link](/link) ссылкой\n\n"
+                         "\\- не список \\*и\\* не \\_курсив\\_ Вторая строка\n\n"
+                         "[http://localhost/a b](http://localhost/a%20b)\n",
+                         "".join(extractor.extract_stream([_HTML])))
+
+    def test_streamed_output(self):
+        for output_format in ("markdown", "jsonl", "binary"):
+            extractor = ContentExtractor(output_format=output_format)
+            with open(f"{_DATA_DIR}/lenta_ru_01.html", encoding="utf-8") as f:
+                html = f.read()
+            parts = list(extractor.extract_stream([html[i:i + 1000] for i in range(0, len(html), 1000)]))
+            self.assertGreater(len(parts), 2)
+            whole = extractor.extract_from_file(f"{_DATA_DIR}/lenta_ru_01.html")
+            self.assertEqual(whole, parts[0][:0].join(parts), output_format)
+
+    def test_binary_documents_in_one_stream(self):
+        extractor = ContentExtractor(output_format="binary")
+        stream = tempfile.TemporaryFile()
+        for page in ("simple_01.html", "simple_02.html"):
+            with open(f"{_DATA_DIR}/{page}", "rb") as f:
+                for part in extractor.extract_stream(f):
+                    stream.write(part)
+        stream.seek(0)
+        documents = list(read_binary_blocks(stream))
+        stream.close()
+        self.assertEqual(2, len(documents))
+        self.assertEqual(HEADER, documents[0][0].type)
+
+    def test_unsupported_options(self):
+        with self.assertRaises(RuntimeError):
+            ContentExtractor(output_format="xml")
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(RuntimeError):
+                ContentExtractor(output_format="binary", cache_directory=directory)
+            with ContentExtractor(output_format="markdown", cache_directory=directory) as extractor:
+                self.assertEqual(extractor.extract_from_file(f"{_DATA_DIR}/simple_01.html"),
+                                 extractor.extract_from_file(f"{_DATA_DIR}/simple_01.html"))
+                self.assertEqual(1, extractor.result_cache.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
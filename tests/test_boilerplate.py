@@ -0,0 +1,139 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from content_extractor import ContentExtractor
+from content_extractor.boilerplate import BlockFingerprint, BoilerplateCache
+
+_WORDS = "дом кот лес река город поле небо море гора снег".split()
+_PROMO = "Подписывайтесь на наш канал"
+
+
+def _page(number: int, promo: str = _PROMO) -> str:
+    words = random.Random(number)
+
+    def text(count: int) -> str:
+        return " ".join(words.choice(_WORDS) for _ in range(count))
+
+    return (f"<html><body><div class='menu'><ul><li>Главная</li><li>Новости</li><li>Спорт</li></ul></div>"
+            f"<div class='article'><h1>{text(4)}</h1><p>{text(12)}</p><p>{text(10)}</p></div>"
+            f"<div class='promo'><p>{promo}</p></div><p>{text(5)}</p></body></html>")
+
+
+class BoilerplateTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = f"{self.directory}/boilerplate.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _extract(self, extractor: ContentExtractor, html: str, host_name: str = "site") -> str:
+        return "".join(extractor.extract_stream([html], host_name=host_name))
+
+    def test_repeated_blocks_skipped(self):
+        extractor = ContentExtractor(learn_boilerplate=True)
+        plain_extractor = ContentExtractor()
+        for number in range(5):
+            self.assertEqual(self._extract(plain_extractor, _page(number)), self._extract(extractor, _page(number)))
+        for number in range(5, 15):
+            text = self._extract(extractor, _page(number))
+            self.assertNotIn("Главная", text)
+            self.assertNotIn(_PROMO, text)
+            # абзацы статей на общем пути каждый раз разные и остаются в тексте
+            blocks = self._extract(plain_extractor, _page(number)).split("\n\n")
+            self.assertEqual([block for block in blocks if block not in ("Главная Новости Спорт", _PROMO)],
+                             text.strip("\n").split("\n\n"))
+        # блоки одного хоста не пропускаются на страницах других хостов
+        self.assertIn("Главная", self._extract(extractor, _page(15), host_name="other"))
+
+    def test_changed_block_rechecked(self):
+        extractor = ContentExtractor(learn_boilerplate=True)
+        extractor._boilerplate._recheck_interval = 4
+        for number in range(8):
+            self._extract(extractor, _page(number))
+        texts = [self._extract(extractor, _page(number, promo="Новый канал")) for number in range(8, 24)]
+        # шаблонный блок проверяется без вывода каждый 4-й документ, после изменения текста снова выводится,
+        # а затем снова пропускается как шаблонный
+        self.assertNotIn("Новый канал", texts[0])
+        self.assertTrue(any("Новый канал" in text for text in texts))
+        self.assertNotIn("Новый канал", texts[-1])
+        self.assertFalse(any(_PROMO in text or "Главная" in text for text in texts))
+
+    def test_saved_between_runs(self):
+        with ContentExtractor(boilerplate_file=self.file_name) as extractor:
+            for number in range(6):
+                self._extract(extractor, _page(number))
+        with ContentExtractor(boilerplate_file=self.file_name) as extractor:
+            self.assertNotIn(_PROMO, self._extract(extractor, _page(6)))
+        with ContentExtractor(learn_boilerplate=True) as extractor:
+            self.assertIn(_PROMO, self._extract(extractor, _page(7)))
+
+    def test_concurrent_saves_merged(self):
+        # два процесса с одним файлом: счетчики обоих складываются, а не перезаписываются последним
+        with ContentExtractor(boilerplate_file=self.file_name) as extractor:
+            self._extract(extractor, _page(0))
+        first = ContentExtractor(boilerplate_file=self.file_name)
+        second = ContentExtractor(boilerplate_file=self.file_name)
+        for number in range(1, 4):
+            self._extract(first, _page(number))
+            self._extract(second, _page(number + 10))
+        first.close()
+        second.close()
+        cache = BoilerplateCache(self.file_name)
+        self.assertEqual(7, cache._hosts["site"].documents)
+        self.assertEqual(7, max(entry[1] for entry in cache._hosts["site"].paths.values()))
+        with ContentExtractor(boilerplate_file=self.file_name) as extractor:
+            self.assertNotIn(_PROMO, self._extract(extractor, _page(20)))
+
+    def test_bounded_size(self):
+        cache = BoilerplateCache(max_hosts=2, max_paths=3)
+        for host_name in ("a", "b", "c"):
+            document = cache.document(host_name)
+            for number in range(5):
+                fingerprint = BlockFingerprint()
+                fingerprint.add_text(f"текст {number}")
+                document.add(bytes([number]), fingerprint)
+            document.finish()
+        self.assertEqual(["b", "c"], list(cache._hosts))
+        self.assertEqual([bytes([2]), bytes([3]), bytes([4])], list(cache._hosts["c"].paths))
+
+    def test_block_fingerprint(self):
+        def fingerprint(text: str, inner_text: str) -> BlockFingerprint:
+            inner = BlockFingerprint()
+            inner.add_text(inner_text)
+            outer = BlockFingerprint()
+            outer.add_text(text)
+            outer.add_block(inner)
+            return outer
+
+        # регистр и пробелы не важны, текст вложенного блока входит в отпечаток внешнего через его отпечаток
+        self.assertEqual(fingerprint("Меню  сайта", "Главная\n").digest(),
+                         fingerprint("меню сайта ", " главная").digest())
+        self.assertNotEqual(fingerprint("Меню сайта", "Главная").digest(),
+                            fingerprint("Меню сайта", "Новости").digest())
+        self.assertTrue(fingerprint(" ", "").empty)
+
+    def test_batch_workers_save_cache(self):
+        files = []
+        for number in range(6):
+            files.append((f"{self.directory}/page_{number}.html", "site"))
+            with open(files[-1][0], "w", encoding="utf-8") as f:
+                f.write(_page(number))
+        extractor = ContentExtractor(boilerplate_file=self.file_name)
+        texts = dict(extractor.extract_many(files, workers=1))
+        self.assertIn(_PROMO, texts[files[0][0]])
+        self.assertNotIn(_PROMO, texts[files[-1][0]])
+        self.assertTrue(os.path.exists(self.file_name))
+
+    def test_unsupported_options(self):
+        with self.assertRaises(RuntimeError):
+            ContentExtractor(learn_boilerplate=True, cache_directory=self.directory)
+        with self.assertRaises(RuntimeError):
+            ContentExtractor(boilerplate_file=self.file_name, boilerplate_threshold=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from os.path import dirname
+from unittest import mock
+
+from content_extractor import ContentExtractor
+from content_extractor.cache import ResultCache
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+
+
+def _put_results(directory: str, worker: int) -> int:
+    cache = ResultCache(directory, max_size=4096)
+    for i in range(50):
+        cache.put(ResultCache.key(f"{worker}-{i}".encode(), "*", "", ""), f"текст {worker} {i}\n" * 5)
+        cache.get(ResultCache.key(f"{worker}-{i // 2}".encode(), "*", "", ""))
+    return worker
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_stored_text(self):
+        cache = ResultCache(self.directory)
+        key = ResultCache.key(b"<html></html>", "lenta.ru", "rules", "width=80")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "Заголовок\r\n\nТекст")
+        self.assertEqual("Заголовок\r\n\nТекст", cache.get(key))
+        self.assertEqual("Заголовок\r\n\nТекст", ResultCache(self.directory).get(key))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_key_parts(self):
+        key = ResultCache.key(b"<html></html>", "lenta.ru", "rules", "width=80")
+        self.assertNotEqual(key, ResultCache.key(b"<html> </html>", "lenta.ru", "rules", "width=80"))
+        self.assertNotEqual(key, ResultCache.key(b"<html></html>", "rbc.ru", "rules", "width=80"))
+        self.assertNotEqual(key, ResultCache.key(b"<html></html>", "lenta.ru", "other rules", "width=80"))
+        self.assertNotEqual(key, ResultCache.key(b"<html></html>", "lenta.ru", "rules", "width=60"))
+        self.assertNotEqual(key, ResultCache.key(b"<html></html>", "lenta.ru", "rules", "width=80", "cp1251"))
+
+    def test_least_recently_used_evicted(self):
+        cache = ResultCache(self.directory, max_size=1000)
+        keys = [ResultCache.key(str(i).encode(), "*", "", "") for i in range(4)]
+        for i, key in enumerate(keys[:3]):
+            cache.put(key, str(i) * 300)
+            os.utime(cache._path(key), ns=(i * 10 ** 9, i * 10 ** 9))
+        cache.get(keys[0])
+        cache.put(keys[3], "3" * 300)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[3]))
+        self.assertLessEqual(cache.size, 1000)
+
+    def test_entry_evicted_right_after_put(self):
+        cache = ResultCache(self.directory)
+        key = ResultCache.key(b"<html></html>", "*", "", "")
+        replace = os.replace
+
+        def replace_and_evict(source, destination):
+            # вытеснение в другом процессе сразу после записи
+            replace(source, destination)
+            os.remove(destination)
+
+        with mock.patch("content_extractor.cache.os.replace", side_effect=replace_and_evict):
+            cache.put(key, "текст")
+        self.assertEqual(len("текст".encode("utf-8")), cache.size)
+        self.assertIsNone(cache.get(key))
+
+    def test_failed_write_leaves_no_temp_files(self):
+        cache = ResultCache(self.directory)
+        key = ResultCache.key(b"<html></html>", "*", "", "")
+        with self.assertRaises(TypeError):
+            cache.put(key, None)
+        self.assertEqual([], [name for _, _, names in os.walk(self.directory) for name in names
+                              if name.endswith(".tmp")])
+        self.assertEqual(0, cache.size)
+
+    def test_concurrent_processes(self):
+        with ProcessPoolExecutor(4) as executor:
+            self.assertEqual([0, 1, 2, 3], list(executor.map(_put_results, [self.directory] * 4, range(4))))
+        # процессы видят записи друг друга только при пересчете размера, поэтому предел проверяем в новом экземпляре
+        cache = ResultCache(self.directory, max_size=4096)
+        self.assertLessEqual(cache.size, 4096)
+        self.assertEqual(cache.size, cache._scan_size())
+        stored = {ResultCache.key(f"{worker}-{i}".encode(), "*", "", ""): f"текст {worker} {i}\n" * 5
+                  for worker in range(4) for i in range(50)}
+        entries = cache._entries()
+        self.assertGreater(len(entries), 0)
+        for path, _, _ in entries:
+            key = os.path.basename(path)[:-len(".txt")]
+            self.assertEqual(stored[key], cache.get(key))
+        leftovers = [name for _, _, names in os.walk(self.directory) for name in names if name.endswith(".tmp")]
+        self.assertEqual([], leftovers)
+
+
+class ExtractorResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rules_file_name = f"{self.directory}/rules.txt"
+        shutil.copy(f"{_DATA_DIR}/test_rules.txt", self.rules_file_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unchanged_document_not_parsed(self):
+        file_name = f"{_DATA_DIR}/simple_01.html"
+        expected = ContentExtractor(self.rules_file_name).extract_from_file(file_name, host_name="test")
+        extractor = ContentExtractor(self.rules_file_name, cache_directory=f"{self.directory}/cache")
+        self.assertEqual(expected, extractor.extract_from_file(file_name, host_name="test"))
+
+        with mock.patch.object(ContentExtractor, "_extract_stream", side_effect=AssertionError("документ разобран")):
+            self.assertEqual(expected, extractor.extract_from_file(file_name, host_name="test"))
+            cached_extractor = ContentExtractor(self.rules_file_name, cache_directory=f"{self.directory}/cache")
+            self.assertEqual(expected, cached_extractor.extract_from_file(file_name, host_name="test"))
+        self.assertNotEqual(expected, extractor.extract_from_file(file_name, host_name="*"))
+
+    def test_encoding_in_key(self):
+        file_name = f"{self.directory}/page.html"
+        with open(file_name, "wb") as f:
+            f.write("<html><body><p>Привет мир</p></body></html>".encode("cp1251"))
+        extractor = ContentExtractor(self.rules_file_name)
+        cached_extractor = ContentExtractor(self.rules_file_name, cache_directory=f"{self.directory}/cache")
+        for encoding in ("cp1251", "koi8-r", "windows-1251"):
+            self.assertEqual(extractor.extract_from_file(file_name, encoding=encoding),
+                             cached_extractor.extract_from_file(file_name, encoding=encoding), encoding)
+        # cp1251 и windows-1251 - одна кодировка и одна запись кэша
+        self.assertEqual((1, 2), (cached_extractor.result_cache.hits, cached_extractor.result_cache.misses))
+
+    def test_changed_rules_not_taken_from_cache(self):
+        file_name = f"{_DATA_DIR}/simple_01.html"
+        extractor = ContentExtractor(self.rules_file_name, cache_directory=f"{self.directory}/cache")
+        self.assertIn("Навигация", extractor.extract_from_file(file_name, host_name="test"))
+
+        with open(self.rules_file_name, encoding="utf-8") as f:
+            text = f.read()
+        time.sleep(0.01)
+        with open(self.rules_file_name, "w", encoding="utf-8") as f:
+            f.write(text.replace("+class:nav", ""))
+        extractor = ContentExtractor(self.rules_file_name, cache_directory=f"{self.directory}/cache")
+        self.assertNotIn("Навигация", extractor.extract_from_file(file_name, host_name="test"))
+
+
+if __name__ == '__main__':
+    unittest.main()
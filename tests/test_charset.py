@@ -0,0 +1,95 @@
+import codecs
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import unittest
+
+from content_extractor import ContentExtractor
+from content_extractor.charset import sniff_encoding
+
+
+class SniffEncodingTests(unittest.TestCase):
+    def test_bom(self):
+        self.assertEqual("utf-8-sig", sniff_encoding(codecs.BOM_UTF8 + b"<html>"))
+        self.assertEqual("utf-16", sniff_encoding("<html>".encode("utf-16")))
+
+    def test_meta_charset(self):
+        self.assertEqual("cp1251", sniff_encoding(b"<html><head><meta charset=\"windows-1251\"></head>"))
+        self.assertEqual("koi8-r", sniff_encoding(b"<META HTTP-EQUIV='Content-Type' "
+                                                  b"CONTENT='text/html; charset=KOI8-R'>"))
+        self.assertEqual("utf-8", sniff_encoding(b"<meta name=\"x\" content=\"y\"><meta charset=utf-16>"))
+        self.assertEqual("cp1251", sniff_encoding(b"<meta charset=\"unknown\"><meta charset='cp1251'>"))
+
+    def test_unknown(self):
+        self.assertIsNone(sniff_encoding(b"<html><body>charset=cp1251</body></html>"))
+        self.assertIsNone(sniff_encoding(b" " * 5000 + b"<meta charset=\"cp1251\">"))
+
+
+class FileInputTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.extractor = ContentExtractor()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, data: bytes) -> str:
+        file_name = f"{self.directory}/page.html"
+        with open(file_name, "wb") as f:
+            f.write(data)
+        return file_name
+
+    def test_encoding_detected(self):
+        html = "<html><head><meta charset=\"windows-1251\"></head><body><h1>Заголовок</h1><p>Текст</p></body></html>"
+        file_name = self._write(html.encode("cp1251"))
+        self.assertEqual("# Заголовок\n\nТекст", self.extractor.extract_from_file(file_name))
+        self.assertEqual("# Заголовок\n\nТекст", self.extractor.extract_from_file(file_name, encoding="cp1251"))
+        html = "<html><body><h1>Заголовок</h1><p>Текст</p></body></html>"
+        file_name = self._write(html.encode("utf-16"))
+        self.assertEqual("# Заголовок\n\nТекст", self.extractor.extract_from_file(file_name))
+
+    def test_same_text_as_text_mode(self):
+        html = "<html><body><pre>Строка\r\nстрока\rстрока</pre><p>" + "Текст параграфа. " * 10000 + "</p></body></html>"
+        file_name = self._write(html.encode("utf-8"))
+        with open(file_name, encoding="utf-8") as f:
+            expected = "".join(self.extractor.extract_stream(f))
+        self.assertEqual(expected, self.extractor.extract_from_file(file_name))
+        empty_file_name = self._write(b"")
+        self.assertEqual("".join(self.extractor.extract_stream([""])), self.extractor.extract_from_file(empty_file_name))
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "нет именованных каналов")
+    def test_pipe(self):
+        html = "<html><body><h1>Заголовок</h1><p>Текст</p></body></html>"
+        file_name = f"{self.directory}/page.fifo"
+        os.mkfifo(file_name)
+
+        def write():
+            with open(file_name, "wb") as f:
+                f.write(html.encode("utf-8"))
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            self.assertEqual("# Заголовок\n\nТекст", self.extractor.extract_from_file(file_name))
+        finally:
+            writer.join()
+
+    def test_memory_bounded_by_window(self):
+        block = "<div class=\"banner\"><p>Реклама " + "x" * 1000 + "</p></div>"
+        html = "<html><body><h1>Заголовок</h1>" + block * 5000 + "<p>Текст</p></body></html>"
+        file_name = self._write(html.encode("utf-8"))
+        self.assertGreater(os.path.getsize(file_name), 5000000)
+
+        tracemalloc.start()
+        try:
+            text = self.extractor.extract_from_file(file_name)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual("# Заголовок\n\nТекст", text)
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
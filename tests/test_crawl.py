@@ -0,0 +1,157 @@
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+from content_extractor.crawl import crawl, iter_entries
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+_PAGES = {"test.site/news/simple_01.html": "simple_01.html", "other/simple_01.html": "simple_01.html",
+          "rbc_01.htm": "rbc_01.html"}
+
+
+class CrawlTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = f"{self.directory}/site"
+        self.output = f"{self.directory}/out"
+        self.rules_file_name = f"{self.directory}/rules.txt"
+        with open(f"{_DATA_DIR}/test_rules.txt", encoding="utf-8") as f:
+            rules = f.read()
+        with open(self.rules_file_name, "w", encoding="utf-8") as f:
+            f.write(rules.replace("domain:test", "domain:test,test.site"))
+        for name, data_file_name in _PAGES.items():
+            os.makedirs(os.path.dirname(f"{self.source}/{name}"), exist_ok=True)
+            shutil.copy(f"{_DATA_DIR}/{data_file_name}", f"{self.source}/{name}")
+        with open(f"{self.source}/notes.txt", "w", encoding="utf-8") as f:
+            f.write("не html")
+        extractor = ContentExtractor(self.rules_file_name)
+        page_file_name = f"{_DATA_DIR}/simple_01.html"
+        self.expected = {
+            "test.site/news/simple_01.txt": extractor.extract_from_file(page_file_name, host_name="test"),
+            "other/simple_01.txt": extractor.extract_from_file(page_file_name),
+            "rbc_01.txt": extractor.extract_from_file(f"{_DATA_DIR}/rbc_01.html"),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _crawl(self, source: str, **kwargs):
+        return crawl(self.rules_file_name, source, self.output, workers=2, chunk_size=1, **kwargs)
+
+    def _outputs(self) -> dict:
+        result = dict()
+        for root, _, file_names in os.walk(self.output):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                with open(path, encoding="utf-8") as f:
+                    result[os.path.relpath(path, self.output).replace(os.sep, "/")] = f.read()
+        return result
+
+    def test_directory(self):
+        entries = {entry.output_name: entry.host_name for entry in iter_entries(self.source)}
+        self.assertEqual({"test.site/news/simple_01.txt": "test.site", "other/simple_01.txt": "*",
+                          "rbc_01.txt": "*"}, entries)
+
+        summary = self._crawl(self.source)
+        self.assertEqual((3, 3, 0, 0), (summary.documents, summary.written, summary.unchanged, summary.errors))
+        self.assertEqual(self.expected, self._outputs())
+
+    def test_domain_for_files_without_host_directory(self):
+        summary = self._crawl(self.source, host_name="test")
+        self.assertEqual(3, summary.written)
+        self.assertEqual(self.expected["test.site/news/simple_01.txt"], self._outputs()["other/simple_01.txt"])
+
+    def test_unchanged_outputs_skipped(self):
+        self._crawl(self.source)
+        self.assertEqual(self.expected, self._outputs())
+        changed_file_name = f"{self.output}/rbc_01.txt"
+        with open(changed_file_name, "w", encoding="utf-8") as f:
+            f.write("устаревший текст")
+        mtime = os.path.getmtime(f"{self.output}/other/simple_01.txt")
+
+        summary = self._crawl(self.source)
+        self.assertEqual((3, 1, 2), (summary.documents, summary.written, summary.unchanged))
+        self.assertEqual(self.expected, self._outputs())
+        self.assertEqual(mtime, os.path.getmtime(f"{self.output}/other/simple_01.txt"))
+
+    def test_glob(self):
+        summary = self._crawl(f"{self.source}/**/simple_*.html")
+        self.assertEqual(2, summary.written)
+        self.assertEqual({"test.site/news/simple_01.txt", "other/simple_01.txt"}, set(self._outputs()))
+
+    def test_single_file(self):
+        summary = self._crawl(f"{self.source}/rbc_01.htm")
+        self.assertEqual(1, summary.written)
+        self.assertEqual({"rbc_01.txt": self.expected["rbc_01.txt"]}, self._outputs())
+
+    def test_archives(self):
+        zip_file_name = f"{self.directory}/site.zip"
+        with zipfile.ZipFile(zip_file_name, "w") as archive:
+            for name in _PAGES:
+                archive.write(f"{self.source}/{name}", name)
+        tar_file_name = f"{self.directory}/site.tar.gz"
+        with tarfile.open(tar_file_name, "w:gz") as archive:
+            archive.add(self.source, ".")
+
+        for file_name in (zip_file_name, tar_file_name):
+            shutil.rmtree(self.output, ignore_errors=True)
+            summary = self._crawl(file_name)
+            self.assertEqual(3, summary.written, file_name)
+            self.assertEqual(self.expected, self._outputs(), file_name)
+
+    def test_warc(self):
+        with open(f"{_DATA_DIR}/simple_01.html", "rb") as f:
+            page = f.read()
+        chunked_page = b"".join(b"%x\r\n%s\r\n" % (len(part), part) for part in (page[:100], page[100:]))
+        chunked_page += b"0\r\n\r\n"
+        records = [
+            _warc_record("response", "http://test/news/1/", b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/html; charset=utf-8\r\nContent-Encoding: gzip\r\n\r\n"
+                         + gzip.compress(page)),
+            _warc_record("response", "https://www.example.org/", b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/html\r\nTransfer-Encoding: chunked\r\n\r\n" + chunked_page),
+            _warc_record("response", "https://www.example.org/page?id=1", b"HTTP/1.1 404 Not Found\r\n"
+                         b"Content-Type: text/html\r\n\r\n" + page),
+            _warc_record("request", "https://www.example.org/", b"GET / HTTP/1.1\r\n\r\n"),
+        ]
+        warc_file_name = f"{self.directory}/site.warc.gz"
+        with open(warc_file_name, "wb") as f:
+            for record in records:
+                f.write(gzip.compress(record))
+
+        summary = self._crawl(warc_file_name)
+        self.assertEqual((2, 2, 0), (summary.documents, summary.written, summary.errors))
+        self.assertEqual({"test/news/1/index.txt": self.expected["test.site/news/simple_01.txt"],
+                          "www.example.org/index.txt": self.expected["other/simple_01.txt"]}, self._outputs())
+
+    def test_warc_paths_stay_in_output_directory(self):
+        with open(f"{_DATA_DIR}/simple_01.html", "rb") as f:
+            response = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + f.read()
+        urls = ["http://evil.com/../../../tmp/pwned.html", "http://evil.com/%2e%2e/%2E%2E/escaped.html",
+                "http://evil.com/a/..\\..\\..\\back.html", "urn:x:/etc/cron.d/job", "http://../../up.html"]
+        warc_file_name = f"{self.directory}/evil.warc"
+        with open(warc_file_name, "wb") as f:
+            for url in urls:
+                f.write(_warc_record("response", url, response))
+
+        summary = self._crawl(warc_file_name, host_name="test")
+        self.assertEqual((5, 0), (summary.documents, summary.errors))
+        self.assertEqual(["evil.com/back.txt", "evil.com/escaped.txt", "evil.com/tmp/pwned.txt", "test/up.txt",
+                          "test/x:/etc/cron.d/job.txt"], sorted(self._outputs()))
+        self.assertEqual(["evil.warc", "out", "rules.txt", "site"], sorted(os.listdir(self.directory)))
+
+
+def _warc_record(record_type: str, url: str, block: bytes) -> bytes:
+    headers = (f"WARC/1.0\r\nWARC-Type: {record_type}\r\nWARC-Target-URI: {url}\r\n"
+               f"Content-Type: application/http; msgtype={record_type}\r\nContent-Length: {len(block)}\r\n\r\n")
+    return headers.encode("utf-8") + block + b"\r\n\r\n"
+
+
+if __name__ == '__main__':
+    unittest.main()
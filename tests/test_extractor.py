@@ -1,8 +1,29 @@
+import shutil
+import tempfile
 import unittest
+from os.path import dirname
 from textwrap import dedent
 
+import content_extractor
+from content_extractor import ContentExtractor
+from content_extractor.html import is_parser_backend_available
 from .utils import extract_from_file, extract_from_file_with_test_rules
 
+_DATA_DIR = f"{dirname(__file__)}/data"
+_REGION_RULES = """-tag:script
+-class:banner
+header:tag:h1
+paragraph:tag:p,div
+domain:start
+start:class:article
+domain:stop
+stop:class:related
+"""
+_REGION_HTML = """<html><body><div class="menu"><p>Меню</p></div></span><div class="article"><h1>Заголовок</h1>
+<div class="banner"><div class="related">Реклама</div></div><p>Текст <b>статьи</b></p></div>
+<p>Подпись</p><div class="related"><p>Читайте также</p><div class="article"><p>Другая статья</p></div></div>
+<script>var s = "<p>";</script></body></html>"""
+
 
 class ContentExtractorTests(unittest.TestCase):
     def test_simple_01(self):
@@ -30,6 +51,75 @@ class ContentExtractorTests(unittest.TestCase):
         """).strip("\n"), text, "Должен включать блок с навигацией, в соответствии с кастомным правилом для домена "
                                 "test")
 
+    def test_ignored_subtree_not_classified(self):
+        extractor = ContentExtractor(prescan=False)
+        classifier = extractor._rules.classifier("*")
+        hits, misses, _ = classifier.cache_info()
+        html = """<html><body><div class="banner"><p>Реклама</p><p><b>Реклама</b></p></div>
+        <h1>Заголовок <span class="banner"><h2>скрытый</h2></span> статьи</h1><p>Текст</p></body></html>"""
+        self.assertEqual("# Заголовок статьи\n\nТекст", "".join(extractor.extract_stream([html])))
+        # внутри заголовка закрытие вложенного h2 меняет глубину заголовка, поэтому такие элементы классифицируются
+        classified = sum(classifier.cache_info()[:2]) - hits - misses
+        self.assertEqual(5, classified)
+
+
+class ContentRegionTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rules_file_name = f"{self.directory}/rules.txt"
+        with open(self.rules_file_name, "w", encoding="utf-8") as f:
+            f.write(_REGION_RULES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _extractors(self) -> list:
+        extractors = [ContentExtractor(self.rules_file_name), ContentExtractor(self.rules_file_name, prescan=False),
+                      ContentExtractor(self.rules_file_name, instrumentation=True)]
+        if is_parser_backend_available("lxml"):
+            extractors.append(ContentExtractor(self.rules_file_name, parser_backend="lxml"))
+        return extractors
+
+    def test_content_region(self):
+        for extractor in self._extractors():
+            for chunk_size in (len(_REGION_HTML), 1, 7, 50):
+                chunks = [_REGION_HTML[i:i + chunk_size] for i in range(0, len(_REGION_HTML), chunk_size)]
+                self.assertEqual("Меню\n\n# Заголовок\n\nТекст статьи\n\nПодпись\n\nЧитайте также\n\nДругая статья",
+                                 "".join(extractor.extract_stream(chunks)))
+                # до начала области текст пропускается, после ее закрытия разбор завершается
+                self.assertEqual("# Заголовок\n\nТекст статьи",
+                                 "".join(extractor.extract_stream(chunks, host_name="start")))
+                # элемент stop внутри пропускаемого элемента не завершает разбор
+                self.assertEqual("Меню\n\n# Заголовок\n\nТекст статьи\n\nПодпись",
+                                 "".join(extractor.extract_stream(chunks, host_name="stop")))
+
+    def test_default_stop_rules_keep_content(self):
+        # правила stop по умолчанию завершают разбор только после статьи, подпись автора остается в тексте
+        with open(f"{dirname(content_extractor.__file__)}/default_rules.txt", encoding="utf-8") as f:
+            rules = [line for line in f.read().splitlines() if not line.startswith("stop:")]
+        with open(self.rules_file_name, "w", encoding="utf-8") as f:
+            f.write("\n".join(rules))
+        extractor, full_extractor = ContentExtractor(), ContentExtractor(self.rules_file_name)
+        for file_name in ("lenta_ru_01.html", "lenta_ru_02.html"):
+            text = extractor.extract_from_file(f"{_DATA_DIR}/{file_name}", host_name="lenta.ru")
+            self.assertEqual(full_extractor.extract_from_file(f"{_DATA_DIR}/{file_name}", host_name="lenta.ru"), text)
+            if file_name == "lenta_ru_01.html":
+                self.assertIn("Автор: [/authors/aleksandra-borisova] Александра Борисова", text)
+
+    def test_rest_of_document_not_read(self):
+        position = _REGION_HTML.index("Читайте")
+        read_chunks = []
+
+        def chunks():
+            for chunk in (_REGION_HTML[:position], _REGION_HTML[position:]):
+                read_chunks.append(chunk)
+                yield chunk
+
+        for host_name in ("start", "stop"):
+            read_chunks.clear()
+            "".join(ContentExtractor(self.rules_file_name).extract_stream(chunks(), host_name=host_name))
+            self.assertEqual(1, len(read_chunks), host_name)
+
 
 if __name__ == '__main__':
     unittest.main()
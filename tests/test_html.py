@@ -0,0 +1,81 @@
+import unittest
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+from content_extractor.html import is_parser_backend_available
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+
+_TEST_PAGES = ("lenta_ru_01.html", "lenta_ru_02.html", "gazeta_01.html", "rbc_01.html", "simple_01.html",
+               "simple_02.html")
+# внутри body страницы вложен второй <html><head>...<body>, libxml2 и html.parser восстанавливают его по-разному
+_RECOVERED_PAGES = {"lenta_ru_02.html"}
+
+_EDGE_CASES = [
+    """<!DOCTYPE html><html><head><title>Заголовок окна</title>
+    <script>document.write("<body><p>не текст</p>");</script><!-- <body> -->
+    <style>p { color: red; }</style></head>
+    <body><p>Текст</p></body></html>""",
+    """<html><body><h1>Заголовок <span class="hidden"><h2>скрытый</h2> <!-- комментарий --></span> статьи</h1>
+    <p>Параграф</p></body></html>""",
+    """<html><body><div class="footer"><div><p>Не закрыт <b>тег</div><script>var s = "</div>";</script>
+    <p a=1 b='2' c="3"/>x < y <br></br></div></div></div><p>После подвала</p></body></html>""",
+    """<html><body><template><p><svg><path d="M0"/></svg></p></template><p>Текст <button><img src="1.png">
+    <br/></button> после кнопки</p><div class="banner"><p>Реклама</p><textarea><p></textarea></div>
+    <p>Конец</p></body></html>""",
+    """<html><body><div class="banner"><p>Реклама</p></body><p>После закрытия body</p></div>
+    <body><p>Второй body</p></body></html>""",
+    """<html><body><div class="banner"><p title="<b>">Реклама</p><![CDATA[ x ]]><?pi?><!x></div>
+    <p>Текст</p></body></html>""",
+]
+
+
+class PrescanTests(unittest.TestCase):
+    def _assert_prescan_keeps_text(self, extract):
+        for rules_file_name in (None, f"{_DATA_DIR}/test_rules.txt"):
+            expected = extract(ContentExtractor(rules_file_name, prescan=False))
+            self.assertEqual(expected, extract(ContentExtractor(rules_file_name)), rules_file_name)
+
+    def test_same_text_on_test_pages(self):
+        for file_name in _TEST_PAGES:
+            for host_name in ("*", "lenta.ru", "www.gazeta.ru", "rbc.ru", "test"):
+                self._assert_prescan_keeps_text(
+                    lambda extractor: extractor.extract_from_file(f"{_DATA_DIR}/{file_name}", host_name=host_name))
+
+    def test_same_text_on_edge_cases(self):
+        for html in _EDGE_CASES:
+            for chunk_size in (len(html), 1, 7, 50):
+                chunks = [html[i:i + chunk_size] for i in range(0, len(html), chunk_size)]
+                self._assert_prescan_keeps_text(lambda extractor: "".join(extractor.extract_stream(chunks)))
+
+
+class ParserBackendTests(unittest.TestCase):
+    def test_unknown_backend(self):
+        with self.assertRaises(RuntimeError):
+            ContentExtractor(parser_backend="unknown")
+
+    @unittest.skipUnless(is_parser_backend_available("lxml"), "lxml не установлен")
+    def test_lxml_same_text_on_test_pages(self):
+        for rules_file_name in (None, f"{_DATA_DIR}/test_rules.txt"):
+            expected_extractor = ContentExtractor(rules_file_name)
+            lxml_extractor = ContentExtractor(rules_file_name, parser_backend="lxml")
+            for file_name in _TEST_PAGES:
+                if file_name in _RECOVERED_PAGES:
+                    continue
+                for host_name in ("*", "lenta.ru", "www.gazeta.ru", "rbc.ru", "test"):
+                    file_path = f"{_DATA_DIR}/{file_name}"
+                    self.assertEqual(expected_extractor.extract_from_file(file_path, host_name=host_name),
+                                     lxml_extractor.extract_from_file(file_path, host_name=host_name),
+                                     f"{file_name} {host_name}")
+
+    @unittest.skipUnless(is_parser_backend_available("lxml"), "lxml не установлен")
+    def test_lxml_chunked_input(self):
+        extractor = ContentExtractor(parser_backend="lxml")
+        html = open(f"{_DATA_DIR}/simple_01.html", encoding="utf-8").read()
+        expected = "".join(extractor.extract_stream((html,)))
+        chunks = [html[i:i + 7] for i in range(0, len(html), 7)]
+        self.assertEqual(expected, "".join(extractor.extract_stream(chunks)))
+
+
+if __name__ == '__main__':
+    unittest.main()
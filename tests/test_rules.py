@@ -0,0 +1,247 @@
+import html.parser
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from os.path import dirname
+from unittest import mock
+
+from content_extractor import ContentExtractor
+from content_extractor.rules import ElementClassifier, Rules, clear_rules_cache, load_rules
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+
+
+class _ElementCollector(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        self.elements.append((tag, attrs))
+
+
+def _collect_elements(*file_names) -> list:
+    collector = _ElementCollector()
+    for file_name in file_names:
+        with open(f"{_DATA_DIR}/{file_name}", encoding="utf-8") as f:
+            collector.feed(f.read())
+    collector.elements.extend([
+        ("div", [("class", "Nav")]),
+        ("div", [("class", "nav"), ("class", "article")]),
+        ("div", [("class", None)]),
+        ("a", [("href", None)]),
+        ("span", [("class", "  social-links\tMain ")]),
+        ("span", [("class", "toplineX xtopline")]),
+    ])
+    return collector.elements
+
+
+class RulesTests(unittest.TestCase):
+    def test_classifier_matches_rule_by_rule_resolution(self):
+        elements = _collect_elements("lenta_ru_01.html", "gazeta_01.html", "rbc_01.html", "simple_01.html")
+        for rules_file_name in (None, f"{_DATA_DIR}/test_rules.txt"):
+            rules = Rules()
+            rules.load(rules_file_name)
+            for host in ("*", "lenta.ru", "www.gazeta.ru", "rbc.ru", "test", "unknown.org"):
+                classifier = rules.classifier(host)
+                for tag, attrs in elements:
+                    safe_attrs = [(name, value or "") for name, value in attrs]
+                    element_class = classifier.classify(tag, attrs)
+                    expected = (rules.exclude(host, tag, safe_attrs),
+                                rules.is_header(host, tag, safe_attrs),
+                                rules.is_paragraph(host, tag, safe_attrs),
+                                rules.is_start(host, tag, safe_attrs),
+                                rules.is_stop(host, tag, safe_attrs))
+                    self.assertEqual(expected, tuple(element_class), f"{host}: <{tag} {attrs}>")
+
+    def test_index_matches_rule_by_rule_resolution(self):
+        elements = _collect_elements("lenta_ru_01.html", "gazeta_01.html", "rbc_01.html", "simple_01.html")
+        elements.extend([
+            ("div", [("class", "")]),
+            ("div", [("class", "   ")]),
+            ("a", [("href", "")]),
+            ("div", [("data-role", "Side-Menu"), ("id", "menu 1")]),
+            ("span", [("class", "ad"), ("class", "article")]),
+        ])
+        with open(f"{_DATA_DIR}/test_rules.txt", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        # правила разных типов с совпадающими значениями, пустые значения, верхний регистр и пробелы
+        lines += ["domain:test", "-class:ad", "+class:article*", "-class:*menu", "+class:Nav", "-class:a b",
+                  "-class:*", "+attr:href:", "-attr:href:*lenta.ru*", "+attr:data-role:*menu",
+                  "-attr:data-role:side*", "-attr:id:menu 1", "-tag:span, a", "header:class:*title*",
+                  "paragraph:attr:id:*", "start:class:article*", "start:attr:id:menu 1", "stop:tag:footer",
+                  "stop:class:*comment*"]
+        rules_file_name = f"{tempfile.mkdtemp()}/rules.txt"
+        with open(rules_file_name, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        try:
+            for file_name in (None, f"{_DATA_DIR}/test_rules.txt", rules_file_name):
+                rules = Rules()
+                rules.load(file_name)
+                for domain in set(rules._domains.values()):
+                    for section in ("filter", "header", "paragraph", "start", "stop"):
+                        section_rules = getattr(domain, f"_{section}_rules")
+                        for tag, attrs in elements:
+                            safe_attrs = [(name, value or "") for name, value in attrs]
+                            self.assertEqual(domain._resolve_by_rules(tag, safe_attrs, section_rules),
+                                             domain._resolve(tag, safe_attrs, section),
+                                             f"{domain._hosts} {section}: <{tag} {attrs}>")
+        finally:
+            shutil.rmtree(dirname(rules_file_name))
+
+    def test_classifier_shared_between_domain_hosts(self):
+        rules = Rules()
+        rules.load()
+        self.assertIs(rules.classifier("gazeta.ru"), rules.classifier("www.gazeta.ru"))
+        self.assertIs(rules.classifier("*"), rules.classifier("unknown.org"))
+
+    def test_wildcard_hosts(self):
+        rules_file_name = f"{tempfile.mkdtemp()}/rules.txt"
+        with open(rules_file_name, "w", encoding="utf-8") as f:
+            f.write("-class:nav\ndomain:*.example.com\n+class:nav\ndomain:news.example.com\n-tag:p\n"
+                    "domain:*.sport.example.com\n-tag:span\n")
+        try:
+            rules = Rules()
+            rules.load(rules_file_name)
+            nav = [("class", "nav")]
+            self.assertFalse(rules.exclude("www.example.com", "div", nav))
+            self.assertFalse(rules.exclude("a.b.Example.COM.", "div", nav))
+            # шаблон не подходит для самого домена
+            self.assertTrue(rules.exclude("example.com", "div", nav))
+            self.assertTrue(rules.exclude("example.org", "div", nav))
+            # точное совпадение важнее шаблона, правила хоста дополняются только правилами по умолчанию
+            self.assertTrue(rules.exclude("news.example.com", "p", []))
+            self.assertTrue(rules.exclude("news.example.com", "div", nav))
+            self.assertFalse(rules.exclude("www.news.example.com", "p", []))
+            # из шаблонов выбирается самый длинный
+            self.assertTrue(rules.exclude("live.sport.example.com", "span", []))
+            self.assertFalse(rules.exclude("sport.example.com", "span", []))
+            # правила более общего шаблона не наследуются
+            self.assertTrue(rules.classifier("live.sport.example.com").classify("div", nav).exclude)
+            self.assertIs(rules.classifier("a.example.com"), rules.classifier("b.example.com"))
+            self.assertIs(rules.classifier("*"), rules.classifier("example.com"))
+        finally:
+            shutil.rmtree(dirname(rules_file_name))
+
+    def test_classification_cache(self):
+        rules = Rules()
+        rules.load(f"{_DATA_DIR}/test_rules.txt")
+        classifier = rules.classifier("*")
+        ad_link = [("href", "https://prime.rambler.ru/promo/"), ("title", "Реклама")]
+        link = [("href", "http://localhost"), ("title", "Реклама")]
+        self.assertTrue(classifier.classify("a", ad_link).exclude)
+        self.assertFalse(classifier.classify("a", link).exclude)
+        # title в правилах не используется и в ключ кэша не входит
+        self.assertFalse(classifier.classify("a", [("href", "http://localhost"), ("title", "Ссылка")]).exclude)
+        self.assertTrue(classifier.classify("a", ad_link).exclude)
+        self.assertEqual((2, 2, 2), classifier.cache_info())
+        self.assertEqual((2, 2, 2), rules.classification_cache_info())
+
+    def test_classification_cache_bounded(self):
+        rules = Rules()
+        rules.load()
+        classifier = ElementClassifier(rules.classifier("*")._domains, cache_size=10)
+        for i in range(100):
+            class_name = f"item-{i} banner" if i % 2 == 0 else f"item-{i}"
+            self.assertEqual(i % 2 == 0, classifier.classify("div", [("class", class_name)]).exclude)
+        self.assertEqual((0, 100, 10), classifier.cache_info())
+        classifier.clear_cache()
+        self.assertEqual((0, 0, 0), classifier.cache_info())
+
+
+class RulesCacheTests(unittest.TestCase):
+    def setUp(self):
+        clear_rules_cache()
+        self.directory = tempfile.mkdtemp()
+        self.rules_file_name = f"{self.directory}/rules.txt"
+        shutil.copy(f"{_DATA_DIR}/test_rules.txt", self.rules_file_name)
+
+    def tearDown(self):
+        clear_rules_cache()
+        shutil.rmtree(self.directory)
+
+    def test_rules_loaded_once(self):
+        rules = load_rules(self.rules_file_name)
+        self.assertIs(rules, load_rules(self.rules_file_name))
+
+    def test_rules_reloaded_after_file_change(self):
+        rules = load_rules(self.rules_file_name)
+        with open(self.rules_file_name, "a", encoding="utf-8") as f:
+            f.write("-class:article\n")
+        changed_rules = load_rules(self.rules_file_name)
+        self.assertIsNot(rules, changed_rules)
+        self.assertTrue(changed_rules.classifier("test").classify("div", [("class", "article")]).exclude)
+
+    def test_binary_rules_used_by_new_process(self):
+        load_rules(self.rules_file_name, binary_cache=True)
+        self.assertTrue(os.path.exists(self.rules_file_name + ".pickle"))
+        clear_rules_cache()
+
+        with mock.patch.object(Rules, "load", side_effect=AssertionError("правила разобраны повторно")):
+            rules = load_rules(self.rules_file_name, binary_cache=True)
+        self.assertFalse(rules.classifier("test").classify("div", [("class", "nav")]).exclude)
+        self.assertTrue(rules.classifier("*").classify("div", [("class", "nav")]).exclude)
+
+    def test_binary_rules_saved_concurrently(self):
+        # потоки пишут каждый в свой временный файл и не портят бинарный кеш друг друга
+        threads = [threading.Thread(target=load_rules, args=(self.rules_file_name, True)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(["rules.txt", "rules.txt.pickle"], sorted(os.listdir(self.directory)))
+        clear_rules_cache()
+
+        with mock.patch.object(Rules, "load", side_effect=AssertionError("правила разобраны повторно")):
+            load_rules(self.rules_file_name, binary_cache=True)
+
+
+class RulesReloadTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rules_file_name = f"{self.directory}/rules.txt"
+        shutil.copy(f"{_DATA_DIR}/test_rules.txt", self.rules_file_name)
+        self.page_file_name = f"{_DATA_DIR}/simple_01.html"
+
+    def tearDown(self):
+        clear_rules_cache()
+        shutil.rmtree(self.directory)
+
+    def _remove_host_rule(self):
+        with open(self.rules_file_name, encoding="utf-8") as f:
+            text = f.read()
+        with open(self.rules_file_name, "w", encoding="utf-8") as f:
+            f.write(text.replace("+class:nav", ""))
+
+    def _wait_for_reload(self, extractor: ContentExtractor, text: str) -> str:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            changed_text = extractor.extract_from_file(self.page_file_name, host_name="test")
+            if changed_text != text:
+                return changed_text
+            time.sleep(0.01)
+        self.fail("Правила не были перезагружены")
+
+    def test_changed_rules_applied(self):
+        with ContentExtractor(self.rules_file_name, rules_reload_interval=0.01) as extractor:
+            text = extractor.extract_from_file(self.page_file_name, host_name="test")
+            self.assertIn("Навигация", text)
+            self._remove_host_rule()
+            self.assertNotIn("Навигация", self._wait_for_reload(extractor, text))
+
+    def test_started_extraction_keeps_rules(self):
+        with ContentExtractor(self.rules_file_name, rules_reload_interval=0.01) as extractor:
+            text = extractor.extract_from_file(self.page_file_name, host_name="test")
+            chunks = ["<html><body><div class='nav'>Навигация</div><p>Текст</p><p>", "<div class='nav'>Меню</div>"]
+            stream = extractor.extract_stream(chunks, host_name="test")
+            first_part = next(stream)
+            self._remove_host_rule()
+            self._wait_for_reload(extractor, text)
+            self.assertEqual("Навигация\n\nТекст\n\nМеню", first_part + "".join(stream))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from content_extractor import ContentExtractor
+from content_extractor.benchmark import BenchmarkDocument, data_documents
+from content_extractor.rules_profiler import (RulesFile, collect_elements, compare_output, main, optimize_rules,
+                                              profile_rules)
+
+_RULES = """# правила по умолчанию
+domain:*
+-tag:script
+-class:footer
+-class:*footer*
+-class:*ads*
+-class:*promo*
+-tag:script
++class:promo-text
+header:tag:h1
+paragraph:tag:p,div
+# тестовый домен
+domain:test
+-class:menu
+-class:menu
+"""
+_HTML = """<html><body><div class="menu">Меню</div><h1>Заголовок</h1><div class="promo"><p>Реклама</p></div>
+<p class="promo-text">Текст</p><div class="page-footer"><p class="footer">Подвал</p></div>
+<script>var a;</script></body></html>"""
+
+# ab* срабатывает на классах, которые заканчиваются на ab, а *cd - на классах, которые начинаются с cd
+_AFFIX_RULES = """domain:*
+-class:ab*
+-class:abc*
+-class:zab*
+-class:*cd
+-class:*zcd
+-class:*cde
+paragraph:tag:p
+"""
+_AFFIX_HTML = """<html><body><p class="zabc">1</p><p class="xzab">2</p><p class="zcdx">3</p><p class="cdex">4</p>
+<p>Текст</p></body></html>"""
+
+
+class RulesProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _profile(self):
+        rules_file = RulesFile(_RULES.splitlines())
+        documents = [BenchmarkDocument("page", _HTML.encode("utf-8"), host_name)
+                     for host_name in ("test", "other")]
+        elements = collect_elements(documents, rules_file.compile())
+        return profile_rules(rules_file, elements, len(documents))
+
+    def test_profile(self):
+        profile = self._profile()
+        rules = {(rule_profile.hosts, rule_profile.rule_line.line_number): rule_profile
+                 for rule_profile in profile.rules.values()}
+        # меню исключено правилом домена test, на другом хосте подходит под правило paragraph
+        self.assertEqual(1, rules[("test", 14)].hits)
+        self.assertEqual(1, rules[("test", 14)].decisive)
+        self.assertTrue(rules[("*", 6)].dead)
+        # промо-текст включен правилом +class:promo-text, исключение *promo* для него ничего не решает
+        self.assertEqual(4, rules[("*", 7)].hits)
+        self.assertEqual(2, rules[("*", 7)].decisive)
+        self.assertEqual(2, rules[("*", 9)].decisive)
+        self.assertFalse(rules[("*", 5)].shadowed)
+        # повторы и правила, перекрытые более общими правилами секции
+        covered = {rule_profile.rule_line.line_number: rule_profile.covered_by.line_number
+                   for rule_profile in profile.rules.values() if rule_profile.covered_by is not None}
+        self.assertEqual({4: 5, 8: 3, 15: 14}, covered)
+        self.assertGreater(profile.evaluations, 0)
+
+    def test_optimize(self):
+        profile = self._profile()
+        optimized = optimize_rules(profile)
+        self.assertEqual(["# правила по умолчанию", "domain:*", "+class:promo-text", "-class:*promo*",
+                          "-tag:script", "-class:*footer*", "-class:*ads*", "header:tag:h1", "paragraph:tag:p,div",
+                          "# тестовый домен", "domain:test", "-class:menu"], optimized.lines())
+        self.assertLess(profile_rules(optimized, profile.elements).evaluations, profile.evaluations)
+        # неиспользуемое правило удаляется только по запросу
+        self.assertNotIn("-class:*ads*", optimize_rules(profile, drop_unused=True).lines())
+
+    def test_same_output_on_corpus(self):
+        documents = data_documents()
+        rules_file = RulesFile.load()
+        profile = profile_rules(rules_file, collect_elements(documents, rules_file.compile()), len(documents))
+        for drop_unused in (False, True):
+            optimized = optimize_rules(profile, drop_unused)
+            file_name = f"{self.directory}/rules_{drop_unused}.txt"
+            with open(file_name, "w", encoding="utf-8") as f:
+                f.write(optimized.text())
+            self.assertEqual([], compare_output(documents, None, file_name))
+            self.assertLess(profile_rules(optimized, profile.elements).evaluations, profile.evaluations)
+
+    def test_affix_rules(self):
+        rules_file_name = f"{self.directory}/rules.txt"
+        with open(rules_file_name, "w", encoding="utf-8") as f:
+            f.write(_AFFIX_RULES)
+        rules_file = RulesFile.load(rules_file_name)
+        documents = [BenchmarkDocument("page", _AFFIX_HTML.encode("utf-8"), "*")]
+        profile = profile_rules(rules_file, collect_elements(documents, rules_file.compile()), len(documents))
+        # zab* перекрыто правилом ab*, *cde - правилом *cd, а abc* и *zcd решают для zabc и zcdx
+        covered = {rule_profile.rule_line.text: rule_profile.covered_by.text
+                   for rule_profile in profile.rules.values() if rule_profile.covered_by is not None}
+        self.assertEqual({"-class:zab*": "-class:ab*", "-class:*cde": "-class:*cd"}, covered)
+
+        optimized_file_name = f"{self.directory}/optimized.txt"
+        with open(optimized_file_name, "w", encoding="utf-8") as f:
+            f.write(optimize_rules(profile).text())
+        self.assertEqual([], compare_output(documents, rules_file_name, optimized_file_name))
+        optimized = ContentExtractor(optimized_file_name)
+        self.assertEqual("Текст", optimized.extract_from_bytes(documents[0].data).strip())
+
+    def test_main(self):
+        rules_file_name = f"{self.directory}/rules.txt"
+        output_file_name = f"{self.directory}/optimized.txt"
+        corpus_directory = f"{self.directory}/test.local"
+        os.mkdir(corpus_directory)
+        with open(rules_file_name, "w", encoding="utf-8") as f:
+            f.write(_RULES)
+        with open(f"{corpus_directory}/page.html", "w", encoding="utf-8") as f:
+            f.write(_HTML)
+        self.assertEqual(0, main(["-r", rules_file_name, "-o", output_file_name, "--host=test", corpus_directory]))
+        with open(output_file_name, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(1, lines.count("-class:menu"))
+        self.assertNotIn("-class:footer", lines)
+        self.assertEqual("+class:promo-text", lines[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os.path import dirname
+from unittest import mock
+
+from content_extractor import ContentExtractor
+from content_extractor.server import ExtractionServer, parse_address
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+_RULES_FILE = f"{_DATA_DIR}/test_rules.txt"
+_PAGE = "<html><body><h1>Заголовок</h1><p>Текст</p></body></html>".encode("utf-8")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=_DATA_DIR, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _read_page(file_name: str) -> bytes:
+    with open(f"{_DATA_DIR}/{file_name}", "rb") as f:
+        return f.read()
+
+
+def _read_responses(sock: socket.socket, count: int) -> list:
+    # HTTPResponse закрывает поток после чтения ответа, поэтому ответы в одном соединении разбираем сами
+    responses = []
+    stream = sock.makefile("rb")
+    for _ in range(count):
+        status = int(stream.readline().split()[1])
+        headers = http.client.parse_headers(stream)
+        responses.append((status, stream.read(int(headers["Content-Length"])).decode("utf-8")))
+    return responses
+
+
+class ExtractionServerTests(unittest.TestCase):
+    def setUp(self):
+        self.extractor = ContentExtractor(_RULES_FILE)
+        self.server = ExtractionServer(("127.0.0.1", 0), _RULES_FILE, max_pending=2).start()
+        self.connection = http.client.HTTPConnection(*self.server.address)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.stop()
+
+    def _request(self, method: str, path: str, body=None, headers: dict = None):
+        self.connection.request(method, path, body=body, headers=headers or dict())
+        response = self.connection.getresponse()
+        return response.status, response.read().decode("utf-8")
+
+    def test_extract_html(self):
+        page = _read_page("simple_01.html")
+        self.assertEqual((200, self.extractor.extract_from_file(f"{_DATA_DIR}/simple_01.html", host_name="test")),
+                         self._request("POST", "/extract?host=test", page, {"Content-Type": "text/html"}))
+        # соединение переиспользуется для следующих запросов
+        self.assertEqual((200, self.extractor.extract_from_file(f"{_DATA_DIR}/rbc_01.html")),
+                         self._request("POST", "/extract", _read_page("rbc_01.html")))
+
+    def test_extract_json(self):
+        html = "<html><body><div class='nav'>Навигация</div><p>Текст</p></body></html>"
+        body = json.dumps({"html": html, "host": "test"}).encode("utf-8")
+        self.assertEqual((200, "Навигация\n\nТекст"),
+                         self._request("POST", "/extract", body, {"Content-Type": "application/json"}))
+        body = json.dumps({"text": html}).encode("utf-8")
+        self.assertEqual(400, self._request("POST", "/extract", body, {"Content-Type": "application/json"})[0])
+
+    def test_extract_url(self):
+        pages = ThreadingHTTPServer(("127.0.0.1", 0), _QuietHandler)
+        threading.Thread(target=pages.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{pages.server_address[1]}/gazeta_01.html"
+            self.assertEqual((200, self.extractor.extract_from_url(url)), self._request("GET", f"/extract?url={url}"))
+            url = f"http://127.0.0.1:{pages.server_address[1]}/missing.html"
+            self.assertEqual(502, self._request("GET", f"/extract?url={url}")[0])
+        finally:
+            pages.shutdown()
+            pages.server_close()
+
+    def test_only_http_urls(self):
+        self.assertEqual(400, self._request("GET", "/extract?url=file:///etc/passwd")[0])
+        body = json.dumps({"url": "ftp://example.org/page.html"}).encode("utf-8")
+        self.assertEqual(400, self._request("POST", "/extract", body, {"Content-Type": "application/json"})[0])
+        body = json.dumps({"url": ["http://example.org/"]}).encode("utf-8")
+        self.assertEqual(400, self._request("POST", "/extract", body, {"Content-Type": "application/json"})[0])
+
+    def test_invalid_content_length(self):
+        for length, status in (("-1", 400), ("abc", 400), (str(64 * 1024 * 1024 + 1), 413)):
+            with socket.create_connection(self.server.address) as sock:
+                sock.sendall(b"POST /extract HTTP/1.1\r\nHost: localhost\r\nContent-Length: %s\r\n\r\n"
+                             % length.encode("ascii"))
+                self.assertEqual(status, _read_responses(sock, 1)[0][0], length)
+
+    def test_health(self):
+        status, text = self._request("GET", "/health")
+        self.assertEqual(200, status)
+        health = json.loads(text)
+        self.assertEqual(("ok", 0, 2), (health["status"], health["pending"], health["max_pending"]))
+        self.assertEqual(self.extractor.rules_version, health["rules_version"])
+        self.assertEqual(404, self._request("GET", "/unknown")[0])
+
+    def test_pipelining(self):
+        pages = ["simple_01.html", "gazeta_01.html", "simple_02.html"]
+        requests = b""
+        for page in pages:
+            body = _read_page(page)
+            requests += b"POST /extract HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+        requests += b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        with socket.create_connection(self.server.address) as sock:
+            sock.sendall(requests)
+            responses = _read_responses(sock, len(pages) + 1)
+        expected = [(200, self.extractor.extract_from_file(f"{_DATA_DIR}/{page}")) for page in pages]
+        self.assertEqual(expected, responses[:-1])
+        self.assertEqual(200, responses[-1][0])
+
+    def test_backpressure(self):
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        extract_from_bytes = self.server.extractor.extract_from_bytes
+
+        def slow_extract(*args, **kwargs):
+            started.release()
+            release.wait(5)
+            return extract_from_bytes(*args, **kwargs)
+
+        results = []
+
+        def post():
+            connection = http.client.HTTPConnection(*self.server.address)
+            connection.request("POST", "/extract", body=_PAGE)
+            results.append(connection.getresponse().status)
+            connection.close()
+
+        with mock.patch.object(self.server.extractor, "extract_from_bytes", side_effect=slow_extract):
+            threads = [threading.Thread(target=post) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for _ in threads:
+                self.assertTrue(started.acquire(timeout=5))
+
+            status, text = self._request("POST", "/extract", _PAGE)
+            self.assertEqual(503, status)
+            self.assertEqual(503, self._request("GET", "/health")[0])
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual([200, 200], results)
+        self.assertEqual(200, self._request("POST", "/extract", _PAGE)[0])
+
+
+class ExtractionServerModesTests(unittest.TestCase):
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        path = f"{directory}/extractor.sock"
+        try:
+            with ExtractionServer(f"unix:{path}", _RULES_FILE).start():
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(path)
+                    sock.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                                 b"POST /extract?host=test HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s"
+                                 % (len(_PAGE), _PAGE))
+                    responses = _read_responses(sock, 2)
+            self.assertEqual(200, responses[0][0])
+            self.assertEqual((200, "# Заголовок\n\nТекст"), responses[1])
+            self.assertFalse(os.path.exists(path))
+        finally:
+            os.rmdir(directory)
+
+    def test_worker_processes(self):
+        extractor = ContentExtractor(_RULES_FILE)
+        with ExtractionServer(("127.0.0.1", 0), _RULES_FILE, workers=2).start() as server:
+            connection = http.client.HTTPConnection(*server.address)
+            for page in ("simple_01.html", "lenta_ru_01.html"):
+                connection.request("POST", "/extract?host=test", body=_read_page(page))
+                response = connection.getresponse()
+                expected = extractor.extract_from_file(f"{_DATA_DIR}/{page}", host_name="test")
+                self.assertEqual((200, expected), (response.status, response.read().decode("utf-8")))
+            connection.close()
+
+    def test_output_format(self):
+        options = {"output_format": "jsonl"}
+        with ExtractionServer(("127.0.0.1", 0), _RULES_FILE, extractor_options=options).start() as server:
+            connection = http.client.HTTPConnection(*server.address)
+            connection.request("POST", "/extract", body=_PAGE)
+            response = connection.getresponse()
+            self.assertEqual("application/x-ndjson; charset=utf-8", response.getheader("Content-Type"))
+            self.assertEqual({"type": "header", "text": "Заголовок", "links": []},
+                             json.loads(response.read().decode("utf-8").splitlines()[0]))
+            connection.close()
+
+    def test_parse_address(self):
+        self.assertEqual(("127.0.0.1", 8080), parse_address("8080"))
+        self.assertEqual(("0.0.0.0", 80), parse_address("0.0.0.0:80"))
+        self.assertEqual("/tmp/extractor.sock", parse_address("unix:/tmp/extractor.sock"))
+        with self.assertRaises(RuntimeError):
+            parse_address("localhost")
+
+
+if __name__ == '__main__':
+    unittest.main()
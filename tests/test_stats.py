@@ -0,0 +1,60 @@
+import unittest
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+from content_extractor.rules import clear_rules_cache
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+
+
+class StatsTests(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(ContentExtractor().stats)
+
+    def test_same_text_with_instrumentation(self):
+        for file_name in ("lenta_ru_01.html", "gazeta_01.html", "rbc_01.html", "simple_01.html"):
+            expected = ContentExtractor().extract_from_file(f"{_DATA_DIR}/{file_name}", host_name="test")
+            extractor = ContentExtractor(instrumentation=True)
+            self.assertEqual(expected, extractor.extract_from_file(f"{_DATA_DIR}/{file_name}", host_name="test"))
+
+    def test_document_stats(self):
+        # правила и кэш классов общие для экстракторов процесса, начинаем с пустого кэша
+        clear_rules_cache()
+        documents = []
+        extractor = ContentExtractor(f"{_DATA_DIR}/test_rules.txt", on_stats=documents.append)
+        extractor.extract_from_file(f"{_DATA_DIR}/simple_01.html", host_name="test")
+        "".join(extractor.extract_stream(["<html><body><h1>Статья <span class=\"nav\"><b>меню</b></span></h1></body></html>"]))
+
+        self.assertEqual(2, len(documents))
+        stats = documents[0]
+        self.assertEqual(f"{_DATA_DIR}/simple_01.html", stats.address)
+        self.assertEqual("test", stats.host_name)
+        self.assertEqual(1, stats.documents)
+        # void-элементы (input, br) до обхода не доходят, а для хоста test навигация не исключается
+        self.assertEqual(14, stats.elements_visited)
+        self.assertEqual(0, stats.elements_skipped)
+        self.assertEqual(4, stats.elements_excluded)
+        # правила проверяются только при промахах кэша классов, повторяющиеся элементы берутся из кэша
+        self.assertGreater(stats.cache_hits, 0)
+        self.assertGreaterEqual(stats.rule_evaluations, stats.cache_misses)
+        self.assertLess(stats.cache_misses, stats.elements_visited)
+        self.assertEqual(1, stats.rule_hits["* filter: -TagNamesRule[tags={'script'}]"])
+        self.assertEqual(1, stats.rule_hits["test filter: +ClassNameRule[nav]"])
+        self.assertEqual(0, stats.rule_hits["* filter: -ClassNameRule[nav]"])
+        self.assertEqual(1, stats.rule_hits["* filter: -ClassNameRule[footer]"])
+        for stage in ("fetch", "parse", "classify", "write"):
+            self.assertGreater(stats.stages[stage].wall, 0, stage)
+
+        # внутри заголовка разметка исключенного элемента не пропускается парсером, поэтому b попадает в обход
+        self.assertEqual(3, documents[1].elements_visited)
+        self.assertEqual(1, documents[1].elements_skipped)
+        self.assertEqual(1, documents[1].elements_excluded)
+
+        total = extractor.stats
+        self.assertEqual(2, total.documents)
+        self.assertEqual(17, total.elements_visited)
+        self.assertEqual(1, total.rule_hits["* filter: -ClassNameRule[nav]"])
+
+
+if __name__ == '__main__':
+    unittest.main()
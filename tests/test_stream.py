@@ -0,0 +1,53 @@
+import email.message
+import io
+import unittest
+from os.path import dirname
+
+from content_extractor import ContentExtractor
+
+_DATA_DIR = f"{dirname(__file__)}/data"
+
+
+class _Response(io.BytesIO):
+    def __init__(self, data: bytes, content_type: str):
+        super().__init__(data)
+        self.headers = email.message.Message()
+        self.headers["Content-Type"] = content_type
+
+
+class ExtractStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.extractor = ContentExtractor()
+
+    def test_same_text_for_any_chunk_size(self):
+        for file_name, host_name in (("lenta_ru_01.html", "lenta.ru"), ("simple_01.html", "*")):
+            with open(f"{_DATA_DIR}/{file_name}", "rb") as f:
+                data = f.read()
+            expected = self.extractor.extract_from_file(f"{_DATA_DIR}/{file_name}", host_name=host_name)
+            for chunk_size in (1, 13, 4096):
+                chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+                text = "".join(self.extractor.extract_stream(chunks, host_name=host_name))
+                self.assertEqual(expected, text, f"{file_name}, {chunk_size}")
+
+    def test_blocks_yielded_before_document_end(self):
+        consumed = []
+
+        def chunks():
+            for chunk in ("<html><body><h1>Заголовок</h1>", "<p>Первый параграф</p>", "<p>Второй",
+                          " параграф</p></body></html>"):
+                consumed.append(chunk)
+                yield chunk
+
+        stream = self.extractor.extract_stream(chunks())
+        self.assertEqual("# Заголовок\n\n", next(stream))
+        self.assertEqual(2, len(consumed))
+        self.assertEqual(["Первый параграф\n\n", "Второй параграф"], list(stream))
+
+    def test_charset_from_response_headers(self):
+        response = _Response("<html><body><p>Текст в windows-1251</p></body></html>".encode("cp1251"),
+                             "text/html; charset=windows-1251")
+        self.assertEqual("\nТекст в windows-1251", "".join(self.extractor.extract_stream(response, chunk_size=3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import io
+import random
+import sys
+import threading
+import unittest
+
+from content_extractor import ContentExtractor
+from content_extractor.benchmark import data_documents
+from content_extractor.rules import Rules, TagNamesRule
+
+_THREADS = 8
+_ITERATIONS = 12
+
+
+def _extract(extractor: ContentExtractor, document, host_name: str, chunk_size: int) -> str:
+    return "".join(extractor.extract_stream(io.BytesIO(document.data), host_name=host_name,
+                                            encoding=document.encoding, chunk_size=chunk_size))
+
+
+class SharedExtractorTests(unittest.TestCase):
+    def setUp(self):
+        self.documents = data_documents()
+        # частое переключение потоков, чтобы разбор документов перемежался внутри обработчиков парсера
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def _hammer(self, extractor: ContentExtractor, expected: dict) -> list:
+        errors = []
+        self.extracted = []
+        start = threading.Barrier(_THREADS)
+
+        def run(seed: int):
+            generator = random.Random(seed)
+            start.wait()
+            try:
+                for _ in range(_ITERATIONS):
+                    document = generator.choice(self.documents)
+                    host_name = generator.choice((document.host_name, "*"))
+                    chunk_size = generator.choice((1024, 4096, 64 * 1024))
+                    self.extracted.append((document, host_name, chunk_size))
+                    text = _extract(extractor, document, host_name, chunk_size)
+                    if text != expected[(document.name, host_name)]:
+                        errors.append(f"{document.name} {host_name}")
+            except Exception as e:
+                errors.append(repr(e))
+
+        threads = [threading.Thread(target=run, args=(seed,)) for seed in range(_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def _expected(self) -> dict:
+        extractor = ContentExtractor()
+        return {(document.name, host_name): extractor.extract_from_bytes(document.data, host_name, document.encoding)
+                for document in self.documents for host_name in (document.host_name, "*")}
+
+    def test_shared_extractor(self):
+        expected = self._expected()
+        extractor = ContentExtractor()
+        # маленький кэш классов постоянно очищается во время разбора в других потоках
+        for classifier in extractor._rules._classifiers.values():
+            classifier._cache_size = 16
+        self.assertEqual([], self._hammer(extractor, expected))
+
+    def test_shared_instrumented_extractor(self):
+        expected = self._expected()
+        extractor = ContentExtractor(instrumentation=True)
+        self.assertEqual([], self._hammer(extractor, expected))
+        # статистика документов, разобранных в потоках, та же, что при разборе по очереди
+        sequential_extractor = ContentExtractor(instrumentation=True)
+        for document, host_name, chunk_size in self.extracted:
+            _extract(sequential_extractor, document, host_name, chunk_size)
+        stats, sequential_stats = extractor.stats, sequential_extractor.stats
+        self.assertEqual(_THREADS * _ITERATIONS, stats.documents)
+        for name in ("elements_visited", "elements_skipped", "elements_excluded"):
+            self.assertEqual(getattr(sequential_stats, name), getattr(stats, name), name)
+        self.assertEqual(sequential_stats.cache_hits + sequential_stats.cache_misses,
+                         stats.cache_hits + stats.cache_misses)
+        # правила проверяются только при промахах общего кэша классов, их число зависит от порядка разбора
+        self.assertEqual(bool(stats.cache_misses), bool(stats.rule_evaluations))
+
+    def test_shared_boilerplate_cache(self):
+        extractor = ContentExtractor(learn_boilerplate=True)
+        errors = []
+
+        def run():
+            try:
+                for document in self.documents * 3:
+                    extractor.extract_from_bytes(document.data, document.host_name, document.encoding)
+            except Exception as e:
+                errors.append(repr(e))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(8 * 3 * 2, extractor.boilerplate_cache._hosts["lenta.ru"].documents)
+
+    def test_rules_frozen_after_load(self):
+        rules = Rules()
+        rules.load()
+        domain = rules._find_domain("lenta.ru")[0]
+        with self.assertRaises(RuntimeError):
+            domain.add_filter_rule(TagNamesRule("p"))
+        with self.assertRaises(RuntimeError):
+            domain._debug = True
+        with self.assertRaises(RuntimeError):
+            domain._filter_rules[0].exclude = False
+        with self.assertRaises(RuntimeError):
+            rules.load()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import textwrap
+import unittest
+
+from content_extractor.writer import TextWriter
+
+
+class TextWriterTests(unittest.TestCase):
+    def test_paragraph_from_many_fragments_wrapped_once(self):
+        writer = TextWriter(max_line_length=30)
+        words = [f"слово{i}" for i in range(200)]
+        for word in words:
+            writer.write_paragraph(f"  {word}\n")
+        self.assertEqual("\n".join(textwrap.wrap(" ".join(words), width=30)), writer.get_text())
+
+    def test_blocks_separated_by_empty_line(self):
+        writer = TextWriter()
+        writer.start_header()
+        writer.write_header("Заголовок")
+        writer.start_paragraph()
+        writer.write_paragraph("Первый")
+        writer.write_link("http://localhost")
+        writer.write_paragraph("параграф")
+        writer.start_paragraph()
+        writer.write_paragraph("Второй параграф")
+        self.assertEqual("# Заголовок\n\nПервый [http://localhost] параграф\n\nВторой параграф", writer.get_text())
+
+    def test_get_text_can_be_continued(self):
+        writer = TextWriter(max_line_length=10)
+        writer.write_paragraph("один два три")
+        self.assertEqual("один два\nтри", writer.get_text())
+        writer.write_paragraph("четыре")
+        self.assertEqual("один два\nтри четыре", writer.get_text())
+        self.assertEqual("один два\nтри четыре", writer.get_text())
+
+    def test_tab_in_link_expanded_from_current_line(self):
+        writer = TextWriter(max_line_length=20)
+        writer.write_paragraph("a" * 10)
+        writer.write_paragraph("b" * 10)
+        writer.write_link("c\td")
+        self.assertEqual("aaaaaaaaaa\nbbbbbbbbbb [c   d]", writer.get_text())
+
+
+if __name__ == '__main__':
+    unittest.main()